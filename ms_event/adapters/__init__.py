@@ -1,2 +1,3 @@
 from .event_repository import AbstractEventRepository, EventRepository, FakeEventRepository
 from .user_repository import AbstractUserRepository, ManuscriptUserRepository, FakeManuscriptUserRepository
+from .outbox_repository import AbstractOutboxRepository, OutboxRepository, FakeOutboxRepository
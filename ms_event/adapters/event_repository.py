@@ -1,8 +1,16 @@
 import abc
-from typing import Union, List
+import collections
+from typing import Union, List, Dict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F
 
 import app.models as models
 import domain.fake_models as fake_models
+import manuscript_shared.memory as memory
+import adapters.tag_counts as tag_counts
+import core.search as search
 import django.contrib.auth as django_auth
 
 
@@ -47,11 +55,13 @@ class AbstractEventRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def list(self, include_deactivated=False, **kwargs):
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs):
         ''' 
         Возвращает список [Event]
 
                 Args:
+                        limit: [int] - количество записей на странице (по умолчанию - все записи)
+                        cursor: [tuple] - (created_at, id) последней записи предыдущей страницы
                         kwargs: [dict] - словарь с параметрами для поиска
 
                 Returns:
@@ -59,6 +69,48 @@ class AbstractEventRepository(abc.ABC):
         '''
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def tag_counts(self):
+        '''
+        Возвращает количество активных [Event] по каждому тегу
+
+                Returns:
+                        [Dict[str, int]] - {тег: количество}, по убыванию количества
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def upcoming(self, since, limit, cursor=None, **kwargs):
+        '''
+        Возвращает активные [Event], которые начинаются не раньше since,
+        отсортированные по (start_date, id)
+
+                Args:
+                        since: [str] - дата в формате YYYY-MM-DD
+                        limit: [int] - количество записей на странице
+                        cursor: [tuple] - (start_date, id) последней записи предыдущей страницы
+                        kwargs: [dict] - словарь с параметрами для поиска
+
+                Returns:
+                        [List[Event]] - найденные event
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search(self, terms, limit):
+        '''
+        Полнотекстовый поиск активных [Event] по названию и описаниям.
+        Последнее слово ищется по префиксу
+
+                Args:
+                        terms: [List[str]] - слова поискового запроса (core.search.parse_terms)
+                        limit: [int] - максимальное количество результатов
+
+                Returns:
+                        [List[Event]] - найденные event, отсортированные по релевантности
+        '''
+        raise NotImplementedError
+
     @abc.abstractmethod
     def deactivate(self, id):
         ''' 
@@ -75,64 +127,125 @@ class EventRepository(AbstractEventRepository):
     def get(self, **kwargs) -> Union[models.Event, None]:
         return models.Event.objects.filter(**kwargs).first()
 
+    @transaction.atomic
     def create(self, **kwargs):
-        return models.Event.objects.create(**kwargs)
+        event = models.Event.objects.create(**kwargs)
+        tag_counts.adjust(tag_counts.deltas((), False, event.tags, event.is_active))
+        return event
 
+    @transaction.atomic
     def edit(self, id, **kwargs):
-        event = models.Event.objects.get(id=id)
+        event = models.Event.objects.select_for_update().get(id=id)
+        old_tags, old_active = event.tags, event.is_active
         for key, value in kwargs.items():
             setattr(event, key, value)
         event.save()
+        tag_counts.adjust(tag_counts.deltas(old_tags, old_active, event.tags, event.is_active))
         return event
 
-    def list(self, include_deactivated=False, **kwargs, ) -> List[models.Event]:
-        if include_deactivated:
-            return models.Event.objects.filter(**kwargs)
-        return models.Event.objects.filter(**kwargs, is_active=True)
-
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs, ) -> List[models.Event]:
+        events = models.Event.objects.filter(**kwargs)
+        if not include_deactivated:
+            events = events.filter(is_active=True)
+        if limit is None:
+            return events
+        if cursor is not None:
+            created_at, id = cursor
+            events = events.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=id)
+        return events.order_by('created_at', 'id')[:limit]
+
+    def upcoming(self, since, limit, cursor=None, **kwargs) -> List[models.Event]:
+        # Диапазон по индексу (is_active, start_date, id) без сортировки в памяти
+        events = models.Event.objects.filter(is_active=True, start_date__gte=since, **kwargs)
+        if cursor is not None:
+            start_date, id = cursor
+            events = events.filter(start_date__gte=start_date).exclude(
+                start_date=start_date, id__lte=id)
+        return events.order_by('start_date', 'id')[:limit]
+
+    def search(self, terms, limit) -> List[models.Event]:
+        query = SearchQuery(search.to_prefix_tsquery(terms),
+                            search_type='raw', config=search.SEARCH_CONFIG)
+        return models.Event.objects.filter(is_active=True, search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)).order_by('-rank', 'id')[:limit]
+
+    @transaction.atomic
     def deactivate(self, id):
-        event = models.Event.objects.get(id=id)
+        event = models.Event.objects.select_for_update().get(id=id)
+        tag_counts.adjust(tag_counts.deltas(event.tags, event.is_active, (), False))
         event.is_active = False
         event.save()
         return models.Event.objects.get(id=id)
 
+    def tag_counts(self) -> Dict[str, int]:
+        return dict(models.TagCount.objects.filter(active_count__gt=0).order_by(
+            '-active_count', 'tag').values_list('tag', 'active_count'))
+
 
 class FakeEventRepository(AbstractEventRepository):
 
     def __init__(self) -> None:
-        self._events = []
-        self._id = 0
+        self._events = memory.InMemoryTable(
+            indexes=('is_active', 'author', 'author__username'), array_indexes=('tags',))
+        self._tag_counts = collections.Counter()
 
     def get(self, **kwargs) -> Union[fake_models.Event, None]:
-        return next((event for event in self._events if all([
-            getattr(event, key) == value for key, value in kwargs.items()
-        ])), None)
+        return self._events.get(**kwargs)
 
     def create(self, **kwargs):
-        event = fake_models.Event(**kwargs)
-        self._id += 1
-        event.id = self._id
-        self._events.append(event)
+        event = self._events.add(fake_models.Event(**kwargs))
+        self._tag_counts.update(tag_counts.deltas((), False, event.tags, event.is_active))
         return event
 
     def edit(self, id, **kwargs):
-        event = next((event for event in self._events if event.id == id), None)
-        for key, value in kwargs.items():
-            setattr(event, key, value)
-        self._events = [event if event.id ==
-                        id else event for event in self._events]
+        event = self._events.get(id=id)
+        old_tags, old_active = event.tags, event.is_active
+        self._events.update(event, **kwargs)
+        self._tag_counts.update(tag_counts.deltas(old_tags, old_active, event.tags, event.is_active))
         return event
 
-    def list(self, include_deactivated=False, **kwargs, ) -> List[fake_models.Event]:
-        if 'tags__contains' in kwargs:
-            return [event for event in self._events if kwargs['tags__contains'] in event.tags]
-        return [event for event in self._events if all([
-            getattr(event, key) == value for key, value in kwargs.items()
-        ]) and event.is_active]
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs, ) -> List[fake_models.Event]:
+        if not include_deactivated:
+            kwargs['is_active'] = True
+        events = self._events.filter(**kwargs)
+        if limit is None:
+            return events
+        events = sorted(events, key=lambda event: (event.created_at, event.id))
+        if cursor is not None:
+            events = [event for event in events if (event.created_at, event.id) > cursor]
+        return events[:limit]
+
+    def upcoming(self, since, limit, cursor=None, **kwargs) -> List[fake_models.Event]:
+        events = self._events.filter(is_active=True, start_date__gte=since, **kwargs)
+        events = sorted(events, key=lambda event: (event.start_date, event.id))
+        if cursor is not None:
+            events = [event for event in events if (event.start_date, event.id) > cursor]
+        return events[:limit]
+
+    def search(self, terms, limit) -> List[fake_models.Event]:
+        # Веса полей как в триггере event_search_vector_update: A - название, B и C - описания
+        weights = (('name', 1.0), ('description', 0.4), ('full_description', 0.2))
+        ranked = []
+        for event in self._events.filter(is_active=True):
+            words = {name: search.parse_terms(getattr(event, name)) for name, _ in weights}
+            all_words = [word for field_words in words.values() for word in field_words]
+            if not all(self._matches(term, all_words, prefix=i == len(terms) - 1) for i, term in enumerate(terms)):
+                continue
+            rank = sum(weight for name, weight in weights for i, term in enumerate(terms)
+                       if self._matches(term, words[name], prefix=i == len(terms) - 1))
+            ranked.append((-rank, event.id, event))
+        return [event for _, _, event in sorted(ranked, key=lambda item: item[:2])][:limit]
+
+    @staticmethod
+    def _matches(term, words, prefix) -> bool:
+        return any(word.startswith(term) if prefix else word == term for word in words)
 
     def deactivate(self, id):
-        event = next((event for event in self._events if event.id == id), None)
-        event.is_active = False
-        self._events = [event if event.id ==
-                        id else event for event in self._events]
-        return event
+        event = self._events.get(id=id)
+        self._tag_counts.update(tag_counts.deltas(event.tags, event.is_active, (), False))
+        return self._events.update(event, is_active=False)
+
+    def tag_counts(self) -> Dict[str, int]:
+        return dict(sorted(((tag, count) for tag, count in self._tag_counts.items() if count > 0),
+                           key=lambda item: (-item[1], item[0])))
@@ -0,0 +1,11 @@
+import manuscript_shared.outbox as outbox
+# Абстракция и Fake-репозиторий общие, модель сообщений - своя у каждого сервиса
+from manuscript_shared.outbox import AbstractOutboxRepository, FakeOutboxRepository
+
+import app.models as models
+
+
+class OutboxRepository(outbox.OutboxRepository):
+
+    def __init__(self) -> None:
+        super().__init__(models.OutboxMessage)
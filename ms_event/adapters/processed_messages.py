@@ -0,0 +1,8 @@
+import manuscript_shared.processed_messages as processed_messages
+
+import app.models as models
+
+# Журнал ProcessedMessage сервиса: record - ledger потребителя, prune - очистка старых записей
+ledger = processed_messages.ProcessedMessageLedger(models.ProcessedMessage)
+record = ledger.record
+prune = ledger.prune
@@ -0,0 +1,56 @@
+import collections
+from typing import Dict, Iterable
+
+from django.db import connection
+
+import app.models as models
+
+
+def deltas(old_tags: Iterable[str], old_active: bool, new_tags: Iterable[str], new_active: bool) -> Dict[str, int]:
+    '''
+    Возвращает изменения счетчиков тегов при переходе мероприятия из старого состояния в новое
+
+            Args:
+                    old_tags, old_active: теги и активность до изменения (пустой список для нового event)
+                    new_tags, new_active: теги и активность после изменения
+
+            Returns:
+                    [Dict[str, int]] - {тег: приращение}, без нулевых приращений
+    '''
+    changes = collections.Counter()
+    if old_active:
+        changes.subtract(set(old_tags or ()))
+    if new_active:
+        changes.update(set(new_tags or ()))
+    return {tag: delta for tag, delta in changes.items() if delta}
+
+
+def adjust(changes: Dict[str, int]) -> None:
+    '''
+    Применяет изменения к TagCount одним INSERT ... ON CONFLICT DO UPDATE
+    '''
+    if not changes:
+        return
+    table = connection.ops.quote_name(models.TagCount._meta.db_table)
+    # Теги упорядочены, чтобы параллельные транзакции блокировали строки в одном порядке
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (tag, active_count) VALUES {", ".join(["(%s, %s)"] * len(changes))} '
+            f'ON CONFLICT (tag) DO UPDATE SET active_count = {table}.active_count + EXCLUDED.active_count',
+            [value for item in sorted(changes.items()) for value in item])
+
+
+def rebuild() -> int:
+    '''
+    Пересчитывает TagCount по активным мероприятиям и возвращает количество тегов
+    '''
+    table = connection.ops.quote_name(models.TagCount._meta.db_table)
+    events = connection.ops.quote_name(models.Event._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(
+            f'INSERT INTO {table} (tag, active_count) '
+            f'SELECT tag, count(DISTINCT event.id) FROM {events} AS event, jsonb_array_elements_text('
+            f'CASE WHEN jsonb_typeof(event.tags) = %s THEN event.tags ELSE %s::jsonb END) AS tag '
+            f'WHERE event.is_active GROUP BY tag', ['array', '[]'])
+        return cursor.rowcount
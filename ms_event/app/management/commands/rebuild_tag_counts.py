@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import adapters.tag_counts as tag_counts
+
+
+class Command(BaseCommand):
+    help = '''Пересчитывает TagCount (количество активных мероприятий по тегам)
+по таблице Event. Нужна, если счетчики разошлись после ручных правок в базе.'''
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = tag_counts.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counts of {count} tags'))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import app.models as models
+
+
+class Command(BaseCommand):
+    help = '''Записывает в outbox сообщение EVENT_UPDATED для каждого мероприятия.
+По нему потребители обновляют свои копии мероприятий: ms_teams заполняет автора
+у мероприятий, созданных до того, как автор стал передаваться в сообщениях.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='количество сообщений, записываемых одним запросом')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        count = 0
+        batch = []
+        with transaction.atomic():
+            events = models.Event.objects.select_related('author__user').order_by('id')
+            for event in events.iterator(chunk_size=batch_size):
+                batch.append(models.OutboxMessage(
+                    routing_key=settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY, payload=event.to_dict()))
+                if len(batch) >= batch_size:
+                    count += len(models.OutboxMessage.objects.bulk_create(batch))
+                    batch = []
+            count += len(models.OutboxMessage.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(f'Queued {count} event messages'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_event_is_active_alter_event_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created_at', 'id'], name='event_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-17 19:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вес A - название, B - краткое описание, C - полное описание.
+# Конфигурация должна совпадать с core.search.SEARCH_CONFIG
+CREATE_TRIGGER = '''
+CREATE FUNCTION event_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.full_description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER event_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, full_description, search_vector ON app_event
+    FOR EACH ROW EXECUTE FUNCTION event_search_vector_update();
+
+UPDATE app_event SET search_vector = NULL;
+'''
+
+DROP_TRIGGER = '''
+DROP TRIGGER IF EXISTS event_search_vector_trigger ON app_event;
+DROP FUNCTION IF EXISTS event_search_vector_update();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
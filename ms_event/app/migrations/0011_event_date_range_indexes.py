@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_active_start_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'start_date', 'id'], name='event_active_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_active', 'end_date'], name='event_active_end_date_idx'),
+        ),
+    ]
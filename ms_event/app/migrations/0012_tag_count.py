@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-17 19:17
+
+from django.db import migrations, models
+
+# Заполняет счетчики по уже существующим мероприятиям (как команда rebuild_tag_counts)
+BACKFILL = '''
+INSERT INTO app_tagcount (tag, active_count)
+SELECT tag, count(DISTINCT event.id) FROM app_event AS event, jsonb_array_elements_text(
+    CASE WHEN jsonb_typeof(event.tags) = 'array' THEN event.tags ELSE '[]'::jsonb END) AS tag
+WHERE event.is_active GROUP BY tag;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_event_date_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.TextField(unique=True)),
+                ('active_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
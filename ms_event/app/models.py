@@ -1,6 +1,10 @@
+import uuid
 import jwt
 import datetime
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.conf import settings
 # Create your models here.
@@ -45,6 +49,22 @@ class Event(models.Model):
     author = models.ForeignKey(ManuscriptUser, on_delete=models.CASCADE)
     tags = models.JSONField(default=list)
     is_active = models.BooleanField(default=True)
+    # Заполняется триггером event_search_vector_update (миграция 0010)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='event_created_at_id_idx'),
+            models.Index(fields=['is_active', 'start_date', 'id'],
+                         name='event_active_start_date_idx'),
+            models.Index(fields=['is_active', 'end_date'],
+                         name='event_active_end_date_idx'),
+            models.Index(fields=['is_active', 'location'],
+                         name='event_active_location_idx'),
+            GinIndex(fields=['tags'], name='event_tags_gin_idx'),
+            GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name} ({self.type.name}): {self.start_date} - {self.end_date}'
@@ -74,3 +94,44 @@ class Event(models.Model):
         if self.image and hasattr(self.image, 'url'):
             return self.image.url
         return None
+
+
+class TagCount(models.Model):
+    '''
+    Количество активных мероприятий с тегом. Поддерживается EventRepository
+    при create/edit/deactivate и пересчитывается командой rebuild_tag_counts
+    '''
+    # Длина тегов в Event.tags не ограничена, поэтому и здесь TextField
+    tag = models.TextField(unique=True)
+    active_count = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'{self.tag}: {self.active_count}'
+
+
+class OutboxMessage(models.Model):
+    '''
+    Исходящее сообщение RabbitMQ, записанное в транзакции изменения данных.
+    Отправляется и удаляется процессом entrypoints.outbox_relay
+    '''
+    # Публикуется как message_id AMQP: по нему потребители узнают повторную доставку
+    message_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    routing_key = models.CharField(max_length=255)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.id}: {self.routing_key}'
+
+
+class ProcessedMessage(models.Model):
+    '''
+    Журнал обработанных сообщений RabbitMQ: message_id записывается в транзакции
+    обработчика, поэтому повторная доставка того же сообщения пропускается.
+    Записи старше PROCESSED_MESSAGES_RETENTION удаляются потребителем
+    '''
+    message_id = models.UUIDField(primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.message_id}: {self.processed_at}'
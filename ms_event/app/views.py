@@ -46,6 +46,61 @@ def events(request):
         return Response({"message": f"Unknown error: {e}"}, status=400)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def events_tags(request):
+    logger.info(request.user, "GET /events/tags")
+    try:
+        uow = unit_of_work.DjangoORMUnitOfWork()
+        result = services.list_event_tags_service(uow=uow)
+        logger.info(request.user, "GET /events/tags SUCCESS")
+        return Response(result.to_response(), status=200)
+    except Exception as e:
+        logger.error(request.user, f"GET /events/tags ERROR: {e}")
+        return Response({"message": f"Unknown error: {e}"}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def events_upcoming(request):
+    logger.info(request.user, "GET /events/upcoming")
+    try:
+        uow = unit_of_work.DjangoORMUnitOfWork()
+        filter_params = {key: value
+                         for key, value in request.query_params.items()}
+        result = services.upcoming_events_service(uow=uow, **filter_params)
+        if result.is_ok:
+            logger.info(request.user, "GET /events/upcoming SUCCESS")
+            return Response(result.to_response(), status=200)
+        else:
+            logger.warning(
+                request.user, f"GET /events/upcoming FAIL: {result.to_response()}")
+            return Response(result.to_response(), status=400)
+    except Exception as e:
+        logger.error(request.user, f"GET /events/upcoming ERROR: {e}")
+        return Response({"message": f"Unknown error: {e}"}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def events_search(request):
+    logger.info(request.user, "GET /events/search")
+    try:
+        uow = unit_of_work.DjangoORMUnitOfWork()
+        result = services.search_events_service(
+            uow=uow, q=request.query_params.get('q'), limit=request.query_params.get('limit'))
+        if result.is_ok:
+            logger.info(request.user, "GET /events/search SUCCESS")
+            return Response(result.to_response(), status=200)
+        else:
+            logger.warning(
+                request.user, f"GET /events/search FAIL: {result.to_response()}")
+            return Response(result.to_response(), status=400)
+    except Exception as e:
+        logger.error(request.user, f"GET /events/search ERROR: {e}")
+        return Response({"message": f"Unknown error: {e}"}, status=400)
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticatedOrReadOnly])
 def event(request, event_id):
@@ -1,7 +1,13 @@
+# Ошибку конверта вызывает manuscript_shared.envelope, сервисы ловят тот же класс
+from manuscript_shared.exceptions import INVALID_MESSAGE_EXCEPTION_MESSAGE, InvalidMessageException
+
 UNKNOWN_EXCEPTION_MESSAGE = "Unknown error"
 EVENT_NOT_FOUND_EXCEPTION_MESSAGE = "Event not found"
 INVALID_EVENT_DATA_EXCEPTION_MESSAGE = "Invalid event data"
 USER_IS_NOT_EVENT_AUTHOR_EXCEPTION_MESSAGE = "User is not event author"
+INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE = "Invalid pagination params"
+INVALID_EVENT_FILTERS_EXCEPTION_MESSAGE = "Invalid event filters"
+INVALID_SEARCH_QUERY_EXCEPTION_MESSAGE = "Invalid search query"
 
 
 class EventNotFoundException(Exception):
@@ -14,3 +20,15 @@ class InvalidEventDataException(Exception):
 
 class UserIsNotEventAuthorException(Exception):
     message = USER_IS_NOT_EVENT_AUTHOR_EXCEPTION_MESSAGE
+
+
+class InvalidPaginationParamsException(Exception):
+    message = INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE
+
+
+class InvalidEventFiltersException(Exception):
+    message = INVALID_EVENT_FILTERS_EXCEPTION_MESSAGE
+
+
+class InvalidSearchQueryException(Exception):
+    message = INVALID_SEARCH_QUERY_EXCEPTION_MESSAGE
@@ -0,0 +1,121 @@
+import datetime
+from typing import Callable, Dict, NamedTuple, Optional
+
+# Разделитель значений в ?tags__any=python,django
+LIST_SEPARATOR = ','
+
+
+class Filter(NamedTuple):
+    '''
+    Описание разрешенного параметра фильтрации:
+    lookup - фильтр ORM, в который переводится параметр, coerce - приведение типа.
+    Если lookup равен None, coerce сам возвращает словарь фильтров
+    '''
+    lookup: Optional[str]
+    coerce: Callable
+
+
+def to_str(value) -> str:
+    value = str(value).strip()
+    if not value:
+        raise ValueError('Empty value')
+    return value
+
+
+def to_int(value) -> int:
+    return int(value)
+
+
+def to_date(value) -> str:
+    # ISO-строка подходит и для DateField, и для Fake-репозитория
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return datetime.date.fromisoformat(str(value)).isoformat()
+
+
+def to_list(value) -> list:
+    values = value if isinstance(value, (list, tuple)) else str(value).split(LIST_SEPARATOR)
+    values = [str(item).strip() for item in values if str(item).strip()]
+    if not values:
+        raise ValueError('Empty list')
+    return values
+
+
+def to_one_item_list(value) -> list:
+    return [to_str(value)]
+
+
+def to_overlaps(value) -> dict:
+    '''
+    ?overlaps=2024-05-01,2024-05-31 - мероприятия, которые идут хотя бы один день
+    в этом промежутке: start_date <= конец и end_date >= начало
+    '''
+    since, until = (to_date(item) for item in to_list(value))
+    if since > until:
+        raise ValueError('Empty range')
+    return {'start_date__lte': until, 'end_date__gte': since}
+
+
+# Разрешены только фильтры, которые обслуживаются индексами Event:
+# tags - GIN (event_tags_gin_idx), даты - B-tree (is_active, start_date, id)
+# и (is_active, end_date), location - B-tree (is_active, location),
+# author_id - индекс внешнего ключа
+EVENT_FILTERS = {
+    'location': Filter('location', to_str),
+    'author__id': Filter('author__id', to_int),
+    'tags__contains': Filter('tags__contains', to_one_item_list),
+    'tags__any': Filter('tags__has_any_keys', to_list),
+    'tags__all': Filter('tags__contains', to_list),
+    'start_date__gte': Filter('start_date__gte', to_date),
+    'start_date__lte': Filter('start_date__lte', to_date),
+    'end_date__gte': Filter('end_date__gte', to_date),
+    'end_date__lte': Filter('end_date__lte', to_date),
+    'starts_after': Filter('start_date__gte', to_date),
+    'ends_before': Filter('end_date__lte', to_date),
+    'overlaps': Filter(None, to_overlaps),
+}
+
+
+def compile_filters(params: Dict[str, object], allowed: Dict[str, Filter]) -> dict:
+    '''
+    Переводит параметры запроса в фильтры ORM по белому списку.
+    Вызывает ValueError, если параметр не разрешен или его значение некорректно
+
+            Args:
+                    params: [dict] - параметры запроса
+                    allowed: [Dict[str, Filter]] - разрешенные параметры
+
+            Returns:
+                    [dict] - фильтры для repository.list(**filters)
+    '''
+    compiled = {}
+    for key, value in params.items():
+        spec = allowed.get(key)
+        if spec is None:
+            raise ValueError(f'Filter is not allowed: {key}')
+        try:
+            value = spec.coerce(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid value of {key}: {value}') from e
+        lookups = value if spec.lookup is None else {spec.lookup: value}
+        for lookup, value in lookups.items():
+            compiled[lookup] = _merge(lookup, compiled[lookup], value) if lookup in compiled else value
+    return compiled
+
+
+def _merge(lookup: str, current, value):
+    '''
+    Объединяет два значения одного фильтра: tags__contains и tags__all дают общий список,
+    из нескольких границ диапазона дат остается самая узкая
+    '''
+    if isinstance(current, list):
+        return [*current, *value]
+    if lookup.endswith('__gte'):
+        return max(current, value)
+    if lookup.endswith('__lte'):
+        return min(current, value)
+    raise ValueError(f'Duplicate filter: {lookup}')
+
+
+def compile_event_filters(params: Dict[str, object]) -> dict:
+    return compile_filters(params, EVENT_FILTERS)
@@ -0,0 +1,24 @@
+import re
+from typing import List
+
+# Конфигурация без стемминга: названия и описания мероприятий пишутся на разных языках.
+# Должна совпадать с конфигурацией в триггере event_search_vector_update
+SEARCH_CONFIG = 'simple'
+MAX_SEARCH_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_terms(q: str) -> List[str]:
+    '''
+    Выделяет из поисковой строки слова. Операторы tsquery и прочие символы отбрасываются
+    '''
+    return [term.lower() for term in _TERM_RE.findall(q or '')][:MAX_SEARCH_TERMS]
+
+
+def to_prefix_tsquery(terms: List[str]) -> str:
+    '''
+    Строит tsquery, в котором все слова обязательны, а последнее ищется по префиксу:
+    "data sci" -> "data & sci:*". Так поиск работает при вводе текста
+    '''
+    return ' & '.join([*terms[:-1], f'{terms[-1]}:*'])
@@ -10,4 +10,8 @@ elif [ "$SERVICE_TYPE" = "consumer" ]; then
   # Run the event consumer command
   ./wait-for-it.sh ms_event:16010 --
   ./wait-for-it.sh rabbitmq:5672 -- python3 -m entrypoints.event_consumer
+elif [ "$SERVICE_TYPE" = "outbox_relay" ]; then
+  # Run the transactional outbox relay
+  ./wait-for-it.sh ms_event:16010 --
+  ./wait-for-it.sh rabbitmq:5672 -- python3 -m entrypoints.outbox_relay
 fi
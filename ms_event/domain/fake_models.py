@@ -1,7 +1,10 @@
+import datetime
+
+
 class Event():
     # is_active = models.BooleanField(default=True)
 
-    def __init__(self, name, image, location, location_url, description, full_description, start_date, end_date, author, tags, is_active=True):
+    def __init__(self, name, image, location, location_url, description, full_description, start_date, end_date, author, tags, is_active=True, created_at=None):
         self.name = name
         self.image = image
         self.location = location
@@ -13,6 +16,7 @@ class Event():
         self.author = author
         self.tags = tags
         self.is_active = is_active
+        self.created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
 
     def to_dict(self):
         return {
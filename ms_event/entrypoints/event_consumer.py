@@ -1,4 +1,7 @@
-import json
+import datetime
+import time
+import pika
+from typing import List
 import os
 os.environ['DJANGO_SETTINGS_MODULE'] = 'ms_event.settings'
 import service_layer.message_broker as mb
@@ -8,52 +11,83 @@ import app.models as models
 from django.conf import settings
 
 import core.logger as logger
+import adapters.processed_messages as processed_messages
+
+# Пауза перед переподключением после потери соединения с брокером
+RECONNECT_DELAY = 5
 
 
 def start(message_broker: mb.RabbitMQ):
     logger.info(user='CONSUMER',
                 message='Starting message broker connection...', logger=logger.mb_logger)
+    pool = mb.ConsumerPool(message_broker, ledger=processed_messages.record)
     try:
-        binds = [
-            (settings.RABBITMQ_QUEUE_USER_CREATED, settings.RABBITMQ_USER_CREATE_ROUTING_KEY, handle_user_creation),
-        ]
-        with message_broker:
-            for item in binds:
-                (queue, routing_key, callback) = item
-                message_broker.channel.queue_declare(queue=queue, durable=True)
-                message_broker.queue_bind(queue=queue, routing_key=routing_key)
-                message_broker.channel.basic_consume(
-                    queue=queue, on_message_callback=callback, auto_ack=True)
-            message_broker.start_consuming()
+        while True:
+            try:
+                consume(message_broker, pool)
+                break
+            except pika.exceptions.AMQPError as e:
+                # Неподтвержденные сообщения брокер доставит после переподключения
+                logger.error(user='CONSUMER',
+                             message=f'Connection lost: {e!r}, reconnecting in {RECONNECT_DELAY} seconds', logger=logger.mb_logger)
+                time.sleep(RECONNECT_DELAY)
     except Exception as e:
         logger.error(user='CONSUMER',
                      message=f'Error while consuming message: {e}', logger=logger.mb_logger)
     finally:
+        pool.shutdown()
         logger.info(user='CONSUMER',
                     message='Closing message broker connection...', logger=logger.mb_logger)
 
-def handle_user_creation(ch, method, properties, body):
+
+def consume(message_broker: mb.RabbitMQ, pool: mb.ConsumerPool):
+    with message_broker:
+        # Не больше prefetch неподтвержденных сообщений на очередь
+        message_broker.channel.basic_qos(
+            prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+        for item in BINDS:
+            (queue, routing_key, callback) = item
+            message_broker.channel.queue_declare(queue=queue, durable=True)
+            message_broker.queue_bind(queue=queue, routing_key=routing_key)
+            message_broker.declare_retry_queues(queue)
+            message_broker.channel.basic_consume(
+                queue=queue, on_message_callback=pool.wrap(callback, queue=queue), auto_ack=False)
+        pool.every(settings.PROCESSED_MESSAGES_PRUNE_INTERVAL, prune_processed_messages)
+        message_broker.start_consuming()
+
+
+def prune_processed_messages():
+    deleted = processed_messages.prune(
+        datetime.timedelta(seconds=settings.PROCESSED_MESSAGES_RETENTION))
     logger.info(user='CONSUMER',
-                message=f'Handle user creation with body: {body}', logger=logger.mb_logger)
-    try:
-        data = json.loads(body)
-        user = models.User.objects.create(
-            username=data['username'],
-            email=data['email'],
-            first_name=data['first_name'],
-            last_name=data['last_name'],
-        )
-        models.ManuscriptUser.objects.create(
-            id=data['id'],
-            user=user
-        )
-        logger.info(user='CONSUMER',
-                    message=f'User created: {user}', logger=logger.mb_logger)
-    except Exception as e:
-        logger.error(user='CONSUMER',
-                     message=f'Error while user creation: {e}', logger=logger.mb_logger)
+                message=f'Pruned {deleted} processed message ids', logger=logger.mb_logger)
+
+
+def handle_user_creation(messages: List[mb.Message]):
+    logger.info(user='CONSUMER',
+                message=f'Handle creation of {len(messages)} users', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    # На PostgreSQL bulk_create возвращает объекты с id
+    users = models.User.objects.bulk_create([models.User(
+        username=item['username'],
+        email=item['email'],
+        first_name=item['first_name'],
+        last_name=item['last_name'],
+    ) for item in data])
+    models.ManuscriptUser.objects.bulk_create([models.ManuscriptUser(
+        id=item['id'],
+        user=user
+    ) for item, user in zip(data, users)])
+    logger.info(user='CONSUMER',
+                message=f'Users created: {[item["id"] for item in data]}', logger=logger.mb_logger)
+
+
+# Очереди потребителя: (очередь, ключ маршрутизации, обработчик)
+BINDS = [
+    (settings.RABBITMQ_QUEUE_USER_CREATED, settings.RABBITMQ_USER_CREATE_ROUTING_KEY, handle_user_creation),
+]
 
 
 if __name__ == '__main__':
-    message_broker = mb.RabbitMQ()
+    message_broker = mb.create_broker()
     start(message_broker=message_broker)
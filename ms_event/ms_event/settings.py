@@ -220,6 +220,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # settings.py
 
+# Брокер сообщений: rabbitmq или memory (брокер в памяти процесса)
+MESSAGE_BROKER = cfg['MESSAGE_BROKER']
+
 # RabbitMQ settings
 # or the hostname where RabbitMQ is running
 RABBITMQ_HOST = cfg['RABBITMQ_LOCAL_HOST']
@@ -236,4 +239,20 @@ RABBITMQ_USER_CREATE_ROUTING_KEY = cfg['RABBITMQ_USER_CREATE_ROUTING_KEY']
 RABBITMQ_EVENT_CREATE_ROUTING_KEY = cfg['RABBITMQ_EVENT_CREATE_ROUTING_KEY']
 RABBITMQ_EVENT_EDIT_ROUTING_KEY = cfg['RABBITMQ_EVENT_EDIT_ROUTING_KEY']
 
+RABBITMQ_HEARTBEAT = cfg['RABBITMQ_HEARTBEAT']
+RABBITMQ_PREFETCH_COUNT = cfg['RABBITMQ_PREFETCH_COUNT']
+RABBITMQ_CONSUMER_WORKERS = cfg['RABBITMQ_CONSUMER_WORKERS']
+RABBITMQ_CONSUMER_BATCH_SIZE = cfg['RABBITMQ_CONSUMER_BATCH_SIZE']
+RABBITMQ_CONSUMER_BATCH_LINGER = cfg['RABBITMQ_CONSUMER_BATCH_LINGER']
+RABBITMQ_RETRY_DELAYS = cfg['RABBITMQ_RETRY_DELAYS']
+PROCESSED_MESSAGES_RETENTION = cfg['PROCESSED_MESSAGES_RETENTION']
+PROCESSED_MESSAGES_PRUNE_INTERVAL = cfg['PROCESSED_MESSAGES_PRUNE_INTERVAL']
+RABBITMQ_PUBLISH_QUEUE_SIZE = cfg['RABBITMQ_PUBLISH_QUEUE_SIZE']
+RABBITMQ_PUBLISH_BATCH_SIZE = cfg['RABBITMQ_PUBLISH_BATCH_SIZE']
+RABBITMQ_PUBLISH_LINGER = cfg['RABBITMQ_PUBLISH_LINGER']
+RABBITMQ_CONTENT_TYPE = cfg['RABBITMQ_CONTENT_TYPE']
+
+OUTBOX_BATCH_SIZE = cfg['OUTBOX_BATCH_SIZE']
+OUTBOX_POLL_INTERVAL = cfg['OUTBOX_POLL_INTERVAL']
+
 TOKEN_SECRET = 'neon-gravestones'
@@ -20,5 +20,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     # path('create/', views.create_event, name='create_event'),
     path('events/<int:event_id>', views.event, name='get_event'),
+    path('events/search', views.events_search, name='events_search'),
+    path('events/upcoming', views.events_upcoming, name='events_upcoming'),
+    path('events/tags', views.events_tags, name='events_tags'),
     path('events/', views.events, name='events'),
 ]
@@ -1,10 +1,12 @@
-import json
 from django.conf import settings
-import service_layer.message_broker as mb
+from django.utils import timezone
 import service_layer.unit_of_work as uow
 from service_layer.result import Result
 import core.exceptions as exceptions
 import core.logger as logger
+import manuscript_shared.pagination as pagination
+import core.filters as filters
+import core.search as search
 
 
 def get_event_service(uow: uow.AbstractUnitOfWork, id: int):
@@ -15,24 +17,84 @@ def get_event_service(uow: uow.AbstractUnitOfWork, id: int):
         return Result(data=event.to_dict(), error=None)
 
 
-def list_events_service(uow: uow.AbstractUnitOfWork, **kwargs):
+def list_events_service(uow: uow.AbstractUnitOfWork, limit=None, cursor=None, **params):
     with uow:
-        events = uow.event.list(**kwargs)
+        try:
+            kwargs = filters.compile_event_filters(params)
+        except ValueError:
+            return Result(data=None, error=exceptions.InvalidEventFiltersException)
+        if limit is None and cursor is None:
+            events = uow.event.list(**kwargs)
+            return Result(data=[event.to_dict() for event in events], error=None)
+        try:
+            limit, cursor = pagination.parse_page_params(limit, cursor)
+        except ValueError:
+            return Result(data=None, error=exceptions.InvalidPaginationParamsException)
+        events, next_cursor = pagination.paginate(
+            uow.event.list(limit=limit + 1, cursor=cursor, **kwargs), limit)
+        return Result(data={"results": [event.to_dict() for event in events],
+                            "next_cursor": next_cursor}, error=None)
+
+
+def list_event_tags_service(uow: uow.AbstractUnitOfWork):
+    '''
+    Возвращает количество активных мероприятий по каждому тегу {тег: количество}
+    '''
+    with uow:
+        return Result(data=uow.event.tag_counts(), error=None)
+
+
+def upcoming_events_service(uow: uow.AbstractUnitOfWork, limit=None, cursor=None, **params):
+    '''
+    Лента предстоящих мероприятий (начиная с сегодняшнего дня), отсортированная по дате начала.
+    Постраничный вывод по курсору (start_date, id)
+    '''
+    with uow:
+        try:
+            kwargs = filters.compile_event_filters(params)
+        except ValueError:
+            return Result(data=None, error=exceptions.InvalidEventFiltersException)
+        try:
+            limit, cursor = pagination.parse_page_params(limit, cursor, parse=pagination.parse_date)
+        except ValueError:
+            return Result(data=None, error=exceptions.InvalidPaginationParamsException)
+        since = timezone.localdate().isoformat()
+        if 'start_date__gte' in kwargs:
+            since = max(since, kwargs.pop('start_date__gte'))
+        events, next_cursor = pagination.paginate(
+            uow.event.upcoming(since, limit=limit + 1, cursor=cursor, **kwargs), limit, field='start_date')
+        return Result(data={"results": [event.to_dict() for event in events],
+                            "next_cursor": next_cursor}, error=None)
+
+
+def search_events_service(uow: uow.AbstractUnitOfWork, q=None, limit=None):
+    '''
+    Полнотекстовый поиск мероприятий по названию и описаниям с ранжированием
+    '''
+    with uow:
+        terms = search.parse_terms(q)
+        if not terms:
+            return Result(data=None, error=exceptions.InvalidSearchQueryException)
+        try:
+            limit, _ = pagination.parse_page_params(limit)
+        except ValueError:
+            return Result(data=None, error=exceptions.InvalidPaginationParamsException)
+        events = uow.event.search(terms, limit=limit)
         return Result(data=[event.to_dict() for event in events], error=None)
 
 
 def create_event_service(uow: uow.AbstractUnitOfWork, username, **kwargs, ):
-    with uow:
+    with uow, uow.transaction():
         if not kwargs.get('name'):
             return Result(data=None, error=exceptions.InvalidEventDataException)
         user = uow.user.get(username=username)
         event = uow.event.create(author=user, **kwargs)
-        handle_publish_message_on_event_created(data=event.to_dict())
+        handle_publish_message_on_event_created(uow, data=event.to_dict())
         return Result(data=event.to_dict(), error=None)
 
 
 def edit_event_service(uow: uow.AbstractUnitOfWork, id: int, username: str, **kwargs, ):
-    with uow:
+    with uow, uow.transaction():
         if not kwargs.get('name'):
             return Result(data=None, error=exceptions.InvalidEventDataException)
         event = uow.event.get(id=id)
@@ -42,12 +104,12 @@ def edit_event_service(uow: uow.AbstractUnitOfWork, id: int, username: str, **kw
         if event.author != user:
             return Result(data=None, error=exceptions.UserIsNotEventAuthorException)
         event = uow.event.edit(id=id, **kwargs)
-        handle_publish_message_on_event_edited(data=event.to_dict())
+        handle_publish_message_on_event_edited(uow, data=event.to_dict())
         return Result(data=event.to_dict(), error=None)
 
 
 def deactivate_event_service(uow: uow.AbstractUnitOfWork, id: int, username: str):
-    with uow:
+    with uow, uow.transaction():
         event = uow.event.get(id=id)
         if event is None:
             return Result(data=None, error=exceptions.EventNotFoundException)
@@ -55,38 +117,23 @@ def deactivate_event_service(uow: uow.AbstractUnitOfWork, id: int, username: str
         if event.author != user:
             return Result(data=None, error=exceptions.UserIsNotEventAuthorException)
         event = uow.event.deactivate(id=id)
-        handle_publish_message_on_event_edited(data=event.to_dict())
+        handle_publish_message_on_event_edited(uow, data=event.to_dict())
         return Result(data=event.to_dict(), error=None)
 
 
-def handle_publish_message_on_event_created(data):
-    try:
-        if settings.DEBUG:
-            return
-        else:
-            message_broker = mb.RabbitMQ()
-        with message_broker:
-            message_broker.publish(
-                message=json.dumps(data), routing_key=settings.RABBITMQ_EVENT_CREATE_ROUTING_KEY)
-        logger.info(user='PUBLISHER',
-                    message=f'Data({data}) sent to {settings.RABBITMQ_EVENT_CREATE_ROUTING_KEY}', logger=logger.mb_logger)
-    except Exception as e:
-        logger.error(
-            user='PUBLISHER', message=f'Error while publishing message on event created: {e}', logger=logger.mb_logger)
-
-
-def handle_publish_message_on_event_edited(data):
-    try:
-        if settings.DEBUG:
-            return
-        else:
-            message_broker = mb.RabbitMQ()
-
-        with message_broker:
-            message_broker.publish(
-                message=json.dumps(data), routing_key=settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY)
-        logger.info(user='PUBLISHER',
-                    message=f'Data({data}) sent to {settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY}', logger=logger.mb_logger)
-    except Exception as e:
-        logger.error(
-            user='PUBLISHER', message=f'Error while publishing message on event edited: {e}', logger=logger.mb_logger)
+def handle_publish_message_on_event_created(uow: uow.AbstractUnitOfWork, data):
+    '''
+    Записывает сообщение о создании мероприятия в outbox в транзакции сервиса
+    '''
+    uow.outbox.add(routing_key=settings.RABBITMQ_EVENT_CREATE_ROUTING_KEY, payload=data)
+    logger.info(user='PUBLISHER',
+                message=f'Data({data}) queued to {settings.RABBITMQ_EVENT_CREATE_ROUTING_KEY}', logger=logger.mb_logger)
+
+
+def handle_publish_message_on_event_edited(uow: uow.AbstractUnitOfWork, data):
+    '''
+    Записывает сообщение об изменении мероприятия в outbox в транзакции сервиса
+    '''
+    uow.outbox.add(routing_key=settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY, payload=data)
+    logger.info(user='PUBLISHER',
+                message=f'Data({data}) queued to {settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY}', logger=logger.mb_logger)
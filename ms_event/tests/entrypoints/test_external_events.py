@@ -1,8 +1,10 @@
+import json
 from django.test import TestCase
 from unittest.mock import MagicMock, call
 from django.conf import settings
 
 import entrypoints.event_consumer as event_consumer
+import service_layer.message_broker as message_broker
 import app.models as models
 
 
@@ -25,10 +27,13 @@ class TestExternalEvents(TestCase):
             call(queue=settings.RABBITMQ_QUEUE_USER_CREATED,
                  routing_key=settings.RABBITMQ_USER_CREATE_ROUTING_KEY),
         ])
-        mb.channel.basic_consume.assert_has_calls([
-            call(queue=settings.RABBITMQ_QUEUE_USER_CREATED,
-                 on_message_callback=event_consumer.handle_user_creation, auto_ack=True),
-        ])
+        mb.channel.basic_qos.assert_called_once_with(
+            prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+        consume = mb.channel.basic_consume.call_args
+        self.assertEqual(consume.kwargs['queue'], settings.RABBITMQ_QUEUE_USER_CREATED)
+        self.assertFalse(consume.kwargs['auto_ack'])
+        self.assertEqual(consume.kwargs['on_message_callback'].handler,
+                         event_consumer.handle_user_creation)
 
     def test_handle_user_creation_event_should_create_user(self):
         # Mock the parameters for RabbitMQ channel, method, properties, and body
@@ -38,7 +43,7 @@ class TestExternalEvents(TestCase):
         body = '{"id": 999, "username": "testuser", "email": "test@example.com", "first_name": "Test", "last_name": "User"}'
 
         # Call the handle_user_creation function with the mocked parameters
-        event_consumer.handle_user_creation(ch, method, properties, body)
+        event_consumer.handle_user_creation([message_broker.Message(method, properties, body, json.loads(body))])
 
         # Assert that the User and ManuscriptUser objects were created correctly
         self.assertTrue(models.User.objects.filter(
@@ -1,4 +1,5 @@
 import json
+import datetime
 
 from django.test import TestCase, override_settings
 from django.conf import settings
@@ -180,10 +181,111 @@ class TestEventServices(TestCase):
         expected = Result(data=[event.to_dict() for event in self.uow.event.list(
             author=my_user)], error=None)
         result = services.list_events_service(
-            uow=self.uow, author=my_user)
+            uow=self.uow, author__id=str(my_user.id))
         self.assertEqual(result, expected)
         self.assertEqual(len(result.data), 5)
 
+    def test_list_events_service_should_filter_events_by_any_and_all_tags_and_dates(self):
+        for tags, start_date in [(['a', 'b'], '2020-01-01'), (['b'], '2020-02-01'), (['c'], '2020-03-01')]:
+            self.uow.event.create(
+                name="test_event", image='test_image', location='Almaty', location_url='',
+                description='', full_description='', start_date=start_date, end_date=start_date,
+                author=self.user, tags=tags)
+        result = services.list_events_service(uow=self.uow, tags__any='a,c')
+        self.assertEqual([event['id'] for event in result.data], [1, 3])
+        result = services.list_events_service(uow=self.uow, tags__all='a,b')
+        self.assertEqual([event['id'] for event in result.data], [1])
+        result = services.list_events_service(
+            uow=self.uow, tags__contains='b', start_date__gte='2020-01-15', start_date__lte='2020-03-01')
+        self.assertEqual([event['id'] for event in result.data], [2])
+
+    def test_list_events_service_should_return_result_with_error_when_filter_is_not_allowed(self):
+        expected = Result(data=None, error=exceptions.InvalidEventFiltersException)
+        self.assertEqual(services.list_events_service(uow=self.uow, name='test_event'), expected)
+        self.assertEqual(services.list_events_service(uow=self.uow, description__icontains='a'), expected)
+
+    def test_list_events_service_should_return_result_with_error_when_filter_value_is_invalid(self):
+        expected = Result(data=None, error=exceptions.InvalidEventFiltersException)
+        self.assertEqual(services.list_events_service(uow=self.uow, start_date__gte='yesterday'), expected)
+        self.assertEqual(services.list_events_service(uow=self.uow, author__id='me'), expected)
+        self.assertEqual(services.list_events_service(uow=self.uow, tags__any=','), expected)
+
+    # Date ranges and upcoming events
+    def create_dated_event(self, start_date, end_date, is_active=True):
+        return self.uow.event.create(
+            name="test_event", image='test_image', location='Almaty', location_url='', description='',
+            full_description='', start_date=str(start_date), end_date=str(end_date),
+            author=self.user, tags=[], is_active=is_active)
+
+    def test_list_events_service_should_filter_events_by_date_range(self):
+        may = self.create_dated_event('2024-05-01', '2024-05-03')
+        across = self.create_dated_event('2024-05-30', '2024-06-02')
+        june = self.create_dated_event('2024-06-10', '2024-06-12')
+        result = services.list_events_service(uow=self.uow, overlaps='2024-06-01,2024-06-30')
+        self.assertEqual([event['id'] for event in result.data], [across.id, june.id])
+        result = services.list_events_service(uow=self.uow, starts_after='2024-05-02', ends_before='2024-06-05')
+        self.assertEqual([event['id'] for event in result.data], [across.id])
+        result = services.list_events_service(uow=self.uow, ends_before='2024-05-31')
+        self.assertEqual([event['id'] for event in result.data], [may.id])
+
+    def test_list_events_service_should_return_result_with_error_when_range_is_invalid(self):
+        expected = Result(data=None, error=exceptions.InvalidEventFiltersException)
+        self.assertEqual(services.list_events_service(uow=self.uow, overlaps='2024-06-30,2024-06-01'), expected)
+        self.assertEqual(services.list_events_service(uow=self.uow, overlaps='2024-06-30'), expected)
+
+    def test_upcoming_events_service_should_paginate_future_events_by_start_date(self):
+        today = datetime.date.today()
+        self.create_dated_event(today - datetime.timedelta(days=1), today)
+        expected = [self.create_dated_event(today + datetime.timedelta(days=days), today + datetime.timedelta(days=days))
+                    for days in (3, 0, 3, 1)]
+        self.create_dated_event(today + datetime.timedelta(days=2), today, is_active=False)
+        expected = [event.id for event in sorted(expected, key=lambda event: (event.start_date, event.id))]
+        received, cursor = [], None
+        while True:
+            result = services.upcoming_events_service(uow=self.uow, limit=3, cursor=cursor)
+            received += [event['id'] for event in result.data['results']]
+            cursor = result.data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(received, expected)
+
+    def test_upcoming_events_service_should_return_result_with_error_when_cursor_is_invalid(self):
+        expected = Result(data=None, error=exceptions.InvalidPaginationParamsException)
+        self.assertEqual(services.upcoming_events_service(uow=self.uow, cursor='invalid'), expected)
+
+    # Tags
+    def test_list_event_tags_service_should_count_active_events_per_tag(self):
+        kwargs = dict(name="test_event", image='test_image', location='Almaty', location_url='', description='',
+                      full_description='', start_date='2020-01-01', end_date='2020-01-02', author=self.user)
+        first = self.uow.event.create(tags=['a', 'b', 'b'], **kwargs)
+        second = self.uow.event.create(tags=['b', 'c'], **kwargs)
+        self.uow.event.create(tags=['a'], is_active=False, **kwargs)
+        self.assertEqual(services.list_event_tags_service(uow=self.uow),
+                         Result(data={'b': 2, 'a': 1, 'c': 1}, error=None))
+        self.uow.event.edit(second.id, tags=['c', 'd'])
+        self.uow.event.deactivate(first.id)
+        self.assertEqual(services.list_event_tags_service(uow=self.uow),
+                         Result(data={'c': 1, 'd': 1}, error=None))
+
+    # Search events
+    def create_search_event(self, name, description='', full_description='', is_active=True):
+        return self.uow.event.create(
+            name=name, image='test_image', location='Almaty', location_url='', description=description,
+            full_description=full_description, start_date='2020-01-01', end_date='2020-01-02',
+            author=self.user, tags=[], is_active=is_active)
+
+    def test_search_events_service_should_return_ranked_events_matching_prefix(self):
+        in_description = self.create_search_event('Hackathon', description='Data science weekend')
+        in_name = self.create_search_event('Data Science Cup')
+        self.create_search_event('Data engineering meetup')
+        self.create_search_event('Data science camp', is_active=False)
+        result = services.search_events_service(uow=self.uow, q='data sci')
+        self.assertEqual(result, Result(data=[in_name.to_dict(), in_description.to_dict()], error=None))
+
+    def test_search_events_service_should_return_result_with_error_when_query_is_empty(self):
+        expected = Result(data=None, error=exceptions.InvalidSearchQueryException)
+        self.assertEqual(services.search_events_service(uow=self.uow, q=' & !'), expected)
+
     # Create event
     def test_create_event_service_should_return_event(self):
         expected = Result(data={
@@ -212,6 +314,8 @@ class TestEventServices(TestCase):
             "tags": ['test_tag1', 'test_tag2'],
         })
         self.assertEqual(result, expected)
+        self.assertEqual(self.uow.outbox.list(routing_key=settings.RABBITMQ_EVENT_CREATE_ROUTING_KEY),
+                         [expected.data])
 
     def test_create_event_service_should_return_result_with_error_when_data_is_invalid(self):
         expected = Result(
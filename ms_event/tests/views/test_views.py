@@ -1,10 +1,15 @@
+import io
 import json
+import datetime
+from django.conf import settings
+from django.core.management import call_command
 from django.test import TransactionTestCase, override_settings
 from rest_framework.test import APIClient as Client
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
 import service_layer.unit_of_work as uow
+import app.models as models
 import core.exceptions as exceptions
 
 import shutil
@@ -25,7 +30,8 @@ def create_user(username="test@gmail.com", password="testpassword", first_name="
         return user
 
 
-def create_event(user, name="test_event", location='Almaty', tags=['test_tag1', 'test_tag2'], is_active=True):
+def create_event(user, name="test_event", location='Almaty', tags=['test_tag1', 'test_tag2'], is_active=True,
+                 start_date='2020-01-01', end_date='2020-01-02'):
     django_uow = uow.DjangoORMUnitOfWork()
     with django_uow:
         image = SimpleUploadedFile(
@@ -37,8 +43,8 @@ def create_event(user, name="test_event", location='Almaty', tags=['test_tag1',
             "location_url": 'https://www.google.com',
             "description": 'Test description',
             "full_description": 'Test full description',
-            "start_date": '2020-01-01',
-            "end_date": '2020-01-02',
+            "start_date": start_date,
+            "end_date": end_date,
             "author": user,
             "tags": tags,
             "is_active": is_active
@@ -139,6 +145,108 @@ class TestEventManagement(TransactionTestCase):
         self.assertEqual(
             content['error'], None)
 
+    def test_events_get_should_return_list_of_events_by_any_and_all_tags(self):
+        tag1_event = create_event(user=self.user, tags=['tag1', 'tag3']).to_dict()
+        tag2_event = create_event(user=self.user, tags=['tag2', 'tag3']).to_dict()
+        response = self.client.get("/events/?tags__any=tag1,tag2")
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(json.loads(response.content)['data'], [tag1_event, tag2_event])
+        response = self.client.get("/events/?tags__all=tag2,tag3")
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(json.loads(response.content)['data'], [tag2_event])
+
+    def test_events_get_should_return_error_when_filter_is_not_allowed(self):
+        response = self.client.get("/events/?description__icontains=test")
+        self.assertEqual(response.status_code, 400)
+        content = json.loads(response.content)
+        self.assertEqual(
+            content['error'], exceptions.INVALID_EVENT_FILTERS_EXCEPTION_MESSAGE)
+
+    def test_events_search_get_should_return_ranked_events_matching_prefix(self):
+        in_name = create_event(user=self.user, name='Kazakhstan Hackathon')
+        edited = create_event(user=self.user, name='Weekend meetup')
+        django_uow = uow.DjangoORMUnitOfWork()
+        with django_uow:
+            django_uow.event.edit(edited.id, full_description='Hackathon afterparty')
+        create_event(user=self.user, name='Hackathon archive', is_active=False)
+        response = self.client.get("/events/search?q=hack")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual([event['id'] for event in content['data']], [in_name.id, edited.id])
+        self.assertNotIn('search_vector', content['data'][0])
+
+    def test_events_search_get_should_return_error_when_query_is_empty(self):
+        response = self.client.get("/events/search?q=")
+        self.assertEqual(response.status_code, 400)
+        content = json.loads(response.content)
+        self.assertEqual(
+            content['error'], exceptions.INVALID_SEARCH_QUERY_EXCEPTION_MESSAGE)
+
+    def test_events_get_should_return_events_overlapping_date_range(self):
+        overlapping = create_event(user=self.user, start_date='2024-05-30', end_date='2024-06-02')
+        create_event(user=self.user, start_date='2024-07-01', end_date='2024-07-02')
+        response = self.client.get("/events/?overlaps=2024-06-01,2024-06-30")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual([event['id'] for event in content['data']], [overlapping.id])
+
+    def test_events_upcoming_get_should_paginate_events_by_start_date(self):
+        today = datetime.date.today()
+        event_ids = [create_event(user=self.user, start_date=today + datetime.timedelta(days=days),
+                                  end_date=today + datetime.timedelta(days=days)).id for days in (2, 0, 1, 2)]
+        expected = [event_ids[1], event_ids[2], event_ids[0], event_ids[3]]
+        response = self.client.get("/events/upcoming?limit=3")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        received = [event['id'] for event in content['data']['results']]
+        response = self.client.get(
+            f"/events/upcoming?limit=3&cursor={content['data']['next_cursor']}")
+        content = json.loads(response.content)
+        received += [event['id'] for event in content['data']['results']]
+        self.assertEqual(received, expected)
+        self.assertIsNone(content['data']['next_cursor'])
+
+    def test_events_tags_get_should_return_active_event_counts_per_tag(self):
+        event = create_event(user=self.user, tags=['tag1', 'tag3'])
+        create_event(user=self.user, tags=['tag3'], is_active=False)
+        response = self.client.put(
+            f"/events/{event.id}", data={'name': 'test_event', 'tags': ['tag3', 'tag4']}, **{"HTTP_AUTHORIZATION": f"Bearer {self.token}"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/events/tags")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual(content['data'], {'tag3': 1, 'tag4': 1, 'test_tag1': 1, 'test_tag2': 1})
+
+    def test_events_tags_get_should_count_long_tags(self):
+        long_tag = 'tag' * 100
+        event = create_event(user=self.user, tags=[long_tag])
+        response = self.client.put(
+            f"/events/{event.id}", data={'name': 'test_event', 'tags': [long_tag, 'tag1']}, **{"HTTP_AUTHORIZATION": f"Bearer {self.token}"})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/events/tags")
+        content = json.loads(response.content)
+        self.assertEqual(content['data'][long_tag], 1)
+
+    def test_rebuild_tag_counts_command_should_restore_counts(self):
+        create_event(user=self.user, tags=['tag1'])
+        models.TagCount.objects.all().delete()
+        models.TagCount.objects.create(tag='stale', active_count=5)
+        out = io.StringIO()
+        call_command('rebuild_tag_counts', stdout=out)
+        self.assertIn('Rebuilt counts of 3 tags', out.getvalue())
+        response = self.client.get("/events/tags")
+        content = json.loads(response.content)
+        self.assertEqual(content['data'], {'test_tag1': 1, 'test_tag2': 1, 'tag1': 1})
+
+    def test_republish_events_command_should_queue_event_with_author(self):
+        models.OutboxMessage.objects.all().delete()
+        out = io.StringIO()
+        call_command('republish_events', batch_size=1, stdout=out)
+        self.assertIn('Queued 1 event messages', out.getvalue())
+        message = models.OutboxMessage.objects.get()
+        self.assertEqual(message.routing_key, settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY)
+        self.assertEqual((message.payload['id'], message.payload['author']['id']), (self.event.id, self.user.id))
+
     def test_events_get_should_return_list_of_active_events_when_no_params_passed(self):
         active_events = [self.event.to_dict()]
         for _ in range(5):
@@ -173,6 +281,27 @@ class TestEventManagement(TransactionTestCase):
         self.assertEqual(
             content['error'], None)
 
+    def test_events_get_should_paginate_events_by_cursor(self):
+        event_ids = [self.event.id] + \
+            [create_event(user=self.user).id for _ in range(4)]
+        response = self.client.get("/events/?limit=2")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        received = [event['id'] for event in content['data']['results']]
+        while content['data']['next_cursor']:
+            response = self.client.get(
+                f"/events/?limit=2&cursor={content['data']['next_cursor']}")
+            content = json.loads(response.content)
+            received += [event['id'] for event in content['data']['results']]
+        self.assertEqual(received, event_ids)
+
+    def test_events_get_should_return_error_when_limit_is_invalid(self):
+        response = self.client.get("/events/?limit=-1")
+        self.assertEqual(response.status_code, 400)
+        content = json.loads(response.content)
+        self.assertEqual(
+            content['error'], exceptions.INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE)
+
     # Create event
     def test_events_post_should_return_event(self):
         image = SimpleUploadedFile(
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+import entrypoints.event_consumer as event_consumer
+import service_layer.message_broker as mb
+
+
+class Command(BaseCommand):
+    help = '''Показывает или возвращает в рабочие очереди сообщения из dead-letter
+очередей потребителя (<очередь>.dlq), которые не обработались после всех повторов.
+redrive возвращает сообщения в рабочую очередь со сброшенным счетчиком попыток.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'redrive'])
+        parser.add_argument('--queue', action='append',
+                            help='Рабочая очередь, по умолчанию все очереди потребителя')
+        parser.add_argument('--limit', type=int, default=100,
+                            help='Максимальное количество сообщений из каждой очереди')
+
+    def handle(self, *args, **options):
+        queues = options['queue'] or [queue for queue, _, _ in event_consumer.BINDS]
+        redrive = options['action'] == 'redrive'
+        with mb.RabbitMQ() as message_broker:
+            if redrive:
+                # Публикация в рабочую очередь и ack в DLQ фиксируются одной транзакцией:
+                # если commit не прошел, сообщения остаются в DLQ
+                message_broker.select_transactions()
+            for queue in queues:
+                messages = message_broker.dead_letters(queue, limit=options['limit'], redrive=redrive)
+                if redrive:
+                    message_broker.commit()
+                for message in messages:
+                    headers = message.properties.headers or {}
+                    self.stdout.write(
+                        f'{message.properties.message_id} attempts={headers.get(mb.RETRY_COUNT_HEADER)} '
+                        f'error={headers.get(mb.LAST_ERROR_HEADER)} body={message.body[:200]!r}')
+                action = 'Redriven' if redrive else 'Found'
+                self.stdout.write(self.style.SUCCESS(
+                    f'{action} {len(messages)} messages in {mb.dead_letter_queue_name(queue)}'))
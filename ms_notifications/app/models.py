@@ -57,3 +57,16 @@ class Notification(models.Model):
             'created_at': created_at,
             'updated_at': updated_at,
         }
+
+
+class ProcessedMessage(models.Model):
+    '''
+    Журнал обработанных сообщений RabbitMQ: message_id записывается в транзакции
+    обработчика, поэтому повторная доставка того же сообщения пропускается.
+    Записи старше PROCESSED_MESSAGES_RETENTION удаляются потребителем
+    '''
+    message_id = models.UUIDField(primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.message_id}: {self.processed_at}'
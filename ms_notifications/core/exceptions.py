@@ -1,3 +1,6 @@
+# Ошибку конверта вызывает manuscript_shared.envelope, сервисы ловят тот же класс
+from manuscript_shared.exceptions import INVALID_MESSAGE_EXCEPTION_MESSAGE, InvalidMessageException
+
 INVALID_TEAM_DATA_EXCEPTION_MESSAGE = "Invalid team data"
 USER_IS_NOT_NOTIFICATION_OWNER_EXCEPTION_MESSAGE = "User is not notification owner"
 NOTIFICATION_NOT_FOUND_EXCEPTION_MESSAGE = "Notification not found"
@@ -1,114 +1,197 @@
 import os
-import json
+import asyncio
+import datetime
+import time
+import pika
+from typing import List
 os.environ['DJANGO_SETTINGS_MODULE'] = 'ms_notifications.settings'
 import django
 django.setup()
 import core.constants as constants
 import core.logger as logger
+import adapters.processed_messages as processed_messages
 from django.conf import settings
 import app.models as models
 import service_layer.message_broker as mb
 
+# Пауза перед переподключением после потери соединения с брокером
+RECONNECT_DELAY = 5
+
 
 def start(message_broker: mb.RabbitMQ):
+    '''
+    Запускает потребителя. По умолчанию - asyncio-рантайм (mb.AsyncConsumer):
+    обработчики уведомлений только пишут в базу, и пачки разных очередей выгоднее
+    обрабатывать параллельно. RABBITMQ_CONSUMER_RUNTIME: blocking возвращает ConsumerPool
+    на BlockingConnection. Брокер в памяти (MESSAGE_BROKER: memory) не поддерживает
+    AsyncioConnection, с ним потребитель всегда работает на ConsumerPool
+    '''
+    if settings.RABBITMQ_CONSUMER_RUNTIME == 'blocking' or isinstance(message_broker, mb.InMemoryBroker):
+        return start_blocking(message_broker)
+    logger.info(user='CONSUMER',
+                message='Starting asyncio message broker connection...', logger=logger.mb_logger)
+    consumer = mb.AsyncConsumer(message_broker, ledger=processed_messages.record)
+    for queue, routing_key, handler in BINDS:
+        consumer.subscribe(queue=queue, routing_key=routing_key, handler=handler)
+    consumer.every(settings.PROCESSED_MESSAGES_PRUNE_INTERVAL, prune_processed_messages)
+    try:
+        asyncio.run(consumer.run())
+    except Exception as e:
+        logger.error(user='CONSUMER',
+                     message=f'Error while consuming message: {e}', logger=logger.mb_logger)
+    finally:
+        logger.info(user='CONSUMER',
+                    message='Closing message broker connection...', logger=logger.mb_logger)
+
+
+def start_blocking(message_broker: mb.RabbitMQ):
     logger.info(user='CONSUMER',
                 message='Starting message broker connection...', logger=logger.mb_logger)
+    pool = mb.ConsumerPool(message_broker, ledger=processed_messages.record)
     try:
-        binds = [
-                (settings.RABBITMQ_QUEUE_USER_CREATED, settings.RABBITMQ_USER_CREATE_ROUTING_KEY, handle_user_creation),
-                (settings.RABBITMQ_QUEUE_USER_LEFT_FROM_TEAM, settings.RABBITMQ_USER_LEFT_FROM_TEAM_ROUTING_KEY, handle_user_left_from_team),
-                (settings.RABBITMQ_QUEUE_USER_JOIN_REQUEST, settings.RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY, handle_user_join_request),
-                (settings.RABBITMQ_QUEUE_USER_JOIN_REQUEST_UPDATED, settings.RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY, handle_user_join_request_updated),
-                (settings.RABBITMQ_QUEUE_USER_KICKED_FROM_TEAM, settings.RABBITMQ_USER_KICKED_FROM_TEAM_ROUTING_KEY, handle_user_kicked_from_team),
-        ]
-        with message_broker:
-            for item in binds:
-                (queue, routing_key, callback) = item
-                message_broker.channel.queue_declare(queue=queue, durable=True)
-                message_broker.queue_bind(queue=queue, routing_key=routing_key)
-                message_broker.channel.basic_consume(
-                    queue=queue, on_message_callback=callback, auto_ack=True)
-            message_broker.start_consuming()
+        while True:
+            try:
+                consume(message_broker, pool)
+                break
+            except pika.exceptions.AMQPError as e:
+                # Неподтвержденные сообщения брокер доставит после переподключения
+                logger.error(user='CONSUMER',
+                             message=f'Connection lost: {e!r}, reconnecting in {RECONNECT_DELAY} seconds', logger=logger.mb_logger)
+                time.sleep(RECONNECT_DELAY)
     except Exception as e:
         logger.error(user='CONSUMER',
                      message=f'Error while consuming message: {e}', logger=logger.mb_logger)
     finally:
+        pool.shutdown()
         logger.info(user='CONSUMER',
                     message='Closing message broker connection...', logger=logger.mb_logger)
 
-def handle_user_creation(ch, method, properties, body):
+
+def consume(message_broker: mb.RabbitMQ, pool: mb.ConsumerPool):
+    with message_broker:
+        # Не больше prefetch неподтвержденных сообщений на очередь
+        message_broker.channel.basic_qos(
+            prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+        for item in BINDS:
+            (queue, routing_key, callback) = item
+            message_broker.channel.queue_declare(queue=queue, durable=True)
+            message_broker.queue_bind(queue=queue, routing_key=routing_key)
+            message_broker.declare_retry_queues(queue)
+            message_broker.channel.basic_consume(
+                queue=queue, on_message_callback=pool.wrap(callback, queue=queue), auto_ack=False)
+        pool.every(settings.PROCESSED_MESSAGES_PRUNE_INTERVAL, prune_processed_messages)
+        message_broker.start_consuming()
+
+
+def prune_processed_messages():
+    deleted = processed_messages.prune(
+        datetime.timedelta(seconds=settings.PROCESSED_MESSAGES_RETENTION))
+    logger.info(user='CONSUMER',
+                message=f'Pruned {deleted} processed message ids', logger=logger.mb_logger)
+
+
+def handle_user_creation(messages: List[mb.Message]):
     logger.info(user='CONSUMER',
-                message=f'Handle user creation with body: {body}', logger=logger.mb_logger)
-    data = json.loads(body)
-    user = models.User.objects.create(
-        username=data['username'],
-        email=data['username'],
-        first_name=data['first_name'],
-        last_name=data['last_name'],
-    )
-    models.ManuscriptUser.objects.create(
-        id=data['id'],
+                message=f'Handle creation of {len(messages)} users', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    # На PostgreSQL bulk_create возвращает объекты с id
+    users = models.User.objects.bulk_create([models.User(
+        username=item['username'],
+        email=item['username'],
+        first_name=item['first_name'],
+        last_name=item['last_name'],
+    ) for item in data])
+    models.ManuscriptUser.objects.bulk_create([models.ManuscriptUser(
+        id=item['id'],
         user=user
-    )
+    ) for item, user in zip(data, users)])
     logger.info(user='CONSUMER',
-                message=f'User created: {user}', logger=logger.mb_logger)
+                message=f'Users created: {[item["id"] for item in data]}', logger=logger.mb_logger)
+
 
+def receivers(ids) -> dict:
+    '''
+    Загружает получателей уведомлений пачки одним запросом
 
-def handle_user_join_request(ch, method, properties, body):
+            Args:
+                    ids: [Iterable[int]] - id пользователей
+
+            Returns:
+                    [dict] - пользователи по id
+    '''
+    ids = set(ids)
+    users = models.ManuscriptUser.objects.select_related('user').in_bulk(ids)
+    missing = ids - set(users)
+    if missing:
+        raise models.ManuscriptUser.DoesNotExist(f'Users not found: {sorted(missing)}')
+    return users
+
+
+def handle_user_join_request(messages: List[mb.Message]):
     logger.info(user='CONSUMER',
-                message=f'Handle user join request with body: {body}', logger=logger.mb_logger)
-    data = json.loads(body)
-    for uid in data['to']:
-        user = data['user']['username']
-        team = data['team']['name']
-        to = models.ManuscriptUser.objects.get(id=uid)
-        models.Notification.objects.create(
-            user=to, message=f'Пользователь {user} отправил запрос на присоединение к команде {team}', status=constants.WARNING_TYPE)
+                message=f'Handle {len(messages)} user join requests', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    to = receivers(uid for item in data for uid in item['to'])
+    models.Notification.objects.bulk_create([models.Notification(
+        user=to[uid],
+        message=f'Пользователь {item["user"]["username"]} отправил запрос на присоединение к команде {item["team"]["name"]}',
+        status=constants.WARNING_TYPE) for item in data for uid in item['to']])
     logger.info(user='CONSUMER',
-                message=f'Notifications created to {data["to"]}', logger=logger.mb_logger)
+                message=f'Notifications created to {list(to)}', logger=logger.mb_logger)
 
 
-def handle_user_left_from_team(ch, method, properties, body):
+def handle_user_left_from_team(messages: List[mb.Message]):
     logger.info(user='CONSUMER',
-                message=f'Handle user left from team with body: {body}', logger=logger.mb_logger)
-    data = json.loads(body)
-    for uid in data['to']:
-        user = data['user']['username']
-        team = data['team']['name']
-        to = models.ManuscriptUser.objects.get(id=uid)
-        models.Notification.objects.create(
-            user=to, message=f'Пользователь {user} вышел из команды {team}', status=constants.WARNING_TYPE)
+                message=f'Handle {len(messages)} users left from team', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    to = receivers(uid for item in data for uid in item['to'])
+    models.Notification.objects.bulk_create([models.Notification(
+        user=to[uid],
+        message=f'Пользователь {item["user"]["username"]} вышел из команды {item["team"]["name"]}',
+        status=constants.WARNING_TYPE) for item in data for uid in item['to']])
     logger.info(user='CONSUMER',
-                message=f'Notifications created to {data["to"]}', logger=logger.mb_logger)
+                message=f'Notifications created to {list(to)}', logger=logger.mb_logger)
 
 
-def handle_user_join_request_updated(ch, method, properties, body):
+def handle_user_join_request_updated(messages: List[mb.Message]):
     logger.info(user='CONSUMER',
-                message=f'Handle user join request updated with body: {body}', logger=logger.mb_logger)
-    data = json.loads(body)
-    for uid in data['to']:
-        user = data['user']['username']
-        team = data['team']['name']
-        to = models.ManuscriptUser.objects.get(id=uid)
-        models.Notification.objects.create(
-            user=to, message=f'Пользователь {to.user.username} был {data["action"]} в команде {team} пользователем {user}', status=constants.WARNING_TYPE)
+                message=f'Handle {len(messages)} user join request updates', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    # Массовое изменение статусов приходит одним сообщением со списком changes
+    changes = [(item, change) for item in data for change in item.get('changes') or [
+        {'to': uid, 'action': item['action']} for uid in item['to']]]
+    to = receivers(change['to'] for _, change in changes)
+    models.Notification.objects.bulk_create([models.Notification(
+        user=to[change['to']],
+        message=f'Пользователь {to[change["to"]].user.username} был {change["action"]} в команде {item["team"]["name"]} пользователем {item["user"]["username"]}',
+        status=constants.WARNING_TYPE) for item, change in changes])
     logger.info(user='CONSUMER',
-                message=f'Notifications created to {data["to"]}', logger=logger.mb_logger)
+                message=f'Notifications created to {list(to)}', logger=logger.mb_logger)
 
 
-def handle_user_kicked_from_team(ch, method, properties, body):
+def handle_user_kicked_from_team(messages: List[mb.Message]):
     logger.info(user='CONSUMER',
-                message=f'Handle user kicked from team with body: {body}', logger=logger.mb_logger)
-    data = json.loads(body)
-    for uid in data['to']:
-        user = data['user']['username']
-        team = data['team']['name']
-        to = models.ManuscriptUser.objects.get(id=uid)
-        models.Notification.objects.create(
-        user=to, message=f'Пользователь {to.user.username} исключен из команды {team} пользователем {user}', status=constants.DANGER_TYPE)
+                message=f'Handle {len(messages)} users kicked from team', logger=logger.mb_logger)
+    data = [message.payload for message in messages]
+    to = receivers(uid for item in data for uid in item['to'])
+    models.Notification.objects.bulk_create([models.Notification(
+        user=to[uid],
+        message=f'Пользователь {to[uid].user.username} исключен из команды {item["team"]["name"]} пользователем {item["user"]["username"]}',
+        status=constants.DANGER_TYPE) for item in data for uid in item['to']])
     logger.info(user='CONSUMER',
-                message=f'Notifications created to {data["to"]}', logger=logger.mb_logger)
+                message=f'Notifications created to {list(to)}', logger=logger.mb_logger)
+
+
+# Очереди потребителя: (очередь, ключ маршрутизации, обработчик)
+BINDS = [
+    (settings.RABBITMQ_QUEUE_USER_CREATED, settings.RABBITMQ_USER_CREATE_ROUTING_KEY, handle_user_creation),
+    (settings.RABBITMQ_QUEUE_USER_LEFT_FROM_TEAM, settings.RABBITMQ_USER_LEFT_FROM_TEAM_ROUTING_KEY, handle_user_left_from_team),
+    (settings.RABBITMQ_QUEUE_USER_JOIN_REQUEST, settings.RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY, handle_user_join_request),
+    (settings.RABBITMQ_QUEUE_USER_JOIN_REQUEST_UPDATED, settings.RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY, handle_user_join_request_updated),
+    (settings.RABBITMQ_QUEUE_USER_KICKED_FROM_TEAM, settings.RABBITMQ_USER_KICKED_FROM_TEAM_ROUTING_KEY, handle_user_kicked_from_team),
+]
+
 
 if __name__ == '__main__':
-    message_broker = mb.RabbitMQ()
+    message_broker = mb.create_broker()
     start(message_broker=message_broker)
@@ -213,6 +213,9 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Брокер сообщений: rabbitmq или memory (брокер в памяти процесса)
+MESSAGE_BROKER = cfg['MESSAGE_BROKER']
+
 
 # RabbitMQ settings
 # or the hostname where RabbitMQ is running
@@ -239,4 +242,16 @@ RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY = cfg['RABBITMQ_USER_JOIN_REQUEST_ROUTING
 RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY = cfg[
     'RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY']
 
+RABBITMQ_PREFETCH_COUNT = cfg['RABBITMQ_PREFETCH_COUNT']
+RABBITMQ_CONSUMER_WORKERS = cfg['RABBITMQ_CONSUMER_WORKERS']
+RABBITMQ_CONSUMER_BATCH_SIZE = cfg['RABBITMQ_CONSUMER_BATCH_SIZE']
+RABBITMQ_CONSUMER_BATCH_LINGER = cfg['RABBITMQ_CONSUMER_BATCH_LINGER']
+RABBITMQ_RETRY_DELAYS = cfg['RABBITMQ_RETRY_DELAYS']
+RABBITMQ_CONSUMER_RUNTIME = cfg['RABBITMQ_CONSUMER_RUNTIME']
+RABBITMQ_CONSUMER_CONCURRENCY = cfg['RABBITMQ_CONSUMER_CONCURRENCY']
+RABBITMQ_RECONNECT_DELAY = cfg['RABBITMQ_RECONNECT_DELAY']
+RABBITMQ_MAX_RECONNECT_DELAY = cfg['RABBITMQ_MAX_RECONNECT_DELAY']
+PROCESSED_MESSAGES_RETENTION = cfg['PROCESSED_MESSAGES_RETENTION']
+PROCESSED_MESSAGES_PRUNE_INTERVAL = cfg['PROCESSED_MESSAGES_PRUNE_INTERVAL']
+
 TOKEN_SECRET = 'neon-gravestones'
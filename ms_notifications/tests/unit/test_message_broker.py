@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import threading
+import time
+import pika
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TransactionTestCase, override_settings
+from unittest.mock import MagicMock
+
+import manuscript_shared.envelope as envelope
+import manuscript_shared.memory_broker as memory_broker
+import service_layer.message_broker as mb
+import entrypoints.event_consumer as event_consumer
+import app.models as models
+
+
+def event_created(id: int) -> bytes:
+    return envelope.encode(envelope.build(
+        type='EVENT_CREATED', payload={'id': id, 'name': 'event', 'is_active': True},
+        id=str(id), timestamp=datetime.datetime(2024, 1, 1)))
+
+
+class FakeChannel:
+    def __init__(self, loop):
+        self.loop = loop
+        self.is_open = True
+        self.consumers = {}
+        self.declared = []
+        self.bound = []
+        self.acks = []
+        self.published = []
+        self.close_callbacks = []
+
+    def add_on_close_callback(self, callback):
+        self.close_callbacks.append(callback)
+
+    def reply(self, callback):
+        self.loop.call_soon(callback, MagicMock())
+
+    def exchange_declare(self, callback, **kwargs):
+        self.reply(callback)
+
+    def basic_qos(self, callback, **kwargs):
+        self.reply(callback)
+
+    def queue_declare(self, callback, queue, **kwargs):
+        self.declared.append(queue)
+        self.reply(callback)
+
+    def queue_bind(self, callback, queue, routing_key, **kwargs):
+        self.bound.append((queue, routing_key))
+        self.reply(callback)
+
+    def basic_consume(self, queue, on_message_callback, auto_ack):
+        self.consumers[queue] = on_message_callback
+
+    def basic_ack(self, delivery_tag):
+        self.acks.append(delivery_tag)
+
+    def basic_publish(self, **kwargs):
+        self.published.append(kwargs)
+
+    def deliver(self, queue, id):
+        properties = pika.BasicProperties(message_id=str(id), content_type=envelope.JSON_CONTENT_TYPE)
+        self.consumers[queue](self, MagicMock(delivery_tag=id), properties, event_created(id))
+
+
+class FakeConnection:
+    def __init__(self, parameters, on_open_callback, on_open_error_callback, on_close_callback, custom_ioloop):
+        self.loop = custom_ioloop
+        self.on_close = on_close_callback
+        self.is_open = True
+        self.fake_channel = FakeChannel(custom_ioloop)
+        self.loop.call_soon(on_open_callback, self)
+
+    def channel(self, on_open_callback):
+        self.loop.call_soon(on_open_callback, self.fake_channel)
+
+    def close(self):
+        self.lose(pika.exceptions.ConnectionClosedByClient(200, 'Normal shutdown'))
+
+    def lose(self, reason):
+        self.is_open = self.fake_channel.is_open = False
+        self.loop.call_soon(self.on_close, self, reason)
+
+
+class TestAsyncConsumer(TransactionTestCase):
+    def setUp(self):
+        self.connections = []
+        self.batches = []
+        self.active = {'now': 0, 'max': 0}
+        self.lock = threading.Lock()
+
+    def create_connection(self, **kwargs):
+        self.connections.append(FakeConnection(**kwargs))
+        return self.connections[-1]
+
+    def create_consumer(self, **kwargs):
+        consumer = mb.AsyncConsumer(
+            MagicMock(exchange='test.exchange', exchange_type='topic'), connection_factory=self.create_connection,
+            workers=4, batch_size=2, linger=0.01, retry_delays=[1], reconnect_delay=0.01, **kwargs)
+        consumer.subscribe('first', 'EVENT_CREATED', self.handler, concurrency=1)
+        consumer.subscribe('second', 'EVENT_CREATED', self.handler)
+        return consumer
+
+    def handler(self, messages):
+        with self.lock:
+            self.active['now'] += 1
+            self.active['max'] = max(self.active['max'], self.active['now'])
+        time.sleep(0.02)
+        with self.lock:
+            self.active['now'] -= 1
+            self.batches.append(sorted(message.payload['id'] for message in messages))
+
+    async def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail('Condition was not met')
+
+    def test_batches_should_be_handled_with_queue_concurrency_limit_and_acked(self):
+        async def scenario():
+            stop = asyncio.Event()
+            run = asyncio.create_task(self.create_consumer().run(stop))
+            await self.wait_for(lambda: self.connections and len(self.connections[0].fake_channel.consumers) == 2)
+            channel = self.connections[0].fake_channel
+            self.assertEqual(channel.declared, [
+                'first', 'first.retry.1s', 'first.dlq', 'second', 'second.retry.1s', 'second.dlq'])
+            for id in range(1, 7):
+                channel.deliver('first', id)
+            await self.wait_for(lambda: len(channel.acks) == 6)
+            stop.set()
+            await run
+            return channel
+        channel = asyncio.run(scenario())
+        self.assertEqual(sorted(self.batches), [[1, 2], [3, 4], [5, 6]])
+        # Очередь first обрабатывает не больше одной пачки одновременно
+        self.assertEqual(self.active['max'], 1)
+        self.assertEqual(sorted(channel.acks), [1, 2, 3, 4, 5, 6])
+
+    def test_subscription_should_bind_every_routing_key(self):
+        async def scenario():
+            stop = asyncio.Event()
+            consumer = mb.AsyncConsumer(
+                MagicMock(exchange='test.exchange', exchange_type='topic'), connection_factory=self.create_connection,
+                retry_delays=[1], reconnect_delay=0.01)
+            consumer.subscribe('telegram', ['EVENT_CREATED', 'EVENT_UPDATED'], self.handler)
+            run = asyncio.create_task(consumer.run(stop))
+            await self.wait_for(lambda: self.connections and self.connections[0].fake_channel.consumers)
+            stop.set()
+            await run
+        asyncio.run(scenario())
+        self.assertEqual(self.connections[0].fake_channel.bound,
+                         [('telegram', 'EVENT_CREATED'), ('telegram', 'EVENT_UPDATED')])
+
+    def test_stop_should_flush_partial_batches_before_closing(self):
+        async def scenario():
+            stop = asyncio.Event()
+            consumer = self.create_consumer(max_reconnect_delay=1)
+            consumer._linger = 60
+            run = asyncio.create_task(consumer.run(stop))
+            await self.wait_for(lambda: self.connections and len(self.connections[0].fake_channel.consumers) == 2)
+            self.connections[0].fake_channel.deliver('second', 1)
+            stop.set()
+            await run
+        asyncio.run(scenario())
+        self.assertEqual(self.batches, [[1]])
+        self.assertEqual(self.connections[0].fake_channel.acks, [1])
+
+    def test_lost_connection_should_reconnect_and_resubscribe(self):
+        async def scenario():
+            stop = asyncio.Event()
+            run = asyncio.create_task(self.create_consumer().run(stop))
+            await self.wait_for(lambda: self.connections and len(self.connections[0].fake_channel.consumers) == 2)
+            self.connections[0].lose(pika.exceptions.StreamLostError('Stream connection lost'))
+            await self.wait_for(lambda: len(self.connections) == 2 and len(self.connections[1].fake_channel.consumers) == 2)
+            self.connections[1].fake_channel.deliver('first', 1)
+            self.connections[1].fake_channel.deliver('first', 2)
+            await self.wait_for(lambda: len(self.connections[1].fake_channel.acks) == 2)
+            stop.set()
+            await run
+        asyncio.run(scenario())
+        self.assertEqual(self.batches, [[1, 2]])
+
+
+class TestInMemoryBroker(TransactionTestCase):
+    def test_create_broker_should_follow_settings(self):
+        with override_settings(MESSAGE_BROKER='memory'):
+            self.assertIsInstance(mb.create_broker(), mb.InMemoryBroker)
+        with override_settings(MESSAGE_BROKER='rabbitmq'):
+            self.assertNotIsInstance(mb.create_broker(), mb.InMemoryBroker)
+        with override_settings(MESSAGE_BROKER='kafka'), self.assertRaises(ImproperlyConfigured):
+            mb.create_broker()
+
+    def test_consumer_should_run_blocking_runtime_on_memory_broker(self):
+        server = memory_broker.InMemoryServer()
+        broker = mb.InMemoryBroker(server=server)
+        publisher = mb.InMemoryBroker(server=server)
+        publisher.connect()
+        publisher.channel.queue_declare(queue=settings.RABBITMQ_QUEUE_USER_CREATED, durable=True)
+        publisher.queue_bind(queue=settings.RABBITMQ_QUEUE_USER_CREATED,
+                             routing_key=settings.RABBITMQ_USER_CREATE_ROUTING_KEY)
+        publisher.channel.basic_publish(
+            exchange=publisher.exchange, routing_key=settings.RABBITMQ_USER_CREATE_ROUTING_KEY,
+            body=envelope.encode(envelope.build(
+                type='USER_REGISTERED', id='1', timestamp=datetime.datetime(2024, 1, 1), payload={
+                    'id': 999, 'username': 'testuser', 'email': 'testuser', 'first_name': 'Test', 'last_name': 'User'})),
+            properties=pika.BasicProperties(content_type=envelope.JSON_CONTENT_TYPE, message_id='1'))
+        publisher.disconnect()
+
+        # Асинхронный рантайм выбран настройкой, но брокер в памяти работает только на ConsumerPool
+        with override_settings(RABBITMQ_CONSUMER_RUNTIME='asyncio'):
+            thread = threading.Thread(target=event_consumer.start, args=(broker,), daemon=True)
+            thread.start()
+            try:
+                for _ in range(500):
+                    if models.ManuscriptUser.objects.filter(id=999).exists():
+                        break
+                    time.sleep(0.01)
+            finally:
+                if broker.connection is not None:
+                    broker.connection.add_callback_threadsafe(broker.channel.stop_consuming)
+                    thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(models.ManuscriptUser.objects.filter(id=999, user__username='testuser').exists())
@@ -2,3 +2,5 @@ from .event_repository import AbstractEventRepository, EventRepository, FakeEven
 from .user_repository import AbstractUserRepository, ManuscriptUserRepository, FakeManuscriptUserRepository
 from .team_repository import AbstractTeamRepository, TeamRepository, FakeTeamRepository
 from .participant_repository import AbstractParticipantRepository, ParticipantRepository, FakeParticipantRepository
+from .cache import AbstractCache, RedisCache, FakeCache, get_cache
+from .outbox_repository import AbstractOutboxRepository, OutboxRepository, FakeOutboxRepository
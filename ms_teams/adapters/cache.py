@@ -0,0 +1,239 @@
+import abc
+import json
+import time
+import uuid
+import threading
+import collections
+from typing import Callable
+
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+
+import core.logger as logger
+
+# Кладет значение, только если блокировка заполнения все еще принадлежит нам.
+# delete() снимает блокировку, поэтому устаревшее значение, собранное до
+# инвалидации, не попадет в кэш.
+_SET_IF_LOCKED = '''
+if redis.call('get', KEYS[2]) == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('del', KEYS[2])
+    return 1
+end
+return 0
+'''
+
+_pool = None
+_fake_cache = None
+_fake_cache_lock = threading.Lock()
+
+
+def team_key(team_id) -> str:
+    return f'teams:team:{team_id}'
+
+
+def get_redis_client() -> redis.Redis:
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DATABASE,
+                                     socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                                     socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT)
+    return redis.Redis(connection_pool=_pool)
+
+
+class AbstractCache(abc.ABC):
+    '''
+    Кэш сериализованных документов (read-model).
+    '''
+    @abc.abstractmethod
+    def get(self, key):
+        '''
+        Возвращает значение по ключу
+
+                Args:
+                        key: [str] - ключ
+
+                Returns:
+                        [dict] - сохраненное значение
+                        [None] - если значения нет или срок его жизни истек
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_or_set(self, key, builder: Callable, ttl=None):
+        '''
+        Возвращает значение по ключу, а при промахе собирает его через builder и сохраняет.
+        Одновременные промахи по одному ключу собирают значение один раз (single-flight).
+
+                Args:
+                        key: [str] - ключ
+                        builder: [Callable] - функция, собирающая значение (None не кэшируется)
+                        ttl: [int] - срок жизни в секундах
+
+                Returns:
+                        [dict] - значение
+                        [None] - если builder вернул None
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, *keys):
+        '''
+        Инвалидирует значения по ключам
+
+                Args:
+                        keys: [str] - ключи
+        '''
+        raise NotImplementedError
+
+
+class RedisCache(AbstractCache):
+
+    def __init__(self, client: redis.Redis = None, ttl: int = settings.TEAM_CACHE_TTL,
+                 lock_ttl: float = settings.TEAM_CACHE_LOCK_TTL):
+        self.client = client or get_redis_client()
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    def get(self, key):
+        try:
+            value = self.client.get(key)
+        except redis.RedisError as e:
+            logger.error(user='CACHE', message=f'Error while reading {key}: {e}')
+            return None
+        return json.loads(value) if value is not None else None
+
+    def get_or_set(self, key, builder: Callable, ttl=None):
+        value = self.get(key)
+        if value is not None:
+            return value
+        token = uuid.uuid4().hex
+        lock_key = f'{key}:lock'
+        try:
+            locked = self.client.set(
+                lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except redis.RedisError as e:
+            logger.error(user='CACHE', message=f'Error while locking {key}: {e}')
+            return builder()
+        if not locked:
+            value = self._wait_for(key, lock_key)
+            if value is not None:
+                return value
+            return builder()
+        value = builder()
+        if value is None:
+            self._release(lock_key, token)
+            return None
+        try:
+            self.client.eval(_SET_IF_LOCKED, 2, key, lock_key,
+                             token, json.dumps(value), ttl or self.ttl)
+        except redis.RedisError as e:
+            logger.error(user='CACHE', message=f'Error while writing {key}: {e}')
+        return value
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        self._delete(*keys)
+        # Повторная инвалидация после коммита, чтобы значение, собранное
+        # параллельным запросом до фиксации транзакции, не осталось в кэше
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._delete(*keys))
+
+    def _delete(self, *keys):
+        try:
+            self.client.delete(*keys, *[f'{key}:lock' for key in keys])
+        except redis.RedisError as e:
+            logger.error(user='CACHE', message=f'Error while invalidating {keys}: {e}')
+
+    def _wait_for(self, key, lock_key):
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(0.01)
+            try:
+                value = self.client.get(key)
+                if value is not None:
+                    return json.loads(value)
+                if not self.client.exists(lock_key):
+                    return None
+            except redis.RedisError:
+                return None
+        return None
+
+    def _release(self, lock_key, token):
+        try:
+            if self.client.get(lock_key) == token.encode():
+                self.client.delete(lock_key)
+        except redis.RedisError:
+            pass
+
+
+class FakeCache(AbstractCache):
+
+    def __init__(self, ttl: int = 60, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values = collections.OrderedDict()
+        self._generations = collections.Counter()
+        self._locks = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return value
+
+    def get_or_set(self, key, builder: Callable, ttl=None):
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._locks[key]
+        with key_lock:
+            value = self.get(key)
+            if value is not None:
+                return value
+            generation = self._generations[key]
+            value = builder()
+            if value is not None:
+                self._set(key, value, ttl or self.ttl, generation)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._generations[key] += 1
+
+    def _set(self, key, value, ttl, generation):
+        with self._lock:
+            # Значение устарело, если ключ инвалидировали во время сборки
+            if self._generations[key] != generation:
+                return
+            self._values[key] = (value, time.monotonic() + ttl)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+
+def get_cache() -> AbstractCache:
+    '''
+    Возвращает кэш процесса. В DEBUG это один FakeCache на процесс, чтобы чтения и
+    инвалидация всех unit of work и потребителя шли в один экземпляр, иначе -
+    RedisCache на общем пуле соединений
+    '''
+    global _fake_cache
+    if not settings.DEBUG:
+        return RedisCache()
+    with _fake_cache_lock:
+        if _fake_cache is None:
+            _fake_cache = FakeCache()
+        return _fake_cache
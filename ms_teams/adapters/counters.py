@@ -0,0 +1,28 @@
+from django.db import connection
+
+
+def increment(model, pk, returning=(), **deltas) -> dict:
+    '''
+    Прибавляет deltas к счетчикам записи одним UPDATE ... RETURNING
+
+            Args:
+                    model: [Model] - модель
+                    pk: [int] - id записи
+                    returning: [tuple] - другие поля, которые нужно прочитать тем же запросом
+                    deltas: [dict] - {поле: приращение}
+
+            Returns:
+                    [dict] - новые значения счетчиков и полей returning (пустой словарь, если запись не найдена)
+    '''
+    opts = model._meta
+    columns = [connection.ops.quote_name(opts.get_field(name).column) for name in deltas]
+    names = [*deltas, *returning]
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE {table} SET {assignments} WHERE {pk} = %s RETURNING {columns}'.format(
+            table=connection.ops.quote_name(opts.db_table),
+            assignments=', '.join(f'{column} = {column} + %s' for column in columns),
+            pk=connection.ops.quote_name(opts.pk.column),
+            columns=', '.join(connection.ops.quote_name(opts.get_field(name).column) for name in names)),
+            [*deltas.values(), pk])
+        row = cursor.fetchone()
+    return dict(zip(names, row)) if row else {}
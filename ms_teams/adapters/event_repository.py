@@ -3,6 +3,8 @@ from typing import Union, List
 
 import app.models as models
 import domain.fake_models as fake_models
+import adapters.counters as counters
+import manuscript_shared.memory as memory
 
 
 class AbstractEventRepository(abc.ABC):
@@ -58,6 +60,18 @@ class AbstractEventRepository(abc.ABC):
         '''
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def adjust_counters(self, event, **deltas):
+        '''
+        Изменяет счетчики [Event] (team_count, participant_count) на deltas
+        и записывает новые значения в переданный объект
+
+                Args:
+                        event: [Event] - мероприятие
+                        deltas: [dict] - {счетчик: приращение}, нулевые приращения пропускаются
+        '''
+        raise NotImplementedError
+
     @abc.abstractmethod
     def deactivate(self, id):
         ''' 
@@ -81,7 +95,8 @@ class EventRepository(AbstractEventRepository):
         event = models.Event.objects.get(id=id)
         for key, value in kwargs.items():
             setattr(event, key, value)
-        event.save()
+        # Счетчики team_count и participant_count меняет только adjust_counters
+        event.save(update_fields=list(kwargs))
         return event
 
     def list(self, include_deactivated=False, **kwargs, ) -> List[models.Event]:
@@ -89,49 +104,43 @@ class EventRepository(AbstractEventRepository):
             return models.Event.objects.filter(**kwargs)
         return models.Event.objects.filter(**kwargs, is_active=True)
 
+    def adjust_counters(self, event, **deltas):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if deltas:
+            for name, value in counters.increment(models.Event, event.id, **deltas).items():
+                setattr(event, name, value)
+        return event
+
     def deactivate(self, id):
-        event = models.Event.objects.get(id=id)
-        event.is_active = False
-        event.save()
+        models.Event.objects.filter(id=id).update(is_active=False)
         return models.Event.objects.get(id=id)
 
 
 class FakeEventRepository(AbstractEventRepository):
 
     def __init__(self) -> None:
-        self._events = []
-        self._id = 0
+        self._events = memory.InMemoryTable(indexes=('is_active',))
 
     def get(self, **kwargs) -> Union[fake_models.Event, None]:
-        return next((event for event in self._events if all([
-            getattr(event, key) == value for key, value in kwargs.items()
-        ])), None)
+        return self._events.get(**kwargs)
 
     def create(self, **kwargs):
-        event = fake_models.Event(**kwargs)
-        self._id += 1
-        event.id = self._id
-        self._events.append(event)
-        return event
+        return self._events.add(fake_models.Event(**kwargs))
 
     def edit(self, id, **kwargs):
-        event = next((event for event in self._events if event.id == id), None)
-        for key, value in kwargs.items():
-            setattr(event, key, value)
-        self._events = [event if event.id ==
-                        id else event for event in self._events]
-        return event
+        event = self._events.get(id=id)
+        return self._events.update(event, **kwargs)
 
     def list(self, include_deactivated=False, **kwargs, ) -> List[fake_models.Event]:
-        if 'tags__contains' in kwargs:
-            return [event for event in self._events if kwargs['tags__contains'] in event.tags]
-        return [event for event in self._events if all([
-            getattr(event, key) == value for key, value in kwargs.items()
-        ]) and event.is_active]
+        if not include_deactivated:
+            kwargs['is_active'] = True
+        return self._events.filter(**kwargs)
 
-    def deactivate(self, id):
-        event = next((event for event in self._events if event.id == id), None)
-        event.is_active = False
-        self._events = [event if event.id ==
-                        id else event for event in self._events]
+    def adjust_counters(self, event, **deltas):
+        for name, delta in deltas.items():
+            setattr(event, name, getattr(event, name) + delta)
         return event
+
+    def deactivate(self, id):
+        event = self._events.get(id=id)
+        return self._events.update(event, is_active=False)
@@ -1,8 +1,12 @@
 import abc
-from typing import Union, List
+from typing import Union, List, Iterator, Set
+
+from django.db import connection
 
 import app.models as models
 import domain.fake_models as fake_models
+import core.constants as constants
+import manuscript_shared.memory as memory
 
 
 class AbstractParticipantRepository(abc.ABC):
@@ -20,6 +24,20 @@ class AbstractParticipantRepository(abc.ABC):
                         [Participant] - созданный студент
         '''
 
+    @abc.abstractmethod
+    def create_if_not_exists(self, **kwargs):
+        '''
+        Создает [Participant], если у пользователя еще нет участия в команде.
+        Проверка и вставка выполняются одним запросом, без предварительного поиска
+
+                Args:
+                        **kwargs: Параметры для создания [Participant] (обязательны user и team)
+                Returns:
+                        [Participant] - созданный participant
+                        [None] - если participant с такими user и team уже существует
+        '''
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get(self, **kwargs):
         '''
@@ -45,6 +63,24 @@ class AbstractParticipantRepository(abc.ABC):
         '''
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def edit_status(self, id, status, expected_status):
+        '''
+        Меняет статус [Participant], только если текущий статус равен expected_status.
+        Условие проверяется в том же UPDATE, поэтому из одновременных изменений одного
+        участника применяется только одно, и счетчики не меняются дважды
+
+                Args:
+                        id: [int] - id participant
+                        status: [str] - новый статус
+                        expected_status: [str] - статус, прочитанный сервисом
+
+                Returns:
+                        [Participant] - измененный participant
+                        [None] - если статус уже изменил другой запрос
+        '''
+        raise NotImplementedError
+
     @abc.abstractmethod
     def list(self, **kwargs):
         '''
@@ -58,59 +94,174 @@ class AbstractParticipantRepository(abc.ABC):
         '''
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def bulk_edit_status(self, statuses: dict, expected_statuses: dict):
+        '''
+        Меняет статусы нескольких [Participant] одним запросом. Как и в edit_status,
+        меняются только участники, статус которых все еще равен ожидаемому
+
+                Args:
+                        statuses: [dict] - словарь {id participant: новый статус}
+                        expected_statuses: [dict] - словарь {id participant: статус, прочитанный сервисом}
+
+                Returns:
+                        [Set[int]] - id обновленных participant
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def roster(self, event_id, chunk_size=None):
+        '''
+        Возвращает участников (APPLIED) активных команд мероприятия, отсортированных по команде.
+        Строки читаются порциями и не загружаются в память целиком
+
+                Args:
+                        event_id: [int] - id мероприятия
+                        chunk_size: [int] - количество строк, читаемых из базы за раз
+
+                Returns:
+                        [Iterator[tuple]] - строки в порядке domain.roster.ROSTER_FIELDS
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_by_teams(self, teams, **kwargs):
+        '''
+        Возвращает список [Participant] сразу для нескольких [Team] одним запросом
+
+                Args:
+                        teams: [List[Team]] - список команд
+                        kwargs: [dict] - словарь с параметрами для поиска
+
+                Returns:
+                        [List[Participant]] - список найденных participant
+        '''
+        raise NotImplementedError
+
 
 class ParticipantRepository(AbstractParticipantRepository):
 
+    def _participants(self):
+        # to_dict() обращается к user и team, загружаем их тем же запросом
+        return models.Participant.objects.select_related('user__user', 'team__event')
+
     def get(self, **kwargs) -> Union[models.Participant, None]:
-        return models.Participant.objects.filter(**kwargs).first()
+        return self._participants().filter(**kwargs).first()
 
     def create(self, **kwargs):
         return models.Participant.objects.create(**kwargs)
 
+    def create_if_not_exists(self, **kwargs) -> Union[models.Participant, None]:
+        participant = models.Participant(**kwargs)
+        opts = models.Participant._meta
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO {table} ({columns}) VALUES ({values})
+                ON CONFLICT ON CONSTRAINT participant_user_team_unique DO NOTHING
+                RETURNING {pk}'''.format(
+                table=connection.ops.quote_name(opts.db_table),
+                columns=', '.join(connection.ops.quote_name(field.column) for field in fields),
+                values=', '.join(['%s'] * len(fields)),
+                pk=connection.ops.quote_name(opts.pk.column)),
+                [field.get_db_prep_save(getattr(participant, field.attname), connection) for field in fields])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        participant.pk = row[0]
+        participant._state.adding = False
+        participant._state.db = connection.alias
+        return participant
+
     def edit(self, id, **kwargs):
-        event = models.Participant.objects.get(id=id)
+        event = self._participants().get(id=id)
         for key, value in kwargs.items():
             setattr(event, key, value)
-        event.save()
+        event.save(update_fields=list(kwargs))
         return event
 
+    def edit_status(self, id, status, expected_status) -> Union[models.Participant, None]:
+        if not models.Participant.objects.filter(id=id, status=expected_status).update(status=status):
+            return None
+        return self._participants().get(id=id)
+
     def list(self, **kwargs, ) -> List[models.Participant]:
-        return models.Participant.objects.filter(**kwargs)
+        return self._participants().filter(**kwargs)
+
+    def bulk_edit_status(self, statuses: dict, expected_statuses: dict) -> Set[int]:
+        if not statuses:
+            return set()
+        opts = models.Participant._meta
+        table = connection.ops.quote_name(opts.db_table)
+        pk = connection.ops.quote_name(opts.pk.column)
+        status = connection.ops.quote_name(opts.get_field('status').column)
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                UPDATE {table} SET {status} = changes.status
+                FROM (VALUES {values}) AS changes (id, status, expected)
+                WHERE {table}.{pk} = changes.id AND {table}.{status} = changes.expected
+                RETURNING {table}.{pk}'''.format(
+                table=table, pk=pk, status=status, values=', '.join(['(%s, %s, %s)'] * len(statuses))),
+                [value for id, new in statuses.items() for value in (id, new, expected_statuses[id])])
+            return {row[0] for row in cursor.fetchall()}
+
+    def roster(self, event_id, chunk_size=None) -> Iterator[tuple]:
+        return models.Participant.objects.filter(
+            team__event_id=event_id, team__is_active=True, status=constants.APPLIED_STATUS,
+        ).order_by('team_id', 'id').values_list(
+            'team_id', 'team__name', 'id', 'user_id', 'user__user__username', 'user__user__email',
+            'user__user__first_name', 'user__user__last_name', 'role', 'status',
+        ).iterator(chunk_size=chunk_size or 2000)
+
+    def list_by_teams(self, teams, **kwargs) -> List[models.Participant]:
+        return self._participants().filter(team__in=teams, **kwargs).order_by('id')
 
 
 class FakeParticipantRepository(AbstractParticipantRepository):
 
     def __init__(self) -> None:
-        self._participants = []
-        self._id = 0
+        self._participants = memory.InMemoryTable(
+            indexes=('team', 'user', 'status', 'user__username'))
 
     def get(self, **kwargs) -> Union[fake_models.Participant, None]:
-        participants = self._participants
-        if 'user__username' in kwargs:
-            participants = [
-                participant for participant in participants if participant.user.username == kwargs['user__username']]
-            kwargs.pop('user__username')
-        return next((participant for participant in participants if all([
-            getattr(participant, key) == value for key, value in kwargs.items()
-        ])), None)
+        return self._participants.get(**kwargs)
 
     def create(self, **kwargs):
-        participant = fake_models.Participant(**kwargs)
-        self._id += 1
-        participant.id = self._id
-        self._participants.append(participant)
-        return participant
+        return self._participants.add(fake_models.Participant(**kwargs))
+
+    def create_if_not_exists(self, **kwargs):
+        if self.get(user=kwargs['user'], team=kwargs['team']) is not None:
+            return None
+        return self.create(**kwargs)
 
     def edit(self, id, **kwargs):
-        participant = next(
-            (participant for participant in self._participants if participant.id == id), None)
-        for key, value in kwargs.items():
-            setattr(participant, key, value)
-        self._participants = [participant if participant.id ==
-                              id else participant for participant in self._participants]
-        return participant
+        participant = self._participants.get(id=id)
+        return self._participants.update(participant, **kwargs)
+
+    def edit_status(self, id, status, expected_status):
+        participant = self._participants.get(id=id)
+        if participant.status != expected_status:
+            return None
+        return self._participants.update(participant, status=status)
 
     def list(self, **kwargs, ) -> List[fake_models.Participant]:
-        return [participant for participant in self._participants if all([
-            getattr(participant, key) == value for key, value in kwargs.items()
-        ])]
+        return self._participants.filter(**kwargs)
+
+    def bulk_edit_status(self, statuses: dict, expected_statuses: dict) -> Set[int]:
+        participants = [participant for participant in self.list(id__in=statuses)
+                        if participant.status == expected_statuses[participant.id]]
+        for participant in participants:
+            self._participants.update(participant, status=statuses[participant.id])
+        return {participant.id for participant in participants}
+
+    def roster(self, event_id, chunk_size=None) -> Iterator[tuple]:
+        participants = sorted(self._participants.filter(
+            team__event__id=event_id, team__is_active=True, status=constants.APPLIED_STATUS),
+            key=lambda participant: (participant.team.id, participant.id))
+        for participant in participants:
+            user = participant.user
+            yield (participant.team.id, participant.team.name, participant.id, user.id, user.username,
+                   user.email, user.first_name, user.last_name, participant.role, participant.status)
+
+    def list_by_teams(self, teams, **kwargs) -> List[fake_models.Participant]:
+        return self._participants.filter(team__in=list(teams), **kwargs)
@@ -1,8 +1,12 @@
 import abc
 from typing import Union, List
+from django.db.models import Q, FilteredRelation, Subquery
 
 import app.models as models
 import domain.fake_models as fake_models
+import adapters.counters as counters
+import manuscript_shared.memory as memory
+from domain.team_access import TeamAccessContext
 
 
 class AbstractTeamRepository(abc.ABC):
@@ -46,11 +50,13 @@ class AbstractTeamRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def list(self, include_deactivated=False, **kwargs):
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs):
         ''' 
         Возвращает список [Team]
 
                 Args:
+                        limit: [int] - количество записей на странице (по умолчанию - все записи)
+                        cursor: [tuple] - (created_at, id) последней записи предыдущей страницы
                         kwargs: [dict] - словарь с параметрами для поиска
 
                 Returns:
@@ -61,10 +67,57 @@ class AbstractTeamRepository(abc.ABC):
     @abc.abstractmethod
     def deactivate(self, id):
         ''' 
-        Удаляет [Team]
+        Удаляет [Team]. Флаг меняется условным UPDATE (WHERE is_active), поэтому из
+        одновременных деактиваций команду меняет только одна
 
                 Args:
                         id: [int] - id event который нужно удалить
+
+                Returns:
+                        [Team] - деактивированная команда
+                        [None] - если команда уже не активна
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def activate(self, id):
+        '''
+        Снова активирует [Team] условным UPDATE (WHERE NOT is_active)
+
+                Args:
+                        id: [int] - id команды
+
+                Returns:
+                        [Team] - активированная команда
+                        [None] - если команда уже активна
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def adjust_counters(self, team, **deltas):
+        '''
+        Изменяет счетчики участников [Team] (applied_count, pending_count) на deltas
+        и записывает новые значения в переданный объект вместе с is_active, прочитанным
+        тем же UPDATE
+
+                Args:
+                        team: [Team] - команда
+                        deltas: [dict] - {счетчик: приращение}, нулевые приращения пропускаются
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_access_context(self, team_id, username):
+        '''
+        Возвращает [Team] вместе с участием пользователя в ней одним запросом
+
+                Args:
+                        team_id: [int] - id команды
+                        username: [str] - username пользователя
+
+                Returns:
+                        [TeamAccessContext] - команда и участие пользователя (participant может быть None)
+                        [None] - если команда не найдена
         '''
         raise NotImplementedError
 
@@ -72,63 +125,122 @@ class AbstractTeamRepository(abc.ABC):
 class TeamRepository(AbstractTeamRepository):
 
     def get(self, **kwargs) -> Union[models.Team, None]:
-        return models.Team.objects.filter(**kwargs).first()
+        return models.Team.objects.select_related('event').filter(**kwargs).first()
 
     def create(self, **kwargs) -> models.Team:
         return models.Team.objects.create(**kwargs)
 
     def edit(self, id, **kwargs) -> models.Team:
-        team = models.Team.objects.get(id=id)
+        team = models.Team.objects.select_related('event').get(id=id)
+        fields = {field.name for field in team._meta.concrete_fields if not field.primary_key}
         for key, value in kwargs.items():
             if key == 'members':
                 team.members.set(value)
                 continue
             setattr(team, key, value)
-        team.save()
+        # Сохраняются только переданные поля, чтобы не затереть счетчики,
+        # которые параллельно изменил counters.increment
+        update_fields = [key for key in kwargs if key in fields]
+        if update_fields:
+            team.save(update_fields=update_fields)
         return team
 
-    def list(self, include_deactivated=False, **kwargs, ) -> List[models.Team]:
-        return models.Team.objects.filter(**kwargs, is_active=True) if not include_deactivated else models.Team.objects.filter(**kwargs)
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs, ) -> List[models.Team]:
+        teams = models.Team.objects.select_related('event')
+        teams = teams.filter(**kwargs, is_active=True) if not include_deactivated else teams.filter(**kwargs)
+        if limit is None:
+            return teams
+        if cursor is not None:
+            created_at, id = cursor
+            teams = teams.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=id)
+        return teams.order_by('created_at', 'id')[:limit]
+
+    def deactivate(self, id) -> Union[models.Team, None]:
+        # UPDATE блокирует строку, поэтому перечитанные счетчики актуальны до конца транзакции
+        if not models.Team.objects.filter(id=id, is_active=True).update(is_active=False):
+            return None
+        return models.Team.objects.select_related('event').get(id=id)
+
+    def activate(self, id) -> Union[models.Team, None]:
+        if not models.Team.objects.filter(id=id, is_active=False).update(is_active=True):
+            return None
+        return models.Team.objects.select_related('event').get(id=id)
+
+    def adjust_counters(self, team, **deltas):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if deltas:
+            # is_active читается под блокировкой строки: параллельная деактивация могла
+            # завершиться после того, как сервис прочитал команду
+            for name, value in counters.increment(models.Team, team.id, returning=('is_active',), **deltas).items():
+                setattr(team, name, value)
+        return team
 
-    def deactivate(self, id) -> models.Team:
-        team = models.Team.objects.get(id=id)
-        team.is_active = False
-        team.save()
-        return models.Team.objects.get(id=id)
+    def get_access_context(self, team_id, username) -> Union[TeamAccessContext, None]:
+        caller = models.ManuscriptUser.objects.filter(
+            user__username=username).values('id')[:1]
+        # Участие вызывающего присоединяется к запросу команды через FilteredRelation,
+        # select_related собирает из той же строки участника с пользователем
+        team = models.Team.objects.annotate(
+            caller=FilteredRelation('participant', condition=Q(
+                participant__user=Subquery(caller))),
+        ).select_related('event', 'caller__user__user').filter(id=team_id).first()
+        if team is None:
+            return None
+        # Без участия атрибут caller не заполняется
+        participant = getattr(team, 'caller', None)
+        if participant is None:
+            return TeamAccessContext(team=team)
+        participant.team = team
+        return TeamAccessContext(team=team, participant=participant)
 
 
 class FakeTeamRepository(AbstractTeamRepository):
 
-    def __init__(self) -> None:
-        self._teams = []
-        self._id = 0
+    def __init__(self, participants=None) -> None:
+        self._teams = memory.InMemoryTable(indexes=('event', 'is_active'))
+        self._participants = participants
 
     def get(self, **kwargs) -> Union[fake_models.Team, None]:
-        return next((team for team in self._teams if all(getattr(team, key) == value for key, value in kwargs.items())), None)
+        return self._teams.get(**kwargs)
 
     def create(self, **kwargs):
-        self._id += 1
-        team = fake_models.Team(id=self._id, **kwargs)
-        self._teams.append(team)
-        return team
+        return self._teams.add(fake_models.Team(id=self._teams.next_id(), **kwargs))
 
     def edit(self, id, **kwargs):
-        team = next((team for team in self._teams if team.id == id), None)
-        for key, value in kwargs.items():
-            if key == 'members':
-                team.members = value
-                continue
-            setattr(team, key, value)
-        self._teams = [team if team.id ==
-                       id else team for team in self._teams]
-        return team
-
-    def list(self, include_deactivated=False, **kwargs, ) -> List[fake_models.Team]:
-        return [team for team in self._teams if all(getattr(team, key) == value for key, value in kwargs.items())]
+        team = self._teams.get(id=id)
+        return self._teams.update(team, **kwargs)
+
+    def list(self, include_deactivated=False, limit=None, cursor=None, **kwargs, ) -> List[fake_models.Team]:
+        teams = self._teams.filter(**kwargs)
+        if limit is None:
+            return teams
+        teams = sorted(teams, key=lambda team: (team.created_at, team.id))
+        if cursor is not None:
+            teams = [team for team in teams if (team.created_at, team.id) > cursor]
+        return teams[:limit]
 
     def deactivate(self, id):
-        team = next((team for team in self._teams if team.id == id), None)
-        team.is_active = False
-        self._teams = [team if team.id ==
-                       id else team for team in self._teams]
+        team = self._teams.get(id=id)
+        if not team.is_active:
+            return None
+        return self._teams.update(team, is_active=False)
+
+    def activate(self, id):
+        team = self._teams.get(id=id)
+        if team.is_active:
+            return None
+        return self._teams.update(team, is_active=True)
+
+    def adjust_counters(self, team, **deltas):
+        for name, delta in deltas.items():
+            setattr(team, name, getattr(team, name) + delta)
         return team
+
+    def get_access_context(self, team_id, username) -> Union[TeamAccessContext, None]:
+        team = self.get(id=team_id)
+        if team is None:
+            return None
+        participant = self._participants.get(
+            team=team, user__username=username) if self._participants else None
+        return TeamAccessContext(team=team, participant=participant)
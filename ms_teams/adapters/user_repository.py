@@ -3,6 +3,7 @@ from typing import Union, List
 
 import app.models as models
 import domain.fake_models as fake_models
+import manuscript_shared.memory as memory
 import django.contrib.auth as django_auth
 
 
@@ -52,19 +53,10 @@ class ManuscriptUserRepository(AbstractUserRepository):
 class FakeManuscriptUserRepository(AbstractUserRepository):
 
     def __init__(self):
-        self._id = 1
-        self._users = []
+        self._users = memory.InMemoryTable(indexes=('username',))
 
     def get(self, **kwargs) -> Union[fake_models.ManuscriptUser, None]:
-        return next((user for user in self._users if all([
-            getattr(user, key) == value for key, value in kwargs.items()
-        ])), None)
+        return self._users.get(**kwargs)
 
     def create(self, **kwargs) -> fake_models.ManuscriptUser:
-        user = fake_models.ManuscriptUser(
-            id=self._id,
-            **kwargs
-        )
-        self._users.append(user)
-        self._id += 1
-        return user
+        return self._users.add(fake_models.ManuscriptUser(id=self._users.next_id(), **kwargs))
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+import app.models as models
+import adapters as repository
+import core.constants as constants
+
+PARTICIPANTS_PER_TEAM = 5
+TEAMS_PER_EVENT = 50
+
+
+class Command(BaseCommand):
+    help = '''Наполняет базу синтетическими данными и проверяет через EXPLAIN,
+что запросы service_layer.services к Participant и Team используют индексы.
+Данные откатываются после проверки.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        participants = options['participants']
+        self.verbosity = options['verbosity']
+        with transaction.atomic():
+            self.seed(participants)
+            failures = self.check_plans()
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                f'Sequential scan in: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'All team queries use indexes at {participants} participants'))
+
+    def seed(self, participants):
+        teams = max(participants // PARTICIPANTS_PER_TEAM, 1)
+        users = max(participants // PARTICIPANTS_PER_TEAM, PARTICIPANTS_PER_TEAM)
+        events = max(teams // TEAMS_PER_EVENT, 1)
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO auth_user (password, is_superuser, username, first_name, last_name,
+                                       email, is_staff, is_active, date_joined)
+                SELECT '', false, 'explain_' || n, '', '', '', false, true, now()
+                FROM generate_series(1, %s) AS n''', [users])
+            cursor.execute('''
+                INSERT INTO app_manuscriptuser (user_id)
+                SELECT id FROM auth_user WHERE username LIKE 'explain\\_%%' ''', [])
+            cursor.execute('''
+                INSERT INTO app_event (name, is_active, team_count, participant_count)
+                SELECT 'explain_' || n, true, 0, 0 FROM generate_series(1, %s) AS n''', [events])
+            cursor.execute('''
+                INSERT INTO app_team (name, created_at, is_active, applied_count, pending_count, event_id)
+                SELECT 'explain_' || n, now() - n * interval '1 second', n %% 10 <> 0, 0, 0,
+                       (SELECT min(id) FROM app_event WHERE name LIKE 'explain\\_%%') + n %% %s
+                FROM generate_series(0, %s) AS n''', [events, teams - 1])
+            cursor.execute('''
+                WITH u AS (SELECT min(mu.id) AS first, count(*) AS total FROM app_manuscriptuser mu
+                           JOIN auth_user au ON au.id = mu.user_id WHERE au.username LIKE 'explain\\_%%'),
+                     t AS (SELECT min(id) AS first FROM app_team WHERE name LIKE 'explain\\_%%')
+                INSERT INTO app_participant (user_id, team_id, role, status)
+                SELECT u.first + n %% u.total, t.first + n / %s,
+                       CASE WHEN n %% %s = 0 THEN %s ELSE %s END,
+                       CASE WHEN n %% 3 = 0 THEN %s ELSE %s END
+                FROM generate_series(0, %s) AS n, u, t''', [
+                PARTICIPANTS_PER_TEAM, PARTICIPANTS_PER_TEAM, constants.LEADER_ROLE, constants.MEMBER_ROLE,
+                constants.PENDING_STATUS, constants.APPLIED_STATUS, participants - 1])
+            cursor.execute('ANALYZE auth_user, app_manuscriptuser, app_event, app_team, app_participant')
+
+    def check_plans(self):
+        participant = models.Participant.objects.filter(
+            role=constants.MEMBER_ROLE).order_by('-id').first()
+        team, user, event = participant.team, participant.user, participant.team.event
+        teams = list(repository.TeamRepository().list(event=event, limit=20))
+        participants = repository.ParticipantRepository()
+        queries = {
+            'team.get(id)': models.Team.objects.filter(id=team.id),
+            'team.list(event, page)': repository.TeamRepository().list(event=event, limit=20),
+            'participant.get(id, team)': participants.list(id=participant.id, team=team),
+            'participant.get(user, team)': participants.list(user=user, team=team),
+            'participant.get(user, team, role)': participants.list(
+                user=user, team=team, role=constants.LEADER_ROLE),
+            'participant.get(user, team, status)': participants.list(
+                user=user, team=team, status=constants.APPLIED_STATUS),
+            'participant.list(team, APPLIED)': participants.list(
+                team=team, status=constants.APPLIED_STATUS),
+            'participant.list(team, PENDING)': participants.list(
+                team=team, status=constants.PENDING_STATUS),
+            'participant.list(team)': participants.list(team=team),
+            'participant.list_by_teams(APPLIED)': participants.list_by_teams(
+                teams, status=constants.APPLIED_STATUS),
+            'participant.list_by_teams(user)': participants.list_by_teams(teams, user=user),
+        }
+        failures = []
+        for name, queryset in queries.items():
+            # Присоединенные через select_related таблицы могут читаться целиком
+            # на маленьких объемах, важен только доступ к фильтруемой таблице
+            plan = queryset.explain()
+            if f'Seq Scan on {queryset.model._meta.db_table} ' in plan:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: sequential scan'))
+            else:
+                self.stdout.write(f'{name}: OK')
+            if self.verbosity > 1:
+                self.stdout.write(plan)
+        return failures
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+import app.models as models
+import core.constants as constants
+
+
+def participant_count(status):
+    return Coalesce(Subquery(models.Participant.objects.filter(team=OuterRef('pk'), status=status).values(
+        'team').annotate(count=Count('id')).values('count')), 0)
+
+
+class Command(BaseCommand):
+    help = '''Пересчитывает счетчики Team.applied_count/pending_count и
+Event.team_count/participant_count по таблицам Participant и Team
+и исправляет разошедшиеся значения.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать количество разошедшихся записей')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            teams = models.Team.objects.annotate(
+                expected_applied=participant_count(constants.APPLIED_STATUS),
+                expected_pending=participant_count(constants.PENDING_STATUS),
+            ).filter(~Q(applied_count=F('expected_applied')) | ~Q(pending_count=F('expected_pending')))
+            team_ids = list(teams.values_list('id', flat=True))
+            if team_ids and not options['dry_run']:
+                models.Team.objects.filter(id__in=team_ids).update(
+                    applied_count=participant_count(constants.APPLIED_STATUS),
+                    pending_count=participant_count(constants.PENDING_STATUS),
+                )
+            expected_teams = Coalesce(Subquery(models.Team.objects.filter(
+                event=OuterRef('pk'), is_active=True).values('event').annotate(count=Count('id')).values('count')), 0)
+            expected_participants = Coalesce(Subquery(models.Participant.objects.filter(
+                team__event=OuterRef('pk'), team__is_active=True, status=constants.APPLIED_STATUS).values(
+                'team__event').annotate(count=Count('id')).values('count')), 0)
+            events = models.Event.objects.annotate(
+                expected_teams=expected_teams,
+                expected_participants=expected_participants,
+            ).filter(~Q(team_count=F('expected_teams')) | ~Q(participant_count=F('expected_participants')))
+            event_ids = list(events.values_list('id', flat=True))
+            if event_ids and not options['dry_run']:
+                models.Event.objects.filter(id__in=event_ids).update(
+                    team_count=expected_teams,
+                    participant_count=expected_participants,
+                )
+        action = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} counters of {len(team_ids)} teams and {len(event_ids)} events'))
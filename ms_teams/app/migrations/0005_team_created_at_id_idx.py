@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_alter_participant_role_alter_participant_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['created_at', 'id'], name='team_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+def remove_duplicate_participants(apps, schema_editor):
+    # Services always read the earliest (user, team) row, keep it and drop the rest
+    Participant = apps.get_model('app', 'Participant')
+    duplicates = Participant.objects.values('user', 'team').annotate(
+        first_id=models.Min('id'), count=models.Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        Participant.objects.filter(user=duplicate['user'], team=duplicate['team']).exclude(
+            id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_team_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['team', 'status'], name='participant_team_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(condition=models.Q(('status', 'APPLIED')), fields=['team'], name='participant_team_applied_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(condition=models.Q(('role', 'LEADER')), fields=['team'], name='participant_team_leader_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(fields=['event', 'is_active'], name='team_event_is_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='team',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['event', 'created_at', 'id'], name='team_active_event_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_participants,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.UniqueConstraint(fields=('user', 'team'), name='participant_user_team_unique'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-17 19:05
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Event = apps.get_model('app', 'Event')
+    Team = apps.get_model('app', 'Team')
+    Participant = apps.get_model('app', 'Participant')
+
+    def count(status):
+        return Coalesce(models.Subquery(Participant.objects.filter(team=models.OuterRef('pk'), status=status).values(
+            'team').annotate(count=models.Count('id')).values('count')), 0)
+
+    Team.objects.update(applied_count=count('APPLIED'), pending_count=count('PENDING'))
+    teams = Team.objects.filter(event=models.OuterRef('pk'), is_active=True).values('event')
+    Event.objects.update(
+        team_count=Coalesce(models.Subquery(teams.annotate(count=models.Count('id')).values('count')), 0),
+        participant_count=Coalesce(models.Subquery(
+            teams.annotate(count=models.Sum('applied_count')).values('count')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_participant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participant_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='team_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='applied_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='pending_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 19:30
+
+from django.db import migrations, models
+import uuid
+
+
+def generate_message_ids(apps, schema_editor):
+    OutboxMessage = apps.get_model('app', 'OutboxMessage')
+    for message in OutboxMessage.objects.filter(message_id__isnull=True).only('id'):
+        message.message_id = uuid.uuid4()
+        message.save(update_fields=['message_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_outbox_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedMessage',
+            fields=[
+                ('message_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('processed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        # Одинаковый default для всех строк сделал бы неотправленные сообщения
+        # дубликатами друг друга, поэтому id заполняются по одному
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='message_id',
+            field=models.UUIDField(null=True, editable=False),
+        ),
+        migrations.RunPython(generate_message_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='message_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
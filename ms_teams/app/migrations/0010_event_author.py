@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_outbox_message_id_processed_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='author',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='authored_events', to='app.manuscriptuser'),
+        ),
+    ]
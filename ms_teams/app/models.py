@@ -1,5 +1,7 @@
+import uuid
 import jwt
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.conf import settings
 import core.constants as constants
@@ -37,6 +39,12 @@ class ManuscriptUser(models.Model):
 class Event(models.Model):
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
+    team_count = models.IntegerField(default=0)
+    participant_count = models.IntegerField(default=0)
+    # Организатор из ms_event. Сообщения о пользователе и мероприятии приходят
+    # из разных очередей, поэтому внешний ключ не проверяется базой
+    author = models.ForeignKey(ManuscriptUser, null=True, blank=True, on_delete=models.SET_NULL,
+                               db_constraint=False, related_name='authored_events')
 
     def __str__(self) -> str:
         return f'{self.name} ({self.type.name}): {self.start_date} - {self.end_date}'
@@ -46,6 +54,8 @@ class Event(models.Model):
             'id': self.id,
             'name': self.name,
             'is_active': self.is_active,
+            'team_count': self.team_count,
+            'participant_count': self.participant_count,
         }
 
     def get_image_url(self):
@@ -61,6 +71,18 @@ class Team(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
+    applied_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='team_created_at_id_idx'),
+            models.Index(fields=['event', 'is_active'],
+                         name='team_event_is_active_idx'),
+            models.Index(fields=['event', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='team_active_event_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -69,11 +91,16 @@ class Team(models.Model):
         return self.members.all()
 
     def to_dict(self):
+        return {**self.to_flat_dict(), 'event': self.event.to_dict()}
+
+    def to_flat_dict(self):
         return {
             'id': self.id,
             'name': self.name,
-            'event': self.event.to_dict(),
+            'event': self.event_id,
             'is_active': self.is_active,
+            'applied_count': self.applied_count,
+            'pending_count': self.pending_count,
         }
 
 
@@ -85,14 +112,59 @@ class Participant(models.Model):
     status = models.CharField(
         max_length=100, default=constants.PENDING_STATUS)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'team'],
+                                    name='participant_user_team_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['team', 'status'],
+                         name='participant_team_status_idx'),
+            models.Index(fields=['team'], condition=models.Q(status=constants.APPLIED_STATUS),
+                         name='participant_team_applied_idx'),
+            models.Index(fields=['team'], condition=models.Q(role=constants.LEADER_ROLE),
+                         name='participant_team_leader_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'{self.user} - {self.team}'
 
     def to_dict(self):
+        return {**self.to_flat_dict(), 'user': self.user.to_dict(), 'team': self.team.to_dict()}
+
+    def to_flat_dict(self):
         return {
             'id': self.id,
-            'user': self.user.to_dict(),
-            'team': self.team.to_dict(),
+            'user': self.user_id,
+            'team': self.team_id,
             'role': self.role,
             'status': self.status,
         }
+
+
+class OutboxMessage(models.Model):
+    '''
+    Исходящее сообщение RabbitMQ, записанное в транзакции изменения данных.
+    Отправляется и удаляется процессом entrypoints.outbox_relay
+    '''
+    # Публикуется как message_id AMQP: по нему потребители узнают повторную доставку
+    message_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    routing_key = models.CharField(max_length=255)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.id}: {self.routing_key}'
+
+
+class ProcessedMessage(models.Model):
+    '''
+    Журнал обработанных сообщений RabbitMQ: message_id записывается в транзакции
+    обработчика, поэтому повторная доставка того же сообщения пропускается.
+    Записи старше PROCESSED_MESSAGES_RETENTION удаляются потребителем
+    '''
+    message_id = models.UUIDField(primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.message_id}: {self.processed_at}'
@@ -1,10 +1,17 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from django.http import StreamingHttpResponse
 import service_layer.services as services
 import service_layer.unit_of_work as unit_of_work
 import core.logger as logger
 import core.exceptions as exceptions
+import core.constants as constants
+
+ROSTER_CONTENT_TYPES = {
+    constants.NDJSON_FORMAT: 'application/x-ndjson; charset=utf-8',
+    constants.CSV_FORMAT: 'text/csv; charset=utf-8',
+}
 
 
 @api_view(['GET', 'POST'])
@@ -94,7 +101,7 @@ def team(request, team_id: int):
         return Response({"message": exceptions.UNKNOWN_EXCEPTION_MESSAGE}, status=400)
 
 
-@api_view(['GET', 'POST', 'DELETE'])
+@api_view(['GET', 'POST', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def team_participants(request, team_id: int):
     uow = unit_of_work.DjangoORMUnitOfWork()
@@ -103,7 +110,8 @@ def team_participants(request, team_id: int):
     try:
         if request.method == 'GET':
             result = services.get_team_requests(
-                uow, team_id=team_id, username=request.user.username)
+                uow, team_id=team_id, username=request.user.username,
+                format=request.query_params.get('format', None))
             if result.is_ok:
                 logger.info(
                     request.user, f"GET /teams/{team_id}/participants SUCCESS")
@@ -123,6 +131,17 @@ def team_participants(request, team_id: int):
                 logger.warning(
                     request.user, f"POST /teams/{team_id}/participants FAIL {result.to_response()}")
                 return Response(result.to_response(), status=400)
+        elif request.method == 'PUT':
+            result = services.bulk_change_team_participation_request_status_service(
+                uow, team_id=team_id, username=request.user.username, changes=request.data)
+            if result.is_ok:
+                logger.info(
+                    request.user, f"PUT /teams/{team_id}/participants SUCCESS")
+                return Response(result.to_response(), status=200)
+            else:
+                logger.warning(
+                    request.user, f"PUT /teams/{team_id}/participants FAIL {result.to_response()}")
+                return Response(result.to_response(), status=400)
         elif request.method == 'DELETE':
             result = services.leave_team_service(
                 uow, team_id=team_id, username=request.user.username)
@@ -176,3 +195,32 @@ def team_participant(request, team_id: int, participant_id: int):
         logger.error(
             request.user, f"{request.method} /teams/{team_id}/participants/{participant_id} FAIL {e}")
         return Response({'message': exceptions.UNKNOWN_EXCEPTION_MESSAGE}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def event_roster(request, event_id: int):
+    uow = unit_of_work.DjangoORMUnitOfWork()
+    logger.info(request.user, f"GET /events/{event_id}/roster")
+    try:
+        format = request.query_params.get('format', None) or constants.NDJSON_FORMAT
+        result = services.export_event_roster_service(
+            uow, username=request.user.username, event_id=event_id, format=format,
+            is_staff=request.user.is_staff)
+        if result.is_ok:
+            logger.info(request.user, f"GET /events/{event_id}/roster SUCCESS")
+            response = StreamingHttpResponse(
+                result.data, content_type=ROSTER_CONTENT_TYPES[format])
+            response['Content-Disposition'] = f'attachment; filename="event_{event_id}_roster.{format}"'
+            # Не даем nginx буферизовать поток целиком
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        else:
+            logger.warning(
+                request.user, f"GET /events/{event_id}/roster FAIL {result.to_response()}")
+            status = 403 if result.error is exceptions.UserIsNotEventAuthorException else 400
+            return Response(result.to_response(), status=status)
+    except Exception as e:
+        logger.error(
+            request.user, f"GET /events/{event_id}/roster FAIL {e}")
+        return Response({'message': exceptions.UNKNOWN_EXCEPTION_MESSAGE}, status=400)
@@ -11,3 +11,9 @@ PARTICIPANT_ROLES = (
     (MEMBER_ROLE, MEMBER_ROLE),
     (LEADER_ROLE, LEADER_ROLE),
 )
+NORMALIZED_FORMAT = 'normalized'
+RESPONSE_FORMATS = (NORMALIZED_FORMAT, )
+TEAM_COUNTER_FIELDS = ('applied_count', 'pending_count')
+NDJSON_FORMAT = 'ndjson'
+CSV_FORMAT = 'csv'
+ROSTER_FORMATS = (NDJSON_FORMAT, CSV_FORMAT)
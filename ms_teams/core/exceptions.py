@@ -1,13 +1,21 @@
+# Ошибку конверта вызывает manuscript_shared.envelope, сервисы ловят тот же класс
+from manuscript_shared.exceptions import INVALID_MESSAGE_EXCEPTION_MESSAGE, InvalidMessageException
+
 UNKNOWN_EXCEPTION_MESSAGE = 'An unknown exception occurred.'
 INVALID_TEAM_DATA_EXCEPTION_MESSAGE = "Invalid team data"
 TEAM_NOT_FOUND_EXCEPTION_MESSAGE = "Team not found"
 EVENT_NOT_FOUND_EXCEPTION_MESSAGE = "Event not found"
 USER_IS_NOT_TEAM_LEADER_EXCEPTION_MESSAGE = "User is not team leader"
 USER_IS_NOT_TEAM_MEMBER_EXCEPTION_MESSAGE = "User is not team member"
+USER_IS_NOT_EVENT_AUTHOR_EXCEPTION_MESSAGE = "User is not event author"
 USER_ALREADY_HAS_PARTICIPATION_EXCEPTION_MESSAGE = "User already has participation"
 PARTICIPANT_NOT_FOUND_EXCEPTION_MESSAGE = "User is not participant"
 INVALID_PARTICIPANT_STATUS_EXCEPTION_MESSAGE = "Invalid participant status"
 PARTICIPANT_ALREADY_HAS_STATUS_EXCEPTION_MESSAGE = "Participant already has status"
+PARTICIPANT_STATUS_CHANGED_EXCEPTION_MESSAGE = "Participant status was changed by another request"
+INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE = "Invalid pagination params"
+INVALID_PARTICIPANTS_DATA_EXCEPTION_MESSAGE = "Invalid participants data"
+INVALID_RESPONSE_FORMAT_EXCEPTION_MESSAGE = "Invalid response format"
 
 
 class InvalidTeamDataException(Exception):
@@ -30,6 +38,10 @@ class UserIsNotTeamMemberException(Exception):
     message = USER_IS_NOT_TEAM_MEMBER_EXCEPTION_MESSAGE
 
 
+class UserIsNotEventAuthorException(Exception):
+    message = USER_IS_NOT_EVENT_AUTHOR_EXCEPTION_MESSAGE
+
+
 class UserAlreadyHasParticipationException(Exception):
     message = USER_ALREADY_HAS_PARTICIPATION_EXCEPTION_MESSAGE
 
@@ -44,3 +56,19 @@ class InvalidParticipantStatusException(Exception):
 
 class ParticipantAlreadyHasStatusException(Exception):
     message = PARTICIPANT_ALREADY_HAS_STATUS_EXCEPTION_MESSAGE
+
+
+class ParticipantStatusChangedException(Exception):
+    message = PARTICIPANT_STATUS_CHANGED_EXCEPTION_MESSAGE
+
+
+class InvalidPaginationParamsException(Exception):
+    message = INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE
+
+
+class InvalidParticipantsDataException(Exception):
+    message = INVALID_PARTICIPANTS_DATA_EXCEPTION_MESSAGE
+
+
+class InvalidResponseFormatException(Exception):
+    message = INVALID_RESPONSE_FORMAT_EXCEPTION_MESSAGE
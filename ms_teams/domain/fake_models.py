@@ -1,15 +1,23 @@
+import datetime
+
+
 class Event():
     # is_active = models.BooleanField(default=True)
 
-    def __init__(self, name, is_active=True):
+    def __init__(self, name, is_active=True, team_count=0, participant_count=0, author_id=None):
         self.name = name
         self.is_active = is_active
+        self.team_count = team_count
+        self.participant_count = participant_count
+        self.author_id = author_id
 
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'is_active': self.is_active,
+            'team_count': self.team_count,
+            'participant_count': self.participant_count,
         }
 
 
@@ -32,12 +40,15 @@ class ManuscriptUser:
 
 
 class Team:
-    def __init__(self, name, event, is_active=True,  id=None, image='',):
+    def __init__(self, name, event, is_active=True,  id=None, image='', created_at=None, applied_count=0, pending_count=0):
         self.id = id
         self.name = name
         self.image = image
         self.event = event
         self.is_active = is_active
+        self.created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        self.applied_count = applied_count
+        self.pending_count = pending_count
 
     def to_dict(self):
         return {
@@ -46,8 +57,13 @@ class Team:
             'image': self.image,
             'event': self.event,
             'is_active': self.is_active,
+            'applied_count': self.applied_count,
+            'pending_count': self.pending_count,
         }
 
+    def to_flat_dict(self):
+        return {**self.to_dict(), 'event': self.event.id}
+
     def get_members(self):
         return self.members
 
@@ -60,6 +76,10 @@ class Participant:
         self.role = role
         self.status = status
 
+    @property
+    def team_id(self):
+        return self.team.id
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -68,3 +88,12 @@ class Participant:
             'role': self.role,
             'status': self.status,
         }
+
+    def to_flat_dict(self):
+        return {
+            'id': self.id,
+            'user': self.user.id,
+            'team': self.team.id,
+            'role': self.role,
+            'status': self.status,
+        }
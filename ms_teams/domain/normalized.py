@@ -0,0 +1,44 @@
+class NormalizedDocument:
+    '''
+    Ответ в формате ?format=normalized: каждая сущность сериализуется один раз
+    и хранится в словаре верхнего уровня, списки ссылаются на нее по id
+    '''
+
+    def __init__(self):
+        self.teams = {}
+        self.events = {}
+        self.users = {}
+        self.participants = {}
+
+    def add_event(self, event) -> int:
+        if event.id not in self.events:
+            self.events[event.id] = event.to_dict()
+        return event.id
+
+    def add_user(self, user) -> int:
+        if user.id not in self.users:
+            self.users[user.id] = user.to_dict()
+        return user.id
+
+    def add_team(self, team, **extra) -> int:
+        if team.id not in self.teams:
+            self.teams[team.id] = team.to_flat_dict()
+            self.add_event(team.event)
+        self.teams[team.id].update(extra)
+        return team.id
+
+    def add_participant(self, participant) -> int:
+        if participant.id not in self.participants:
+            self.participants[participant.id] = participant.to_flat_dict()
+            self.add_user(participant.user)
+            self.add_team(participant.team)
+        return participant.id
+
+    def to_dict(self, **data) -> dict:
+        return {
+            **data,
+            'teams': self.teams,
+            'events': self.events,
+            'users': self.users,
+            'participants': self.participants,
+        }
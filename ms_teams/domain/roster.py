@@ -0,0 +1,50 @@
+import io
+import csv
+import json
+from typing import Iterable, Iterator
+
+ROSTER_FIELDS = ('team_id', 'team_name', 'participant_id', 'user_id', 'username',
+                 'email', 'first_name', 'last_name', 'role', 'status')
+ROWS_PER_CHUNK = 500
+
+
+def to_ndjson(rows: Iterable[tuple]) -> Iterator[str]:
+    '''
+    Сериализует строки состава команд в NDJSON: один JSON-объект на строку
+    '''
+    return _batched(json.dumps(dict(zip(ROSTER_FIELDS, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def to_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    '''
+    Сериализует строки состава команд в CSV с заголовком
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def lines():
+        writer.writerow(ROSTER_FIELDS)
+        yield _drain(buffer)
+        for row in rows:
+            writer.writerow(row)
+            yield _drain(buffer)
+    return _batched(lines())
+
+
+def _drain(buffer: io.StringIO) -> str:
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def _batched(lines: Iterator[str]) -> Iterator[str]:
+    # Отдаем ответ порциями, а не построчно, чтобы не делать write на каждую строку
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
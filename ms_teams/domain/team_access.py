@@ -0,0 +1,23 @@
+import core.constants as constants
+
+
+class TeamAccessContext:
+    '''
+    Команда и участие в ней текущего пользователя
+    '''
+
+    def __init__(self, team, participant=None):
+        self.team = team
+        self.participant = participant
+
+    @property
+    def user(self):
+        return self.participant.user if self.participant else None
+
+    @property
+    def is_leader(self):
+        return self.participant is not None and self.participant.role == constants.LEADER_ROLE
+
+    @property
+    def is_applied(self):
+        return self.participant is not None and self.participant.status == constants.APPLIED_STATUS
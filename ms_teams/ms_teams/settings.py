@@ -59,6 +59,8 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
+    # ?format= выбирает формат ответа сервиса (normalized), а не renderer DRF
+    'URL_FORMAT_OVERRIDE': None,
 }
 
 AUTHENTICATION_BACKENDS = [
@@ -216,6 +218,9 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Брокер сообщений: rabbitmq или memory (брокер в памяти процесса)
+MESSAGE_BROKER = cfg['MESSAGE_BROKER']
+
 # RabbitMQ settings
 # or the hostname where RabbitMQ is running
 RABBITMQ_HOST = cfg['RABBITMQ_LOCAL_HOST']
@@ -239,4 +244,29 @@ RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY = cfg['RABBITMQ_USER_JOIN_REQUEST_ROUTING
 RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY = cfg[
     'RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY']
 
+# Redis settings
+REDIS_HOST = cfg['REDIS_HOST']
+REDIS_PORT = cfg['REDIS_PORT']
+REDIS_DATABASE = cfg['REDIS_DATABASE']
+REDIS_SOCKET_TIMEOUT = cfg['REDIS_SOCKET_TIMEOUT']
+TEAM_CACHE_TTL = cfg['TEAM_CACHE_TTL']
+TEAM_CACHE_LOCK_TTL = cfg['TEAM_CACHE_LOCK_TTL']
+ROSTER_CHUNK_SIZE = cfg['ROSTER_CHUNK_SIZE']
+
+RABBITMQ_HEARTBEAT = cfg['RABBITMQ_HEARTBEAT']
+RABBITMQ_PREFETCH_COUNT = cfg['RABBITMQ_PREFETCH_COUNT']
+RABBITMQ_CONSUMER_WORKERS = cfg['RABBITMQ_CONSUMER_WORKERS']
+RABBITMQ_CONSUMER_BATCH_SIZE = cfg['RABBITMQ_CONSUMER_BATCH_SIZE']
+RABBITMQ_CONSUMER_BATCH_LINGER = cfg['RABBITMQ_CONSUMER_BATCH_LINGER']
+RABBITMQ_RETRY_DELAYS = cfg['RABBITMQ_RETRY_DELAYS']
+PROCESSED_MESSAGES_RETENTION = cfg['PROCESSED_MESSAGES_RETENTION']
+PROCESSED_MESSAGES_PRUNE_INTERVAL = cfg['PROCESSED_MESSAGES_PRUNE_INTERVAL']
+RABBITMQ_PUBLISH_QUEUE_SIZE = cfg['RABBITMQ_PUBLISH_QUEUE_SIZE']
+RABBITMQ_PUBLISH_BATCH_SIZE = cfg['RABBITMQ_PUBLISH_BATCH_SIZE']
+RABBITMQ_PUBLISH_LINGER = cfg['RABBITMQ_PUBLISH_LINGER']
+RABBITMQ_CONTENT_TYPE = cfg['RABBITMQ_CONTENT_TYPE']
+
+OUTBOX_BATCH_SIZE = cfg['OUTBOX_BATCH_SIZE']
+OUTBOX_POLL_INTERVAL = cfg['OUTBOX_POLL_INTERVAL']
+
 TOKEN_SECRET = 'neon-gravestones'
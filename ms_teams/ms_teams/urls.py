@@ -9,4 +9,6 @@ urlpatterns = [
          views.team_participants, name='team_participants'),
     path('teams/<int:team_id>/participants/<int:participant_id>',
          views.team_participant, name='team_participant'),
+    path('events/<int:event_id>/roster',
+         views.event_roster, name='event_roster'),
 ]
@@ -1,91 +1,106 @@
-
-
-import pika
-from abc import ABC, abstractmethod
+'''
+Брокер сообщений сервиса: классы manuscript_shared.rabbitmq и manuscript_shared.consumer
+с параметрами из settings. Потребитель выполняет обработчики в транзакции Django и
+закрывает устаревшие соединения с базой в потоках пула
+'''
 import os
+from django import db
+from django.db import transaction
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+import manuscript_shared.memory_broker as memory_broker
+import manuscript_shared.rabbitmq as rabbitmq
+import manuscript_shared.consumer as consumer
+# Имена, которые используют потребители и тесты сервиса
+from manuscript_shared.rabbitmq import (
+    AbstractMessageBroker, Message, RECONNECT_ERRORS, RETRY_COUNT_HEADER, LAST_ERROR_HEADER, RETRY_HEADERS,
+    ROUTING_KEY_HEADER, retry_queue_name, dead_letter_queue_name, original_routing_key, retry_queues)
 os.environ['DJANGO_SETTINGS_MODULE'] = 'ms_teams.settings'
 
 
-class AbstractMessageBroker(ABC):
-    @abstractmethod
-    def connect(self):
-        pass
+class RabbitMQ(rabbitmq.RabbitMQ):
 
-    @abstractmethod
-    def publish(self, exchange, routing_key, message):
-        pass
+    def __init__(self, host: str = settings.RABBITMQ_HOST, port: str = settings.RABBITMQ_PORT, username: str = settings.RABBITMQ_USER,
+                 password: str = settings.RABBITMQ_PASSWORD, exchange: str = settings.RABBITMQ_EXCHANGE_NAME, vhost=settings.RABBITMQ_VHOST, exchange_type='topic',
+                 heartbeat: int = settings.RABBITMQ_HEARTBEAT, retry_delays=settings.RABBITMQ_RETRY_DELAYS):
+        super().__init__(host=host, port=port, username=username, password=password, exchange=exchange, vhost=vhost,
+                         exchange_type=exchange_type, heartbeat=heartbeat, retry_delays=retry_delays)
 
-    @abstractmethod
-    def subscribe(self, exchange, queue, callback, routing_key):
-        pass
 
-    @abstractmethod
-    def disconnect(self):
-        pass
+class InMemoryBroker(rabbitmq.InMemoryBroker):
 
+    def __init__(self, server: memory_broker.InMemoryServer = None, exchange: str = settings.RABBITMQ_EXCHANGE_NAME,
+                 exchange_type='topic', retry_delays=settings.RABBITMQ_RETRY_DELAYS):
+        super().__init__(server=server, exchange=exchange, exchange_type=exchange_type, retry_delays=retry_delays)
 
-class RabbitMQ(AbstractMessageBroker):
 
-    def __init__(self, host: str = settings.RABBITMQ_HOST, port: str = settings.RABBITMQ_PORT, username: str = settings.RABBITMQ_USER,
-                 password: str = settings.RABBITMQ_PASSWORD, exchange: str = settings.RABBITMQ_EXCHANGE_NAME, vhost=settings.RABBITMQ_VHOST, exchange_type='topic'):
-        self.host = host
-        self.port = port
-        self.username = username
-        self.password = password
-        self.exchange = exchange
-
-        self.vhost = vhost
-
-        self.connection = None
-        self.channel = None
-
-        self.exchange_type = exchange_type
-
-    def __enter__(self):
-        self.connect()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.disconnect()
-
-    def connect(self):
-        credentials = pika.credentials.PlainCredentials(
-            self.username, self.password)
-        parameters = pika.ConnectionParameters(
-            host=self.host, port=self.port, credentials=credentials, virtual_host=self.vhost)
-        if self.vhost == 'test':
-            parameters = pika.ConnectionParameters(
-                host=self.host, port=self.port, credentials=credentials)
-        self.connection = pika.BlockingConnection(parameters)
-        self.channel = self.connection.channel()
-        self.channel.exchange_declare(
-            exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
-
-    def publish(self, routing_key, message):
-        self.channel.basic_publish(
-            exchange=self.exchange, routing_key=routing_key, body=message, properties=pika.BasicProperties(delivery_mode=2))
-
-    def subscribe(self, queue, callback, routing_key):
-        result = self.channel.queue_declare(queue=queue, durable=True)
-        queue_name = result.method.queue
-        self.channel.queue_bind(
-            exchange=self.exchange, queue=queue_name, routing_key=routing_key)
-        self.channel.basic_consume(
-            queue=queue_name, on_message_callback=callback, auto_ack=True)
-
-    def queue_bind(self, queue, routing_key):
-        self.channel.queue_bind(
-            exchange=self.exchange, queue=queue, routing_key=routing_key)
-
-    def start_consuming(self):
-        self.channel.start_consuming()
-
-    def disconnect(self):
-        self.channel.close()
-        self.connection.close()
-
-    def consume_last_message(self, queue):
-        method, properties, body = self.channel.basic_get(
-            queue=queue, auto_ack=True)
-        return body
+# Реализации брокера, которые выбирает настройка MESSAGE_BROKER
+BROKERS = {
+    'rabbitmq': RabbitMQ,
+    'memory': InMemoryBroker,
+}
+
+
+def create_broker() -> RabbitMQ:
+    '''
+    Создает брокер, выбранный настройкой MESSAGE_BROKER: rabbitmq или memory
+    '''
+    if settings.MESSAGE_BROKER not in BROKERS:
+        raise ImproperlyConfigured(f'Unknown MESSAGE_BROKER: {settings.MESSAGE_BROKER}')
+    return BROKERS[settings.MESSAGE_BROKER]()
+
+
+class ConsumerPool(consumer.ConsumerPool):
+
+    def __init__(self, message_broker: AbstractMessageBroker, workers: int = settings.RABBITMQ_CONSUMER_WORKERS,
+                 batch_size: int = settings.RABBITMQ_CONSUMER_BATCH_SIZE, linger: float = settings.RABBITMQ_CONSUMER_BATCH_LINGER,
+                 ledger=None, retry_delays=settings.RABBITMQ_RETRY_DELAYS):
+        super().__init__(message_broker, workers=workers, batch_size=batch_size, linger=linger, ledger=ledger,
+                         retry_delays=retry_delays, atomic=transaction.atomic, close_connections=db.close_old_connections)
+
+
+class Publisher(rabbitmq.Publisher):
+
+    def __init__(self, broker_factory=create_broker, confirm: bool = True, heartbeat: float = settings.RABBITMQ_HEARTBEAT):
+        super().__init__(broker_factory=broker_factory, confirm=confirm, heartbeat=heartbeat)
+
+
+class BackgroundPublisher(rabbitmq.BackgroundPublisher):
+
+    def __init__(self, publisher: Publisher = None, max_queue_size: int = settings.RABBITMQ_PUBLISH_QUEUE_SIZE,
+                 batch_size: int = settings.RABBITMQ_PUBLISH_BATCH_SIZE, linger: float = settings.RABBITMQ_PUBLISH_LINGER):
+        super().__init__(publisher or Publisher(), max_queue_size=max_queue_size, batch_size=batch_size, linger=linger)
+
+
+_publisher = None
+_background_publisher = None
+
+
+def get_publisher() -> Publisher:
+    '''
+    Возвращает Publisher текущего процесса
+    '''
+    global _publisher
+    if _publisher is None:
+        _publisher = Publisher()
+    return _publisher
+
+
+def get_background_publisher() -> BackgroundPublisher:
+    '''
+    Возвращает BackgroundPublisher текущего процесса, который публикует через get_publisher()
+    '''
+    global _background_publisher
+    if _background_publisher is None:
+        _background_publisher = BackgroundPublisher(publisher=get_publisher())
+    return _background_publisher
+
+
+def _reset_after_fork():
+    # Блокировки, поток и соединение родителя в дочернем процессе непригодны
+    global _publisher, _background_publisher
+    _publisher = None
+    _background_publisher = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,122 +1,215 @@
-import json
 from django.conf import settings
-import service_layer.message_broker as mb
 import service_layer.unit_of_work as uow
 from service_layer.result import Result
 import core.exceptions as exceptions
 import core.logger as logger
 import core.constants as constants
+import manuscript_shared.pagination as pagination
+import adapters.cache as cache
+import domain.normalized as normalized
+import domain.roster as roster
 
 
 def create_team_service(uow: uow.AbstractUnitOfWork, username: str, event_id: int, **kwargs):
-    with uow:
+    with uow, uow.transaction():
         if not kwargs.get('name', ''):
             return Result(None, error=exceptions.InvalidTeamDataException)
         event = uow.event.get(id=event_id)
         if event is None:
             return Result(data=None, error=exceptions.EventNotFoundException)
-        team = uow.team.create(event=event, **kwargs)
+        team = uow.team.create(event=event, **without_counters(kwargs), applied_count=1)
         user = uow.user.get(username=username)
         uow.participant.create(
             user=user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+        if team.is_active:
+            uow.event.adjust_counters(event, team_count=1, participant_count=1)
         participants = uow.participant.list(team=team)
         return Result(data={**team.to_dict(), "participants": [participant.to_dict() for participant in participants]}, error=None)
 
 
 def get_team_service(uow: uow.AbstractUnitOfWork, team_id: int, username):
     with uow:
-        team = uow.team.get(id=team_id)
-        if team is None:
+        document = uow.cache.get_or_set(
+            cache.team_key(team_id), lambda: build_team_document(uow, team_id))
+        if document is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        participants = uow.participant.list(
-            team=team, status=constants.APPLIED_STATUS)
         user = uow.user.get(username=username)
-        participation = uow.participant.get(user=user, team=team)
-        return Result(data={**team.to_dict(),
+        participation = uow.participant.get(
+            user=user, team_id=team_id) if user is not None else None
+        return Result(data={**document['team'],
                             "user_participation_status": participation.status if participation else None,
-                            "participants": [participant.to_dict() for participant in participants]
+                            "participants": document['participants']
                             }, error=None)
 
 
-def list_team_service(uow: uow.AbstractUnitOfWork, username, **kwargs):
+def build_team_document(uow: uow.AbstractUnitOfWork, team_id: int):
+    '''
+    Собирает кэшируемую часть ответа get_team_service: команду и ее участников
+    '''
+    team = uow.team.get(id=team_id)
+    if team is None:
+        return None
+    participants = uow.participant.list_by_teams(
+        [team], status=constants.APPLIED_STATUS)
+    return {"team": team.to_dict(), "participants": [participant.to_dict() for participant in participants]}
+
+
+def list_team_service(uow: uow.AbstractUnitOfWork, username, limit=None, cursor=None, format=None, **kwargs):
     with uow:
-        teams = uow.team.list(**kwargs)
-        result = []
+        if format is not None and format not in constants.RESPONSE_FORMATS:
+            return Result(data=None, error=exceptions.InvalidResponseFormatException)
         user = uow.user.get(username=username)
-        for team in teams:
-            participants = uow.participant.list(
-                team=team, status=constants.APPLIED_STATUS)
-            participation = uow.participant.get(user=user, team=team)
-            result.append({**team.to_dict(),
-                           "user_participation_status": participation.status if participation else None,
-                           "participants": [participant.to_dict() for participant in participants]})
+        page = None
+        if limit is None and cursor is None:
+            teams = list(uow.team.list(**kwargs))
+        else:
+            try:
+                limit, cursor = pagination.parse_page_params(limit, cursor)
+            except ValueError:
+                return Result(data=None, error=exceptions.InvalidPaginationParamsException)
+            teams, next_cursor = pagination.paginate(
+                uow.team.list(limit=limit + 1, cursor=cursor, **kwargs), limit)
+            page = {"next_cursor": next_cursor}
+        if format == constants.NORMALIZED_FORMAT:
+            document = assemble_teams_normalized(uow, teams=teams, user=user)
+            return Result(data=document.to_dict(results=[team.id for team in teams], **(page or {})), error=None)
+        if page is None:
+            return Result(data=assemble_teams(uow, teams=teams, user=user), error=None)
+        return Result(data={"results": assemble_teams(uow, teams=teams, user=user), **page}, error=None)
+
+
+def assemble_teams(uow: uow.AbstractUnitOfWork, teams: list, user=None) -> list:
+    '''
+    Собирает список команд вместе с участниками и статусом участия пользователя.
+    Количество запросов не зависит от количества команд.
+    '''
+    participants = {team.id: [] for team in teams}
+    for participant in uow.participant.list_by_teams(teams, status=constants.APPLIED_STATUS):
+        participants[participant.team.id].append(participant.to_dict())
+    participations = {}
+    if user is not None:
+        for participation in uow.participant.list_by_teams(teams, user=user):
+            participations.setdefault(
+                participation.team.id, participation.status)
+    return [{**team.to_dict(),
+             "user_participation_status": participations.get(team.id),
+             "participants": participants[team.id]} for team in teams]
 
-        return Result(data=result, error=None)
+
+def assemble_teams_normalized(uow: uow.AbstractUnitOfWork, teams: list, user=None) -> normalized.NormalizedDocument:
+    '''
+    То же, что assemble_teams, но для ?format=normalized: участники команды передаются списком id
+    '''
+    document = normalized.NormalizedDocument()
+    participants = {team.id: [] for team in teams}
+    for participant in uow.participant.list_by_teams(teams, status=constants.APPLIED_STATUS):
+        participants[participant.team.id].append(document.add_participant(participant))
+    participations = {}
+    if user is not None:
+        for participation in uow.participant.list_by_teams(teams, user=user):
+            participations.setdefault(
+                participation.team.id, participation.status)
+    for team in teams:
+        document.add_team(team, user_participation_status=participations.get(team.id),
+                          participants=participants[team.id])
+    return document
 
 
 def edit_team_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int, **kwargs):
-    with uow:
+    with uow, uow.transaction():
         if not kwargs.get('name', ''):
             return Result(None, error=exceptions.InvalidTeamDataException)
-        team = uow.team.get(id=team_id)
-        if team is None:
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        user = uow.user.get(username=username)
-        leader = uow.participant.get(
-            user=user, team=team, role=constants.LEADER_ROLE)
-        if not leader or leader.user.username != username:
+        if not access.is_leader:
             return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
-        team = uow.team.edit(id=team.id, **kwargs)
+        data = without_counters(kwargs)
+        is_active = to_bool(data.pop('is_active', access.team.is_active))
+        team = uow.team.edit(id=access.team.id, **data)
+        if is_active != team.is_active:
+            team = activate_team(uow, team) if is_active else deactivate_team(uow, team)
+        uow.cache.delete(cache.team_key(team.id))
         participants = uow.participant.list(team=team)
         return Result(data={**team.to_dict(),
                             "participants": [participant.to_dict() for participant in participants]}, error=None)
 
 
 def deactivate_team_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int):
-    with uow:
-        team = uow.team.get(id=team_id)
-        if team is None:
+    with uow, uow.transaction():
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        user = uow.user.get(username=username)
-        leader = uow.participant.get(
-            user=user, team=team, role=constants.LEADER_ROLE)
-        if not leader or leader.user.username != username:
+        if not access.is_leader:
             return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
-        team = uow.team.deactivate(id=team.id)
+        team = deactivate_team(uow, access.team)
+        uow.cache.delete(cache.team_key(team.id))
         participants = uow.participant.list(team=team)
         return Result(data={**team.to_dict(),
                             "participants": [participant.to_dict() for participant in participants]}, error=None)
 
 
-def get_team_requests(uow: uow.AbstractUnitOfWork, username: str, team_id: int):
+def export_event_roster_service(uow: uow.AbstractUnitOfWork, username: str, event_id: int, format=None,
+                                is_staff: bool = False):
+    '''
+    Возвращает генератор, отдающий состав команд мероприятия в NDJSON или CSV.
+    Строки читаются из базы порциями по мере отправки ответа. Состав с контактами
+    участников доступен только организатору мероприятия и сотрудникам (is_staff)
+    '''
     with uow:
-        team = uow.team.get(id=team_id)
-        if team is None:
+        format = format or constants.NDJSON_FORMAT
+        if format not in constants.ROSTER_FORMATS:
+            return Result(data=None, error=exceptions.InvalidResponseFormatException)
+        event = uow.event.get(id=event_id)
+        if event is None:
+            return Result(data=None, error=exceptions.EventNotFoundException)
+        if not is_staff:
+            user = uow.user.get(username=username)
+            if user is None or event.author_id != user.id:
+                return Result(data=None, error=exceptions.UserIsNotEventAuthorException)
+        rows = uow.participant.roster(
+            event_id=event.id, chunk_size=settings.ROSTER_CHUNK_SIZE)
+        render = roster.to_csv if format == constants.CSV_FORMAT else roster.to_ndjson
+        return Result(data=render(rows), error=None)
+
+
+def get_team_requests(uow: uow.AbstractUnitOfWork, username: str, team_id: int, format=None):
+    with uow:
+        if format is not None and format not in constants.RESPONSE_FORMATS:
+            return Result(data=None, error=exceptions.InvalidResponseFormatException)
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        user = uow.user.get(username=username)
-        leader = uow.participant.get(
-            user=user, team=team, role=constants.LEADER_ROLE)
-        if not leader or leader.user.username != username:
+        if not access.is_leader:
             return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
+        team = access.team
         participants = uow.participant.list(
             team=team, status=constants.PENDING_STATUS)
+        if format == constants.NORMALIZED_FORMAT:
+            document = normalized.NormalizedDocument()
+            results = [document.add_participant(participant) for participant in participants]
+            return Result(data=document.to_dict(results=results), error=None)
         return Result(data=[participant.to_dict() for participant in participants], error=None)
 
 
 def join_team_request_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int):
-    with uow:
+    with uow, uow.transaction():
         team = uow.team.get(id=team_id)
         if team is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
         user = uow.user.get(username=username)
-        participant = uow.participant.get(user=user, team=team)
-        if participant:
-            return Result(data=None, error=exceptions.UserAlreadyHasParticipationException)
-        participant = uow.participant.create(
+        participant = uow.participant.create_if_not_exists(
             user=user, team=team, role=constants.MEMBER_ROLE, status=constants.PENDING_STATUS)
+        if participant is None:
+            return Result(data=None, error=exceptions.UserAlreadyHasParticipationException)
+        update_participant_counters(uow, team, [(None, constants.PENDING_STATUS)])
+        uow.cache.delete(cache.team_key(team.id))
         participants_list = uow.participant.list(team=team, status=constants.APPLIED_STATUS)
         handle_publish_message_on_team_services(
-            data={
+            uow=uow, data={
                 "user": user.to_dict(),
                 "team": team.to_dict(),
                 "to": [p.user.id for p in participants_list if p.user.id != user.id],
@@ -126,26 +219,33 @@ def join_team_request_service(uow: uow.AbstractUnitOfWork, username: str, team_i
 
 
 def change_team_participation_request_status_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int, participant_id: int, status: str):
-    with uow:
+    with uow, uow.transaction():
         if status not in constants.PARTICIPANT_STATUSES:
             return Result(data=None, error=exceptions.InvalidParticipantStatusException)
-        team = uow.team.get(id=team_id)
-        if team is None:
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        participant = uow.participant.get(id=participant_id)
+        participant = uow.participant.get(id=participant_id, team=access.team)
         if not participant:
             return Result(data=None, error=exceptions.ParticipantNotFoundException)
         if participant.status == status:
             return Result(data=None, error=exceptions.ParticipantAlreadyHasStatusException)
-        user = uow.user.get(username=username)
-        leader = uow.participant.get(
-            user=user, team=team, role=constants.LEADER_ROLE)
-        if not leader:
+        if not access.is_leader:
             return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
-        participant = uow.participant.edit(
-            id=participant.id, status=status)
+        team, user = access.team, access.user
+        # Счетчики меняет только запрос, чей условный UPDATE изменил статус
+        old_status = participant.status
+        participant = uow.participant.edit_status(
+            id=participant.id, status=status, expected_status=old_status)
+        if participant is None:
+            return Result(data=None, error=exceptions.ParticipantStatusChangedException)
+        update_participant_counters(uow, team, [(old_status, status)])
+        # Участник перечитан до изменения счетчиков, берем команду с новыми значениями
+        participant.team = team
+        uow.cache.delete(cache.team_key(team.id))
         handle_publish_message_on_team_services(
-            data={
+            uow=uow, data={
                 "user": user.to_dict(),
                 "team": team.to_dict(),
                 "to": [participant.user.id],
@@ -154,24 +254,96 @@ def change_team_participation_request_status_service(uow: uow.AbstractUnitOfWork
         return Result(data=participant.to_dict(), error=None)
 
 
+def bulk_change_team_participation_request_status_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int, changes: list):
+    '''
+    Меняет статусы нескольких участников команды одним запросом и одним сообщением.
+    Возвращает результат по каждому элементу changes: {"participant_id", "data", "error"}
+    '''
+    with uow, uow.transaction():
+        if not isinstance(changes, list) or not changes or \
+                not all(isinstance(change, dict) for change in changes):
+            return Result(data=None, error=exceptions.InvalidParticipantsDataException)
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
+            return Result(data=None, error=exceptions.TeamNotFoundException)
+        if not access.is_leader:
+            return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
+        team, user = access.team, access.user
+        # bool - подкласс int, а True == 1, поэтому true/false из JSON не считаются id
+        ids = [change.get('participant_id') for change in changes]
+        participants = {participant.id: participant for participant in uow.participant.list(
+            id__in=[id for id in ids if type(id) is int], team=team)}
+        statuses, items = {}, []
+        for id, change in zip(ids, changes):
+            status = change.get('status')
+            participant = participants.get(id) if type(id) is int else None
+            if status not in constants.PARTICIPANT_STATUSES:
+                error = exceptions.InvalidParticipantStatusException
+            elif participant is None:
+                error = exceptions.ParticipantNotFoundException
+            elif id in statuses:
+                error = exceptions.InvalidParticipantsDataException
+            elif participant.status == status:
+                error = exceptions.ParticipantAlreadyHasStatusException
+            else:
+                error = None
+                statuses[id] = status
+            items.append((id, error))
+        expected = {id: participants[id].status for id in statuses}
+        changed = uow.participant.bulk_edit_status(statuses, expected)
+        # Участников, которых параллельно изменил другой запрос, пропускаем вместе со счетчиками
+        items = [(id, exceptions.ParticipantStatusChangedException if error is None and id not in changed else error)
+                 for id, error in items]
+        statuses = {id: status for id, status in statuses.items() if id in changed}
+        update_participant_counters(
+            uow, team, [(expected[id], status) for id, status in statuses.items()])
+        for id, status in statuses.items():
+            participants[id].status = status
+            participants[id].team = team
+        if statuses:
+            uow.cache.delete(cache.team_key(team.id))
+            handle_publish_message_on_team_services(
+                uow=uow, data={
+                    "user": user.to_dict(),
+                    "team": team.to_dict(),
+                    "to": [participants[id].user.id for id in statuses],
+                    'action': 'change_participant_status',
+                    'changes': [{
+                        'to': participants[id].user.id,
+                        'action': 'change_participant_status to {}'.format(status),
+                    } for id, status in statuses.items()],
+                }, routing_key=settings.RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY)
+        return Result(data=[{
+            "participant_id": id,
+            "data": participants[id].to_dict() if error is None else None,
+            "error": error.message if error else None,
+        } for id, error in items], error=None)
+
+
 def kick_team_participant_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int, participant_id: int):
-    with uow:
-        team = uow.team.get(id=team_id)
-        if team is None:
+    with uow, uow.transaction():
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
+        team, user = access.team, access.user
         participant = uow.participant.get(id=participant_id, team=team)
         if not participant:
             return Result(data=None, error=exceptions.ParticipantNotFoundException)
-        user = uow.user.get(username=username)
-        leader = uow.participant.get(
-            user=user, team=team, role=constants.LEADER_ROLE)
-        if not leader:
+        if not access.is_leader:
             return Result(data=None, error=exceptions.UserIsNotTeamLeaderException)
-        participant = uow.participant.edit(
-            id=participant.id, status=constants.KICKED_STATUS)
+        old_status = participant.status
+        participant = uow.participant.edit_status(
+            id=participant.id, status=constants.KICKED_STATUS, expected_status=old_status)
+        if participant is None:
+            return Result(data=None, error=exceptions.ParticipantStatusChangedException)
+        update_participant_counters(uow, team, [(old_status, constants.KICKED_STATUS)])
+        participant.team = team
+        uow.cache.delete(cache.team_key(team.id))
         participants_list = uow.participant.list(team=team, status=constants.APPLIED_STATUS)
         handle_publish_message_on_team_services(
-            data={
+            uow=uow, data={
                 "user": user.to_dict(),
                 "team": team.to_dict(),
                 'action': 'kick',
@@ -181,17 +353,21 @@ def kick_team_participant_service(uow: uow.AbstractUnitOfWork, username: str, te
 
 
 def leave_team_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int):
-    with uow:
-        team = uow.team.get(id=team_id)
-        if team is None:
+    with uow, uow.transaction():
+        access = uow.team.get_access_context(
+            team_id=team_id, username=username)
+        if access is None:
             return Result(data=None, error=exceptions.TeamNotFoundException)
-        user = uow.user.get(username=username)
-        participant = uow.participant.get(
-            user=user, team=team, status=constants.APPLIED_STATUS)
-        if not participant:
+        if not access.is_applied:
             return Result(data=None, error=exceptions.ParticipantNotFoundException)
-        participant = uow.participant.edit(
-            id=participant.id, status=constants.LEFT_STATUS)
+        team, user, participant = access.team, access.user, access.participant
+        old_status = participant.status
+        participant = uow.participant.edit_status(
+            id=participant.id, status=constants.LEFT_STATUS, expected_status=old_status)
+        if participant is None:
+            return Result(data=None, error=exceptions.ParticipantStatusChangedException)
+        update_participant_counters(uow, team, [(old_status, constants.LEFT_STATUS)])
+        participant.team = team
         if participant.role == constants.LEADER_ROLE:
             participants = uow.participant.list(
                 team=team, status=constants.APPLIED_STATUS)
@@ -200,10 +376,11 @@ def leave_team_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int)
                 new_leader = uow.participant.edit(
                     id=new_leader.id, role=constants.LEADER_ROLE)
             else:
-                team = uow.team.deactivate(id=team.id)
+                team = deactivate_team(uow, team)
+        uow.cache.delete(cache.team_key(team.id))
         participants_list = uow.participant.list(team=team, status=constants.APPLIED_STATUS)
         handle_publish_message_on_team_services(
-            data={
+            uow=uow, data={
                 "user": user.to_dict(),
                 "team": team.to_dict(),
                 'action': 'leave',
@@ -212,17 +389,67 @@ def leave_team_service(uow: uow.AbstractUnitOfWork, username: str, team_id: int)
         return Result(data=participant.to_dict(), error=None)
 
 
-def handle_publish_message_on_team_services(data: dict, routing_key):
-    try:
-        if settings.DEBUG:
-            return
-        else:
-            message_broker = mb.RabbitMQ()
-        with message_broker:
-            message_broker.publish(
-                message=json.dumps(data), routing_key=routing_key)
-        logger.info(user='PUBLISHER',
-                    message=f'Data({data}) sent to {routing_key}', logger=logger.mb_logger)
-    except Exception as e:
-        logger.error(
-            user='PUBLISHER', message=f'Error while publishing message {data} on routing key {routing_key}: {e}', logger=logger.mb_logger)
+def without_counters(data: dict) -> dict:
+    '''
+    Убирает из данных запроса денормализованные счетчики, их меняют только сервисы
+    '''
+    return {key: value for key, value in data.items() if key not in constants.TEAM_COUNTER_FIELDS}
+
+
+def to_bool(value) -> bool:
+    '''
+    Приводит значение из тела запроса к bool: формы передают 'true'/'false' строками
+    '''
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'on', 'yes')
+    return bool(value)
+
+
+def update_participant_counters(uow: uow.AbstractUnitOfWork, team, transitions: list):
+    '''
+    Обновляет счетчики участников команды и ее мероприятия по переходам статусов
+
+            Args:
+                    team: [Team] - команда
+                    transitions: [List[tuple]] - пары (старый статус, новый статус), None - участия не было
+    '''
+    applied = sum((new == constants.APPLIED_STATUS) - (old == constants.APPLIED_STATUS)
+                  for old, new in transitions)
+    pending = sum((new == constants.PENDING_STATUS) - (old == constants.PENDING_STATUS)
+                  for old, new in transitions)
+    uow.team.adjust_counters(team, applied_count=applied, pending_count=pending)
+    if team.is_active:
+        uow.event.adjust_counters(team.event, participant_count=applied)
+
+
+def deactivate_team(uow: uow.AbstractUnitOfWork, team):
+    '''
+    Деактивирует команду и исключает ее из счетчиков мероприятия. Счетчики меняет
+    только запрос, чей условный UPDATE действительно выключил команду
+    '''
+    deactivated = uow.team.deactivate(id=team.id)
+    if deactivated is None:
+        return uow.team.get(id=team.id)
+    uow.event.adjust_counters(deactivated.event, team_count=-1, participant_count=-deactivated.applied_count)
+    return deactivated
+
+
+def activate_team(uow: uow.AbstractUnitOfWork, team):
+    '''
+    Снова активирует команду и возвращает ее участников в счетчики мероприятия
+    '''
+    activated = uow.team.activate(id=team.id)
+    if activated is None:
+        return uow.team.get(id=team.id)
+    uow.event.adjust_counters(activated.event, team_count=1, participant_count=activated.applied_count)
+    return activated
+
+
+def handle_publish_message_on_team_services(uow: uow.AbstractUnitOfWork, data: dict, routing_key):
+    '''
+    Записывает сообщение в outbox в транзакции сервиса. В RabbitMQ его отправит
+    entrypoints.outbox_relay, поэтому запрос не ждет брокера и сообщение не теряется
+    '''
+    uow.outbox.add(routing_key=routing_key, payload=data)
+    logger.info(user='PUBLISHER',
+                message=f'Data({data}) queued to {routing_key}', logger=logger.mb_logger)
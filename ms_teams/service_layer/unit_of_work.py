@@ -1,6 +1,8 @@
 # pylint: disable=attribute-defined-outside-init
 from __future__ import annotations
 import abc
+import contextlib
+from django.db import transaction
 
 import adapters as repository
 
@@ -10,6 +12,8 @@ class AbstractUnitOfWork(abc.ABC):
     user: repository.AbstractUserRepository
     team: repository.AbstractTeamRepository
     participant: repository.AbstractParticipantRepository
+    cache: repository.AbstractCache
+    outbox: repository.AbstractOutboxRepository
 
     def __enter__(self) -> AbstractUnitOfWork:
         return self
@@ -17,6 +21,13 @@ class AbstractUnitOfWork(abc.ABC):
     def __exit__(self, *args):
         self.rollback()
 
+    def transaction(self):
+        '''
+        Контекст, в котором изменения сервиса (вместе со счетчиками и сообщениями outbox)
+        фиксируются атомарно
+        '''
+        return contextlib.nullcontext()
+
     @abc.abstractmethod
     def commit(self):
         raise NotImplementedError
@@ -33,11 +44,16 @@ class DjangoORMUnitOfWork(AbstractUnitOfWork):
         self.user = repository.ManuscriptUserRepository()
         self.team = repository.TeamRepository()
         self.participant = repository.ParticipantRepository()
+        self.cache = repository.get_cache()
+        self.outbox = repository.OutboxRepository()
         return super().__enter__()
 
     def __exit__(self, *args):
         super().__exit__(*args)
 
+    def transaction(self):
+        return transaction.atomic()
+
     def commit(self):
         pass
 
@@ -49,8 +65,10 @@ class FakeUnitOfWork(AbstractUnitOfWork):
     def __init__(self):
         self.event = repository.FakeEventRepository()
         self.user = repository.FakeManuscriptUserRepository()
-        self.team = repository.FakeTeamRepository()
         self.participant = repository.FakeParticipantRepository()
+        self.team = repository.FakeTeamRepository(participants=self.participant)
+        self.cache = repository.FakeCache()
+        self.outbox = repository.FakeOutboxRepository()
 
     def commit(self):
         self.committed = True
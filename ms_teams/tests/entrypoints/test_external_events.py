@@ -1,8 +1,10 @@
+import json
 from django.test import TestCase
 from unittest.mock import MagicMock, call
 from django.conf import settings
 
 import entrypoints.event_consumer as event_consumer
+import service_layer.message_broker as message_broker
 import app.models as models
 
 
@@ -29,14 +31,19 @@ class TestExternalEvents(TestCase):
             call(queue=settings.RABBITMQ_QUEUE_EVENT_EDIT,
                  routing_key=settings.RABBITMQ_EVENT_EDIT_ROUTING_KEY),
         ])
-        mb.channel.basic_consume.assert_has_calls([
-            # queue=queue, on_message_callback=callback, auto_ack=True)
-            call(queue=settings.RABBITMQ_QUEUE_USER_CREATED,
-                 on_message_callback=event_consumer.handle_user_creation, auto_ack=True),
-            call(queue=settings.RABBITMQ_QUEUE_EVENT_CREATE,
-                 on_message_callback=event_consumer.handle_event_creation, auto_ack=True),
-            call(queue=settings.RABBITMQ_QUEUE_EVENT_EDIT,
-                 on_message_callback=event_consumer.handle_event_edit, auto_ack=True),
+        mb.channel.basic_qos.assert_called_once_with(
+            prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+        consumes = mb.channel.basic_consume.call_args_list
+        self.assertEqual([(c.kwargs['queue'], c.kwargs['auto_ack']) for c in consumes], [
+            (settings.RABBITMQ_QUEUE_USER_CREATED, False),
+            (settings.RABBITMQ_QUEUE_EVENT_CREATE, False),
+            (settings.RABBITMQ_QUEUE_EVENT_EDIT, False),
+        ])
+        # Обработчики выполняются в пуле потоков и подтверждают сообщение сами
+        self.assertEqual([c.kwargs['on_message_callback'].handler for c in consumes], [
+            event_consumer.handle_user_creation,
+            event_consumer.handle_event_creation,
+            event_consumer.handle_event_edit,
         ])
         mb.start_consuming.assert_called_once()
 
@@ -48,7 +55,7 @@ class TestExternalEvents(TestCase):
         body = '{"id": 999, "username": "testuser", "email": "test@example.com", "first_name": "Test", "last_name": "User"}'
 
         # Call the handle_user_creation function with the mocked parameters
-        event_consumer.handle_user_creation(ch, method, properties, body)
+        event_consumer.handle_user_creation([message_broker.Message(method, properties, body, json.loads(body))])
 
         # Assert that the User and ManuscriptUser objects were created correctly
         self.assertTrue(models.User.objects.filter(
@@ -60,16 +67,17 @@ class TestExternalEvents(TestCase):
         ch = MagicMock()
         method = MagicMock()
         properties = MagicMock()
-        body = '{"id": 999, "name": "Test Event", "is_active": false}'
+        body = '{"id": 999, "name": "Test Event", "is_active": false, "author": {"id": 5}}'
 
         # Call the handle_event_creation function with the mocked parameters
-        event_consumer.handle_event_creation(ch, method, properties, body)
+        event_consumer.handle_event_creation([message_broker.Message(method, properties, body, json.loads(body))])
 
         # Assert that the Event object was created correctly
         self.assertTrue(models.Event.objects.filter(id=999).exists())
         self.assertFalse(models.Event.objects.filter(id=999).first().is_active)
         self.assertEqual(models.Event.objects.filter(
             id=999).first().name, 'Test Event')
+        self.assertEqual(models.Event.objects.get(id=999).author_id, 5)
 
     def test_handle_event_edit_event_should_edit_event(self):
         # Create an Event object
@@ -82,10 +90,24 @@ class TestExternalEvents(TestCase):
         body = '{"id": 999, "name": "Test Event Edited", "is_active": true}'
 
         # Call the handle_event_edit function with the mocked parameters
-        event_consumer.handle_event_edit(ch, method, properties, body)
+        event_consumer.handle_event_edit([message_broker.Message(method, properties, body, json.loads(body))])
 
         # Assert that the Event object was edited correctly
         self.assertTrue(models.Event.objects.filter(id=999).exists())
         self.assertTrue(models.Event.objects.filter(id=999).first().is_active)
         self.assertEqual(models.Event.objects.filter(
             id=999).first().name, 'Test Event Edited')
+
+    def test_handlers_should_write_whole_batch(self):
+        users = [message_broker.Message(MagicMock(), MagicMock(), b'', {
+            'id': 900 + i, 'username': f'user{i}', 'first_name': 'Test', 'last_name': 'User'}) for i in range(3)]
+        event_consumer.handle_user_creation(users)
+        self.assertEqual(list(models.ManuscriptUser.objects.filter(id__gte=900).order_by('id').values_list(
+            'id', 'user__username')), [(900, 'user0'), (901, 'user1'), (902, 'user2')])
+
+        models.Event.objects.create(id=999, name='Test Event', is_active=True)
+        edits = [message_broker.Message(MagicMock(), MagicMock(), b'', {
+            'id': 999, 'name': name, 'is_active': True}) for name in ('First edit', 'Last edit')]
+        event_consumer.handle_event_edit(edits)
+        self.assertEqual(models.Event.objects.get(id=999).name, 'Last edit')
+
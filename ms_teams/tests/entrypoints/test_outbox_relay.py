@@ -0,0 +1,50 @@
+import json
+from django.test import TestCase
+from unittest.mock import MagicMock
+
+import entrypoints.outbox_relay as outbox_relay
+import app.models as models
+import manuscript_shared.envelope as envelope
+
+
+class TestOutboxRelay(TestCase):
+    def setUp(self):
+        for i in range(3):
+            models.OutboxMessage.objects.create(
+                routing_key='TEST_ROUTING_KEY', payload={'id': i})
+
+    def test_relay_batch_should_publish_oldest_messages_and_delete_them(self):
+        mb = MagicMock()
+        sent = outbox_relay.relay_batch(mb, batch_size=2)
+        self.assertEqual(sent, 2)
+        self.assertEqual([json.loads(call.kwargs['message'])['payload'] for call in mb.publish.call_args_list],
+                         [{'id': 0}, {'id': 1}])
+        self.assertEqual(list(models.OutboxMessage.objects.values_list('payload', flat=True)), [{'id': 2}])
+
+    def test_relay_batch_should_keep_messages_when_publish_fails(self):
+        mb = MagicMock()
+        mb.publish.side_effect = [None, Exception('Message was nacked')]
+        with self.assertRaises(Exception):
+            outbox_relay.relay_batch(mb, batch_size=3)
+        self.assertEqual(models.OutboxMessage.objects.count(), 3)
+
+    def test_relay_batch_should_publish_message_ids(self):
+        message_ids = [str(message_id) for message_id in models.OutboxMessage.objects.order_by(
+            'id').values_list('message_id', flat=True)]
+        mb = MagicMock()
+        outbox_relay.relay_batch(mb, batch_size=3)
+        self.assertEqual([call.kwargs['message_id'] for call in mb.publish.call_args_list], message_ids)
+        self.assertEqual(len(set(message_ids)), 3)
+
+    def test_relay_batch_should_publish_envelopes_with_schema_fields(self):
+        models.OutboxMessage.objects.all().delete()
+        message = models.OutboxMessage.objects.create(routing_key='EVENT_CREATED', payload={
+            'id': 1, 'name': 'event', 'is_active': True, 'description': 'not in schema'})
+        mb = MagicMock()
+        outbox_relay.relay_batch(mb, batch_size=1, content_type=envelope.JSON_CONTENT_TYPE)
+        publish = mb.publish.call_args.kwargs
+        self.assertEqual(publish['content_type'], envelope.JSON_CONTENT_TYPE)
+        decoded = envelope.decode(publish['message'], publish['content_type'], publish['routing_key'])
+        self.assertEqual((decoded.type, decoded.version, decoded.id, decoded.correlation_id),
+                         ('EVENT_CREATED', 1, str(message.message_id), str(message.message_id)))
+        self.assertEqual(decoded.payload, {'id': 1, 'name': 'event', 'is_active': True})
@@ -1,10 +1,13 @@
+import json
 from django.test import TestCase, override_settings
+from django.conf import settings
 
 from service_layer.result import Result
 import service_layer.services as services
 import service_layer.unit_of_work as uow
 import core.exceptions as exceptions
 import core.constants as constants
+import domain.roster as roster
 
 
 @override_settings(DEBUG=True)
@@ -12,7 +15,7 @@ class TestTeamServices(TestCase):
     def setUp(self) -> None:
         self.uow = uow.FakeUnitOfWork()
         self.user = self.uow.user.create(username="test", password="test")
-        self.event = self.uow.event.create(name="test_event")
+        self.event = self.uow.event.create(name="test_event", author_id=self.user.id)
         return super().setUp()
 
     def create_team(self, name='test_team', event=None, user=None):
@@ -20,11 +23,18 @@ class TestTeamServices(TestCase):
             user = self.user
         if event is None:
             event = self.event
-        team = self.uow.team.create(name=name, event=event, image='test_image')
+        team = self.uow.team.create(name=name, event=event, image='test_image', applied_count=1)
+        self.uow.event.adjust_counters(event, team_count=1, participant_count=1)
         self.uow.participant.create(
             user=user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
         return team
 
+    def create_participant(self, user, team, status, role=constants.MEMBER_ROLE):
+        participant = self.uow.participant.create(
+            user=user, team=team, status=status, role=role)
+        services.update_participant_counters(self.uow, team, [(None, status)])
+        return participant
+
     # Create
     def test_create_team_service_should_create_team_and_return_result_with_team(self):
         body = {
@@ -37,6 +47,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "participants": [
                 {
                     'id': 1,
@@ -47,6 +59,8 @@ class TestTeamServices(TestCase):
                         'image': 'test_image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -86,6 +100,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "user_participation_status": None,
             "participants": [
                 {
@@ -97,6 +113,8 @@ class TestTeamServices(TestCase):
                         'image': 'test_image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -110,7 +128,7 @@ class TestTeamServices(TestCase):
     def test_get_team_service_should_return_result_with_team_and_user_participation_with_corresponding_status_when_user_has_participated(self):
         team = self.create_team()
         another_user = self.uow.user.create(username='another_user')
-        self.uow.participant.create(
+        self.create_participant(
             user=another_user, team=team, status=constants.KICKED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             "id": team.id,
@@ -118,6 +136,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "user_participation_status": constants.KICKED_STATUS,
             "participants": [
                 {
@@ -129,6 +149,8 @@ class TestTeamServices(TestCase):
                         'image': 'test_image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -145,6 +167,28 @@ class TestTeamServices(TestCase):
             uow=self.uow, team_id=999, username=None)
         self.assertEqual(expected, result)
 
+    def test_get_team_service_should_return_cached_team_until_participants_change(self):
+        team = self.create_team()
+        services.get_team_service(
+            uow=self.uow, team_id=team.id, username=None)
+        self.uow.team.edit(id=team.id, name='changed outside of services')
+        result = services.get_team_service(
+            uow=self.uow, team_id=team.id, username=None)
+        self.assertEqual(result.data['name'], 'test_team')
+
+        another_user = self.uow.user.create(username='another_user')
+        participant = services.join_team_request_service(
+            uow=self.uow, username=another_user.username, team_id=team.id).data
+        services.change_team_participation_request_status_service(
+            uow=self.uow, username=self.user.username, team_id=team.id,
+            participant_id=participant['id'], status=constants.APPLIED_STATUS)
+        result = services.get_team_service(
+            uow=self.uow, team_id=team.id, username=another_user.username)
+        self.assertEqual(result.data['name'], 'changed outside of services')
+        self.assertEqual(len(result.data['participants']), 2)
+        self.assertEqual(
+            result.data['user_participation_status'], constants.APPLIED_STATUS)
+
     # # List
     def test_list_team_service_should_return_result_with_teams(self):
         self.create_team(name='test_team')
@@ -157,6 +201,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "user_participation_status": constants.APPLIED_STATUS,
             "participants": [
                 {
@@ -168,6 +214,8 @@ class TestTeamServices(TestCase):
                         'image': 'test_image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -180,6 +228,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "user_participation_status": None,
             "participants": [
                 {
@@ -191,6 +241,8 @@ class TestTeamServices(TestCase):
                         'image': 'test_image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -201,6 +253,58 @@ class TestTeamServices(TestCase):
             uow=self.uow, username=self.user.username)
         self.assertEqual(expected, result)
 
+    def test_list_team_service_should_return_page_of_teams_with_next_cursor(self):
+        teams = [self.create_team(name=f'team {i}') for i in range(3)]
+        result = services.list_team_service(
+            uow=self.uow, username=self.user.username, limit=2)
+        self.assertEqual([team['id'] for team in result.data['results']],
+                         [teams[0].id, teams[1].id])
+        result = services.list_team_service(
+            uow=self.uow, username=self.user.username, limit=2, cursor=result.data['next_cursor'])
+        self.assertEqual([team['id'] for team in result.data['results']],
+                         [teams[2].id])
+        self.assertIsNone(result.data['next_cursor'])
+
+    def test_list_team_service_should_return_normalized_teams_when_format_is_normalized(self):
+        team = self.create_team(name='test_team')
+        another_user = self.uow.user.create(username='another_user')
+        another_team = self.create_team(name='new team', user=another_user)
+        self.create_participant(
+            user=another_user, team=team, role=constants.MEMBER_ROLE, status=constants.APPLIED_STATUS)
+        result = services.list_team_service(
+            uow=self.uow, username=self.user.username, format=constants.NORMALIZED_FORMAT)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.data['results'], [team.id, another_team.id])
+        self.assertEqual(result.data['teams'][team.id], {
+            'id': team.id,
+            'name': 'test_team',
+            'image': 'test_image',
+            'event': self.event.id,
+            'is_active': True,
+            'applied_count': 2,
+            'pending_count': 0,
+            'user_participation_status': constants.APPLIED_STATUS,
+            'participants': [1, 3],
+        })
+        self.assertEqual(result.data['teams'][another_team.id]['participants'], [2])
+        self.assertEqual(result.data['events'], {self.event.id: self.event.to_dict()})
+        self.assertEqual(result.data['users'], {
+            self.user.id: self.user.to_dict(), another_user.id: another_user.to_dict()})
+        self.assertEqual(result.data['participants'][3], {
+            'id': 3,
+            'user': another_user.id,
+            'team': team.id,
+            'role': constants.MEMBER_ROLE,
+            'status': constants.APPLIED_STATUS,
+        })
+
+    def test_list_team_service_should_return_result_with_error_when_format_is_invalid(self):
+        expected = Result(
+            data=None, error=exceptions.InvalidResponseFormatException)
+        result = services.list_team_service(
+            uow=self.uow, username=self.user.username, format='invalid')
+        self.assertEqual(expected, result)
+
     # # Edit
     def test_edit_team_service_should_edit_team_and_return_result_with_team(self):
         team = self.create_team()
@@ -210,6 +314,8 @@ class TestTeamServices(TestCase):
             "image": 'updated image',
             "event": self.event,
             "is_active": True,
+            "applied_count": 1,
+            "pending_count": 0,
             "participants": [
                 {
                     'id': 1,
@@ -220,6 +326,8 @@ class TestTeamServices(TestCase):
                         "image": 'updated image',
                         'event': self.event,
                         'is_active': True,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -262,6 +370,8 @@ class TestTeamServices(TestCase):
             "image": 'test_image',
             "event": self.event,
             "is_active": False,
+            "applied_count": 1,
+            "pending_count": 0,
             "participants": [
                 {
                     'id': 1,
@@ -272,6 +382,8 @@ class TestTeamServices(TestCase):
                         "image": 'test_image',
                         'event': self.event,
                         'is_active': False,
+                        'applied_count': 1,
+                        'pending_count': 0,
                     },
                     'role': constants.LEADER_ROLE,
                     'status': constants.APPLIED_STATUS,
@@ -309,6 +421,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 1,
+                'pending_count': 1,
             },
             'role': constants.MEMBER_ROLE,
             'status': constants.PENDING_STATUS,
@@ -317,6 +431,16 @@ class TestTeamServices(TestCase):
             uow=self.uow, username=another_user.username, team_id=team.id)
         self.assertEqual(expected, result)
 
+    def test_join_team_request_service_should_queue_message_in_outbox(self):
+        team = self.create_team()
+        another_user = self.uow.user.create(username="another_user")
+        services.join_team_request_service(
+            uow=self.uow, username=another_user.username, team_id=team.id)
+        messages = self.uow.outbox.list(routing_key=settings.RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['user'], another_user.to_dict())
+        self.assertEqual(messages[0]['to'], [self.user.id])
+
     def test_join_team_request_service_should_return_result_with_error_when_team_is_not_found(self):
         expected = Result(data=None, error=exceptions.TeamNotFoundException)
         result = services.join_team_request_service(
@@ -335,7 +459,7 @@ class TestTeamServices(TestCase):
     def test_change_team_participation_service_should_return_result_with_applied_participation(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.PENDING_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             'id': 2,
@@ -346,6 +470,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 2,
+                'pending_count': 0,
             },
             'role': constants.MEMBER_ROLE,
             'status': constants.APPLIED_STATUS,
@@ -354,7 +480,7 @@ class TestTeamServices(TestCase):
             uow=self.uow, username=self.user.username, team_id=team.id, participant_id=participant.id, status=constants.APPLIED_STATUS)
         self.assertEqual(expected, result)
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.PENDING_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             'id': 3,
@@ -365,6 +491,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 2,
+                'pending_count': 0,
             },
             'role': constants.MEMBER_ROLE,
             'status': constants.DECLINED_STATUS,
@@ -390,7 +518,7 @@ class TestTeamServices(TestCase):
     def test_change_team_participation_service_should_return_result_with_error_when_user_is_not_team_leader(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(
             data=None, error=exceptions.UserIsNotTeamLeaderException)
@@ -401,7 +529,7 @@ class TestTeamServices(TestCase):
     def test_change_team_participation_service_should_return_result_with_error_when_status_is_invalid(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(
             data=None, error=exceptions.InvalidParticipantStatusException)
@@ -412,19 +540,177 @@ class TestTeamServices(TestCase):
     def test_change_team_participation_service_should_return_result_with_error_when_status_is_already_set(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(
             data=None, error=exceptions.ParticipantAlreadyHasStatusException)
         result = services.change_team_participation_request_status_service(
             uow=self.uow, username=self.user.username, team_id=team.id, participant_id=participant.id, status=constants.APPLIED_STATUS)
         self.assertEqual(expected, result)
+
+    def test_bulk_change_team_participation_service_should_return_result_for_each_participant(self):
+        team = self.create_team()
+        applied = self.create_participant(
+            user=self.uow.user.create(username="applied"), team=team, status=constants.PENDING_STATUS, role=constants.MEMBER_ROLE)
+        declined = self.create_participant(
+            user=self.uow.user.create(username="declined"), team=team, status=constants.PENDING_STATUS, role=constants.MEMBER_ROLE)
+        already_applied = self.create_participant(
+            user=self.uow.user.create(username="already_applied"), team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
+        another_team = self.create_team(name='another_team')
+        stranger = self.create_participant(
+            user=self.uow.user.create(username="stranger"), team=another_team, status=constants.PENDING_STATUS, role=constants.MEMBER_ROLE)
+        result = services.bulk_change_team_participation_request_status_service(
+            uow=self.uow, username=self.user.username, team_id=team.id, changes=[
+                {'participant_id': applied.id, 'status': constants.APPLIED_STATUS},
+                {'participant_id': declined.id, 'status': constants.DECLINED_STATUS},
+                {'participant_id': already_applied.id, 'status': constants.APPLIED_STATUS},
+                {'participant_id': stranger.id, 'status': constants.APPLIED_STATUS},
+                {'participant_id': declined.id, 'status': 'invalid_status'},
+                {'participant_id': True, 'status': constants.KICKED_STATUS},
+                {'participant_id': False, 'status': constants.KICKED_STATUS},
+            ])
+        self.assertIsNone(result.error)
+        self.assertEqual([item['participant_id'] for item in result.data], [
+            applied.id, declined.id, already_applied.id, stranger.id, declined.id, True, False])
+        self.assertEqual(result.data[0]['data']['status'], constants.APPLIED_STATUS)
+        self.assertEqual(result.data[1]['data']['status'], constants.DECLINED_STATUS)
+        self.assertEqual([item['error'] for item in result.data], [
+            None,
+            None,
+            exceptions.PARTICIPANT_ALREADY_HAS_STATUS_EXCEPTION_MESSAGE,
+            exceptions.PARTICIPANT_NOT_FOUND_EXCEPTION_MESSAGE,
+            exceptions.INVALID_PARTICIPANT_STATUS_EXCEPTION_MESSAGE,
+            exceptions.PARTICIPANT_NOT_FOUND_EXCEPTION_MESSAGE,
+            exceptions.PARTICIPANT_NOT_FOUND_EXCEPTION_MESSAGE,
+        ])
+        # true не превратился в id 1 - участие лидера не изменилось
+        self.assertEqual(self.uow.participant.get(id=1).status, constants.APPLIED_STATUS)
+        self.assertEqual(self.uow.participant.get(id=applied.id).status, constants.APPLIED_STATUS)
+        self.assertEqual(self.uow.participant.get(id=declined.id).status, constants.DECLINED_STATUS)
+        self.assertEqual(self.uow.participant.get(id=stranger.id).status, constants.PENDING_STATUS)
+
+    def test_bulk_change_team_participation_service_should_return_result_with_error_when_user_is_not_team_leader(self):
+        team = self.create_team()
+        another_user = self.uow.user.create(username="another_user")
+        participant = self.create_participant(
+            user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
+        expected = Result(
+            data=None, error=exceptions.UserIsNotTeamLeaderException)
+        result = services.bulk_change_team_participation_request_status_service(
+            uow=self.uow, username=another_user.username, team_id=team.id,
+            changes=[{'participant_id': participant.id, 'status': constants.KICKED_STATUS}])
+        self.assertEqual(expected, result)
+
+    def test_bulk_change_team_participation_service_should_return_result_with_error_when_data_is_invalid(self):
+        team = self.create_team()
+        expected = Result(
+            data=None, error=exceptions.InvalidParticipantsDataException)
+        for changes in ([], {'participant_id': 1}, ['invalid']):
+            result = services.bulk_change_team_participation_request_status_service(
+                uow=self.uow, username=self.user.username, team_id=team.id, changes=changes)
+            self.assertEqual(expected, result)
+    # Counters
+    def test_participation_services_should_maintain_team_and_event_counters(self):
+        team = self.create_team()
+        users = [self.uow.user.create(username=f'user_{i}') for i in range(3)]
+        participants = [services.join_team_request_service(
+            uow=self.uow, username=user.username, team_id=team.id).data for user in users]
+        self.assertEqual((team.applied_count, team.pending_count), (1, 3))
+        services.bulk_change_team_participation_request_status_service(
+            uow=self.uow, username=self.user.username, team_id=team.id, changes=[
+                {'participant_id': participants[0]['id'], 'status': constants.APPLIED_STATUS},
+                {'participant_id': participants[1]['id'], 'status': constants.APPLIED_STATUS},
+                {'participant_id': participants[2]['id'], 'status': constants.DECLINED_STATUS},
+            ])
+        self.assertEqual((team.applied_count, team.pending_count), (3, 0))
+        self.assertEqual((self.event.team_count, self.event.participant_count), (1, 3))
+        services.kick_team_participant_service(
+            uow=self.uow, username=self.user.username, team_id=team.id, participant_id=participants[0]['id'])
+        services.leave_team_service(
+            uow=self.uow, username=users[1].username, team_id=team.id)
+        self.assertEqual((team.applied_count, team.pending_count), (1, 0))
+        self.assertEqual((self.event.team_count, self.event.participant_count), (1, 1))
+        services.deactivate_team_service(
+            uow=self.uow, username=self.user.username, team_id=team.id)
+        self.assertEqual((self.event.team_count, self.event.participant_count), (0, 0))
+
+    def test_edit_team_service_should_move_event_counters_when_is_active_changes(self):
+        team = self.create_team()
+        self.create_participant(self.uow.user.create(username='member'), team, constants.APPLIED_STATUS)
+        result = services.edit_team_service(
+            uow=self.uow, username=self.user.username, team_id=team.id, name='test_team', is_active=False,
+            applied_count=100)
+        self.assertEqual((result.data['is_active'], result.data['applied_count']), (False, 2))
+        self.assertEqual((self.event.team_count, self.event.participant_count), (0, 0))
+        services.edit_team_service(
+            uow=self.uow, username=self.user.username, team_id=team.id, name='test_team', is_active='true')
+        self.assertEqual((self.event.team_count, self.event.participant_count), (1, 2))
+
+    def test_change_team_participation_service_should_not_change_participant_of_another_team(self):
+        team = self.create_team()
+        another_user = self.uow.user.create(username='another_user')
+        another_team = self.create_team(name='another_team', user=another_user)
+        participant = self.create_participant(
+            self.uow.user.create(username='member'), another_team, constants.PENDING_STATUS)
+        result = services.change_team_participation_request_status_service(
+            uow=self.uow, username=self.user.username, team_id=team.id,
+            participant_id=participant.id, status=constants.APPLIED_STATUS)
+        self.assertEqual(Result(data=None, error=exceptions.ParticipantNotFoundException), result)
+        self.assertEqual(participant.status, constants.PENDING_STATUS)
+        self.assertEqual((team.applied_count, team.pending_count), (1, 0))
+        self.assertEqual((another_team.applied_count, another_team.pending_count), (1, 1))
+
+    # Roster
+    def test_export_event_roster_service_should_return_applied_participants_as_ndjson(self):
+        team = self.create_team()
+        another_user = self.uow.user.create(username="another_user")
+        self.create_participant(another_user, team, constants.APPLIED_STATUS)
+        self.create_participant(self.uow.user.create(username="pending_user"), team, constants.PENDING_STATUS)
+        result = services.export_event_roster_service(
+            uow=self.uow, username=self.user.username, event_id=self.event.id)
+        rows = [json.loads(line) for line in ''.join(result.data).splitlines()]
+        self.assertEqual(result.error, None)
+        self.assertEqual([row['username'] for row in rows], [self.user.username, another_user.username])
+        self.assertEqual(rows[0]['team_name'], team.name)
+        self.assertEqual(rows[0]['role'], constants.LEADER_ROLE)
+
+    def test_export_event_roster_service_should_return_csv_with_header(self):
+        self.create_team()
+        result = services.export_event_roster_service(
+            uow=self.uow, username=self.user.username, event_id=self.event.id, format=constants.CSV_FORMAT)
+        lines = ''.join(result.data).splitlines()
+        self.assertEqual(lines[0], ','.join(roster.ROSTER_FIELDS))
+        self.assertEqual(len(lines), 2)
+
+    def test_export_event_roster_service_should_return_result_with_error_when_event_is_not_found(self):
+        expected = Result(data=None, error=exceptions.EventNotFoundException)
+        result = services.export_event_roster_service(
+            uow=self.uow, username=self.user.username, event_id=999)
+        self.assertEqual(expected, result)
+
+    def test_export_event_roster_service_should_return_result_with_error_when_user_is_not_event_author(self):
+        self.create_team()
+        another_user = self.uow.user.create(username="another_user")
+        expected = Result(data=None, error=exceptions.UserIsNotEventAuthorException)
+        result = services.export_event_roster_service(
+            uow=self.uow, username=another_user.username, event_id=self.event.id)
+        self.assertEqual(expected, result)
+        result = services.export_event_roster_service(
+            uow=self.uow, username=another_user.username, event_id=self.event.id, is_staff=True)
+        self.assertIsNone(result.error)
+
+    def test_export_event_roster_service_should_return_result_with_error_when_format_is_invalid(self):
+        expected = Result(data=None, error=exceptions.InvalidResponseFormatException)
+        result = services.export_event_roster_service(
+            uow=self.uow, username=self.user.username, event_id=self.event.id, format='xml')
+        self.assertEqual(expected, result)
+
     # Kick
 
     def test_kick_team_participant_service_should_return_result_with_kicked_participant(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             'id': 2,
@@ -435,6 +721,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 1,
+                'pending_count': 0,
             },
             'role': constants.MEMBER_ROLE,
             'status': constants.KICKED_STATUS,
@@ -460,7 +748,7 @@ class TestTeamServices(TestCase):
     def test_kick_team_participant_service_should_return_result_with_error_when_user_is_not_team_leader(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        participant = self.uow.participant.create(
+        participant = self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(
             data=None, error=exceptions.UserIsNotTeamLeaderException)
@@ -472,7 +760,7 @@ class TestTeamServices(TestCase):
     def test_leave_team_service_should_return_result_with_left_participant(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        self.uow.participant.create(
+        self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             'id': 2,
@@ -483,6 +771,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 1,
+                'pending_count': 0,
             },
             'role': constants.MEMBER_ROLE,
             'status': constants.LEFT_STATUS,
@@ -504,6 +794,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': False,
+                'applied_count': 0,
+                'pending_count': 0,
             },
             'role': constants.LEADER_ROLE,
             'status': constants.LEFT_STATUS,
@@ -517,7 +809,7 @@ class TestTeamServices(TestCase):
     def test_leave_team_service_should_return_result_with_left_participant_and_set_another_participant_to_leader(self):
         team = self.create_team()
         another_user = self.uow.user.create(username="another_user")
-        self.uow.participant.create(
+        self.create_participant(
             user=another_user, team=team, status=constants.APPLIED_STATUS, role=constants.MEMBER_ROLE)
         expected = Result(data={
             'id': 1,
@@ -528,6 +820,8 @@ class TestTeamServices(TestCase):
                 "image": 'test_image',
                 'event': self.event,
                 'is_active': True,
+                'applied_count': 1,
+                'pending_count': 0,
             },
             'role': constants.LEADER_ROLE,
             'status': constants.LEFT_STATUS,
@@ -1,10 +1,17 @@
+import io
 import shutil
+import threading
+from django.db import connection
 from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 
 import service_layer.unit_of_work as uow
+import service_layer.services as services
 import app.models as models
 import core.constants as constants
+import core.exceptions as exceptions
 
 TEST_DIR = 'test_data'
 
@@ -18,6 +25,29 @@ def create_event(name='test_event'):
     return models.Event.objects.create(name=name)
 
 
+class BarrierUnitOfWork(uow.DjangoORMUnitOfWork):
+    '''
+    Unit of work, в котором метод записи repository.method ждет второй запрос на
+    barrier: оба запроса успевают прочитать состояние до того, как кто-то запишет
+    '''
+
+    def __init__(self, barrier: threading.Barrier, repository: str, method: str):
+        self._barrier = barrier
+        self._repository = repository
+        self._method = method
+
+    def __enter__(self):
+        super().__enter__()
+        repository = getattr(self, self._repository)
+        write = getattr(repository, self._method)
+
+        def wait_and_write(*args, **kwargs):
+            self._barrier.wait(timeout=5)
+            return write(*args, **kwargs)
+        setattr(repository, self._method, wait_and_write)
+        return self
+
+
 @override_settings(MEDIA_ROOT=(TEST_DIR + '/media'))
 class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
     def setUp(self) -> None:
@@ -62,6 +92,16 @@ class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
             self.assertEqual(models.Team.objects.count(), 1)
             self.assertEqual(updated_team.name, 'updated_test_team')
 
+    def test_team_repository_edit_should_not_overwrite_counters(self):
+        with self.uow:
+            team = self.uow.team.create(name='test_team', event=self.event)
+            with CaptureQueriesContext(connection) as queries:
+                self.uow.team.edit(id=team.id, name='updated_test_team')
+            updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+            self.assertEqual(len(updates), 1)
+            self.assertNotIn('applied_count', updates[0])
+            self.assertNotIn('pending_count', updates[0])
+
     def test_team_repository_deactivate_should_deactivate_team(self):
         with self.uow:
             image = SimpleUploadedFile(
@@ -125,14 +165,15 @@ class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
             self.assertEqual(participant.status,
                              constants.PENDING_STATUS)
 
+            another_user = create_user(username='another_user')
             participant = self.uow.participant.create(
-                user=self.user,
+                user=another_user,
                 team=team,
                 role=constants.LEADER_ROLE,
                 status=constants.APPLIED_STATUS,
             )
             self.assertEqual(models.Participant.objects.count(), 2)
-            self.assertEqual(participant.user, self.user)
+            self.assertEqual(participant.user, another_user)
             self.assertEqual(participant.team, team)
             self.assertEqual(participant.role, constants.LEADER_ROLE)
             self.assertEqual(participant.status,
@@ -167,14 +208,14 @@ class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
                 image=image,
                 event=self.event,
             )
-            for _ in range(3):
+            for i in range(3):
                 self.uow.participant.create(
-                    user=self.user,
+                    user=create_user(username=f'applied_{i}'),
                     team=team,
                     status=constants.APPLIED_STATUS
                 )
                 self.uow.participant.create(
-                    user=self.user,
+                    user=create_user(username=f'kicked_{i}'),
                     team=team,
                     status=constants.KICKED_STATUS,
                 )
@@ -183,9 +224,9 @@ class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
                 image=image,
                 event=self.event,
             )
-            for _ in range(7):
+            for i in range(7):
                 self.uow.participant.create(
-                    user=self.user,
+                    user=create_user(username=f'another_kicked_{i}'),
                     team=another_team,
                     status=constants.KICKED_STATUS,
                 )
@@ -214,3 +255,205 @@ class TestDjangoORMUnitOfWorkTeam(TransactionTestCase):
             self.assertEqual(participant.role, constants.MEMBER_ROLE)
             self.assertEqual(participant.status,
                              constants.PENDING_STATUS)
+
+    def test_participant_repository_should_list_participants_of_several_teams(self):
+        with self.uow:
+            teams = [self.uow.team.create(name=f'test_team_{i}', event=self.event)
+                     for i in range(3)]
+            for team in teams:
+                self.uow.participant.create(
+                    user=self.user, team=team, status=constants.APPLIED_STATUS)
+                self.uow.participant.create(
+                    user=create_user(username=f'member_{team.id}'), team=team, status=constants.PENDING_STATUS)
+            result = self.uow.participant.list_by_teams(
+                teams[:2], status=constants.APPLIED_STATUS)
+            self.assertEqual([participant.team for participant in result], teams[:2])
+
+    def test_participant_repository_create_if_not_exists_should_not_duplicate_participant(self):
+        with self.uow:
+            team = self.uow.team.create(name='test_team', event=self.event)
+            with self.assertNumQueries(1):
+                participant = self.uow.participant.create_if_not_exists(
+                    user=self.user, team=team, status=constants.PENDING_STATUS)
+            self.assertEqual(participant, models.Participant.objects.get())
+            self.assertEqual(participant.role, constants.MEMBER_ROLE)
+            with self.assertNumQueries(1):
+                duplicate = self.uow.participant.create_if_not_exists(
+                    user=self.user, team=team, status=constants.APPLIED_STATUS)
+            self.assertIsNone(duplicate)
+            self.assertEqual(models.Participant.objects.get().status, constants.PENDING_STATUS)
+
+    def test_participant_repository_should_edit_statuses_of_several_participants(self):
+        with self.uow:
+            team = self.uow.team.create(name='test_team', event=self.event)
+            participants = [self.uow.participant.create(
+                user=create_user(username=f'member_{i}'), team=team) for i in range(3)]
+            with self.assertNumQueries(1):
+                updated = self.uow.participant.bulk_edit_status({
+                    participants[0].id: constants.APPLIED_STATUS,
+                    participants[1].id: constants.DECLINED_STATUS,
+                    participants[2].id: constants.DECLINED_STATUS,
+                }, {
+                    participants[0].id: constants.PENDING_STATUS,
+                    participants[1].id: constants.PENDING_STATUS,
+                    # Статус уже изменил другой запрос - участник не меняется
+                    participants[2].id: constants.APPLIED_STATUS,
+                })
+            self.assertEqual(updated, {participants[0].id, participants[1].id})
+            self.assertEqual([participant.status for participant in self.uow.participant.list(team=team).order_by('id')], [
+                constants.APPLIED_STATUS, constants.DECLINED_STATUS, constants.PENDING_STATUS])
+
+    def test_team_repository_get_access_context_should_load_team_and_participation(self):
+        team = models.Team.objects.create(name='test_team', event=self.event)
+        models.Participant.objects.create(
+            user=self.user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+        with self.uow:
+            with self.assertNumQueries(1):
+                access = self.uow.team.get_access_context(
+                    team_id=team.id, username=self.user.username)
+                self.assertEqual(access.team.event.name, self.event.name)
+                self.assertEqual(access.user.username, self.user.username)
+                self.assertEqual(access.user.user.email, self.user.user.email)
+                self.assertTrue(access.is_leader)
+                self.assertTrue(access.is_applied)
+                # Участник загружен целиком, а не собран из части колонок
+                for instance in (access.participant, access.user, access.user.user):
+                    self.assertEqual(instance.get_deferred_fields(), set())
+            stranger = self.uow.team.get_access_context(
+                team_id=team.id, username='stranger')
+            self.assertEqual(stranger.team, team)
+            self.assertIsNone(stranger.participant)
+            self.assertFalse(stranger.is_leader)
+            self.assertIsNone(self.uow.team.get_access_context(
+                team_id=team.id + 1, username=self.user.username))
+
+    @override_settings(DEBUG=True)
+    def test_edit_team_service_should_run_constant_number_of_queries(self):
+        team = models.Team.objects.create(name='test_team', event=self.event)
+        models.Participant.objects.create(
+            user=self.user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+        for i in range(5):
+            models.Participant.objects.create(
+                user=create_user(username=f'member_{i}'), team=team, status=constants.APPLIED_STATUS)
+        self.uow = uow.DjangoORMUnitOfWork()
+        # 4 запроса сервиса и BEGIN/COMMIT его транзакции
+        with self.assertNumQueries(6):
+            result = services.edit_team_service(
+                uow=self.uow, username=self.user.username, team_id=team.id, name='new_name')
+        self.assertIsNone(result.error)
+        self.assertEqual(result.data['name'], 'new_name')
+        self.assertEqual(len(result.data['participants']), 6)
+
+    def test_list_team_service_should_run_constant_number_of_queries(self):
+        for i in range(10):
+            team = models.Team.objects.create(
+                name=f'test_team_{i}', event=self.event)
+            models.Participant.objects.create(
+                user=self.user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+            models.Participant.objects.create(
+                user=create_user(username=f'member_{i}'), team=team, status=constants.APPLIED_STATUS)
+        with self.assertNumQueries(5):
+            result = services.list_team_service(
+                uow=self.uow, username=self.user.username)
+        self.assertEqual(len(result.data), 10)
+        self.assertEqual(len(result.data[0]['participants']), 2)
+        self.assertEqual(
+            result.data[0]['user_participation_status'], constants.APPLIED_STATUS)
+
+    def test_repair_team_counters_should_recompute_counters(self):
+        team = models.Team.objects.create(
+            name='test_team', event=self.event, applied_count=5, pending_count=5)
+        models.Team.objects.create(name='inactive_team', event=self.event, is_active=False)
+        models.Participant.objects.create(
+            user=self.user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+        models.Participant.objects.create(
+            user=create_user(username='member'), team=team, status=constants.PENDING_STATUS)
+        out = io.StringIO()
+        call_command('repair_team_counters', stdout=out)
+        self.assertIn('1 teams and 1 events', out.getvalue())
+        team.refresh_from_db()
+        self.event.refresh_from_db()
+        self.assertEqual((team.applied_count, team.pending_count), (1, 1))
+        self.assertEqual((self.event.team_count, self.event.participant_count), (1, 1))
+        out = io.StringIO()
+        call_command('repair_team_counters', stdout=out)
+        self.assertIn('0 teams and 0 events', out.getvalue())
+
+    def test_team_queries_should_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_team_queries', participants=20000, stdout=out)
+        self.assertNotIn('sequential scan', out.getvalue())
+
+
+class TestConcurrentParticipation(TransactionTestCase):
+    def setUp(self) -> None:
+        self.leader = create_user()
+        self.event = create_event()
+        self.event.team_count, self.event.participant_count = 1, 1
+        self.event.save()
+        self.team = models.Team.objects.create(
+            name='test_team', event=self.event, applied_count=1, pending_count=1)
+        models.Participant.objects.create(
+            user=self.leader, team=self.team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
+        self.member = models.Participant.objects.create(
+            user=create_user(username='member'), team=self.team, status=constants.PENDING_STATUS)
+
+    def run_concurrently(self, repository: str, method: str, service, **kwargs) -> list:
+        barrier = threading.Barrier(2)
+        results = []
+
+        def run():
+            try:
+                results.append(service(uow=BarrierUnitOfWork(barrier, repository, method), **kwargs))
+            finally:
+                connection.close()
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertEqual(len(results), 2)
+        return results
+
+    def assert_counters(self, team, event):
+        self.team.refresh_from_db()
+        self.event.refresh_from_db()
+        self.assertEqual((self.team.applied_count, self.team.pending_count), team)
+        self.assertEqual((self.event.team_count, self.event.participant_count), event)
+
+    def test_concurrent_status_changes_should_apply_counters_once(self):
+        results = self.run_concurrently(
+            'participant', 'edit_status', services.change_team_participation_request_status_service,
+            username=self.leader.username, team_id=self.team.id, participant_id=self.member.id,
+            status=constants.APPLIED_STATUS)
+        self.assertCountEqual([result.error for result in results], [
+            None, exceptions.ParticipantStatusChangedException])
+        self.assertEqual(models.Participant.objects.get(id=self.member.id).status, constants.APPLIED_STATUS)
+        self.assert_counters(team=(2, 0), event=(1, 2))
+
+    def test_concurrent_kicks_should_apply_counters_once(self):
+        models.Participant.objects.filter(id=self.member.id).update(status=constants.APPLIED_STATUS)
+        models.Team.objects.filter(id=self.team.id).update(applied_count=2, pending_count=0)
+        models.Event.objects.filter(id=self.event.id).update(participant_count=2)
+        results = self.run_concurrently(
+            'participant', 'edit_status', services.kick_team_participant_service,
+            username=self.leader.username, team_id=self.team.id, participant_id=self.member.id)
+        self.assertCountEqual([result.error for result in results], [
+            None, exceptions.ParticipantStatusChangedException])
+        self.assert_counters(team=(1, 0), event=(1, 1))
+
+    def test_concurrent_bulk_status_changes_should_apply_counters_once(self):
+        results = self.run_concurrently(
+            'participant', 'bulk_edit_status', services.bulk_change_team_participation_request_status_service,
+            username=self.leader.username, team_id=self.team.id,
+            changes=[{'participant_id': self.member.id, 'status': constants.APPLIED_STATUS}])
+        self.assertCountEqual([result.data[0]['error'] for result in results], [
+            None, exceptions.PARTICIPANT_STATUS_CHANGED_EXCEPTION_MESSAGE])
+        self.assert_counters(team=(2, 0), event=(1, 2))
+
+    def test_concurrent_deactivations_should_apply_counters_once(self):
+        results = self.run_concurrently(
+            'team', 'deactivate', services.deactivate_team_service,
+            username=self.leader.username, team_id=self.team.id)
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assert_counters(team=(1, 1), event=(0, 0))
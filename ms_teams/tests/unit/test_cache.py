@@ -0,0 +1,81 @@
+import time
+import threading
+from django.test import SimpleTestCase, override_settings
+
+import adapters.cache as cache
+import service_layer.unit_of_work as unit_of_work
+
+
+class TestFakeCache(SimpleTestCase):
+    def setUp(self) -> None:
+        self.cache = cache.FakeCache(ttl=60, max_entries=2)
+
+    def test_get_or_set_should_build_value_once_and_return_cached_value(self):
+        calls = []
+
+        def builder():
+            calls.append(1)
+            return {'id': 1}
+        self.assertEqual(self.cache.get_or_set('key', builder), {'id': 1})
+        self.assertEqual(self.cache.get_or_set('key', builder), {'id': 1})
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_set_should_not_cache_none(self):
+        self.assertIsNone(self.cache.get_or_set('key', lambda: None))
+        self.assertEqual(self.cache.get_or_set('key', lambda: 1), 1)
+
+    def test_get_should_return_none_when_value_is_expired(self):
+        self.cache.get_or_set('key', lambda: 1, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_set_should_evict_least_recently_used_value(self):
+        self.cache.get_or_set('first', lambda: 1)
+        self.cache.get_or_set('second', lambda: 2)
+        self.cache.get('first')
+        self.cache.get_or_set('third', lambda: 3)
+        self.assertEqual(self.cache.get('first'), 1)
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(self.cache.get('third'), 3)
+
+    def test_delete_should_invalidate_value(self):
+        self.cache.get_or_set('key', lambda: 1)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_get_or_set_should_not_cache_value_invalidated_while_building(self):
+        def builder():
+            self.cache.delete('key')
+            return 'stale'
+        self.assertEqual(self.cache.get_or_set('key', builder), 'stale')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_get_or_set_should_build_value_once_for_concurrent_misses(self):
+        calls = []
+
+        def builder():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+        threads = [threading.Thread(target=self.cache.get_or_set, args=('key', builder))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+
+class TestGetCache(SimpleTestCase):
+    @override_settings(DEBUG=True)
+    def test_get_cache_should_share_one_fake_cache_between_units_of_work(self):
+        with unit_of_work.DjangoORMUnitOfWork() as first:
+            first.cache.get_or_set('key', lambda: 1)
+        with unit_of_work.DjangoORMUnitOfWork() as second:
+            self.assertIs(second.cache, first.cache)
+            self.assertEqual(second.cache.get('key'), 1)
+        cache.get_cache().delete('key')
+
+    @override_settings(DEBUG=False)
+    def test_get_cache_should_return_redis_cache_without_debug(self):
+        self.assertIsInstance(cache.get_cache(), cache.RedisCache)
@@ -0,0 +1,58 @@
+import datetime
+from django.test import SimpleTestCase
+
+import manuscript_shared.envelope as envelope
+import core.exceptions as exceptions
+
+PARTICIPANT_MESSAGE = {
+    'user': {'id': 1, 'username': 'leader', 'email': 'leader@example.com'},
+    'team': {'id': 2, 'name': 'team', 'event': {'id': 3}},
+    'to': [4, 5],
+    'action': 'kick',
+}
+
+
+class TestEnvelope(SimpleTestCase):
+    def build(self, type='TEAM_PARTICIPANT_KICKED', payload=PARTICIPANT_MESSAGE):
+        return envelope.build(type=type, payload=payload, id='message-id',
+                              timestamp=datetime.datetime(2024, 1, 1, 12, 0))
+
+    def test_build_should_keep_only_schema_fields(self):
+        message = self.build()
+        self.assertEqual(message.payload, {
+            'user': {'id': 1, 'username': 'leader'}, 'team': {'id': 2, 'name': 'team'},
+            'to': [4, 5], 'action': 'kick'})
+        self.assertEqual((message.version, message.correlation_id, message.timestamp),
+                         (1, 'message-id', '2024-01-01T12:00:00'))
+
+    def test_encode_and_decode_should_round_trip(self):
+        message = self.build()
+        for content_type in envelope.CODECS:
+            with self.subTest(content_type=content_type):
+                body = envelope.encode(message, content_type)
+                self.assertEqual(envelope.decode(body, content_type, 'ANY_ROUTING_KEY'), message)
+
+    def test_decode_should_accept_legacy_json_without_content_type(self):
+        message = envelope.decode(b'{"id": 1, "name": "event", "is_active": true}', None, 'EVENT_CREATED')
+        self.assertEqual((message.type, message.payload), ('EVENT_CREATED', {'id': 1, 'name': 'event', 'is_active': True}))
+
+    def test_build_should_keep_only_event_author_id(self):
+        message = self.build(type='EVENT_CREATED', payload={
+            'id': 1, 'name': 'event', 'is_active': True, 'location': 'Almaty',
+            'author': {'id': 3, 'username': 'author', 'email': 'author@example.com'}})
+        self.assertEqual(message.payload, {'id': 1, 'name': 'event', 'is_active': True, 'author': {'id': 3}})
+
+    def test_decode_should_reject_invalid_messages(self):
+        invalid = [
+            (b'not json', envelope.JSON_CONTENT_TYPE),
+            (b'{"id": 1}', envelope.JSON_CONTENT_TYPE),
+            (envelope.encode(self.build(payload={**PARTICIPANT_MESSAGE, 'to': 4})), envelope.JSON_CONTENT_TYPE),
+            (envelope.encode(self.build(payload={**PARTICIPANT_MESSAGE, 'user': {'id': True, 'username': 'x'}})),
+             envelope.JSON_CONTENT_TYPE),
+            (envelope.encode(self.build(type='UNKNOWN')), envelope.JSON_CONTENT_TYPE),
+            (b'{}', 'text/plain'),
+        ]
+        for body, content_type in invalid:
+            with self.subTest(body=body, content_type=content_type):
+                with self.assertRaises(exceptions.InvalidMessageException):
+                    envelope.decode(body, content_type, 'TEAM_PARTICIPANT_KICKED')
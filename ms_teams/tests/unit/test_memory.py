@@ -0,0 +1,78 @@
+from django.test import SimpleTestCase
+
+import manuscript_shared.memory as memory
+import adapters as repository
+import core.constants as constants
+
+
+class Row:
+    def __init__(self, name, status, tags=(), owner=None, id=None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.tags = list(tags)
+        self.owner = owner
+
+
+class TestInMemoryTable(SimpleTestCase):
+    def setUp(self) -> None:
+        self.table = memory.InMemoryTable(
+            indexes=('status', 'owner__name'), array_indexes=('tags',))
+        self.owner = self.table.add(Row(name='owner', status='active'))
+        self.first = self.table.add(Row(name='first', status='active', tags=['a', 'b'], owner=self.owner))
+        self.second = self.table.add(Row(name='second', status='pending', tags=['b'], owner=self.owner))
+
+    def test_add_should_assign_ids(self):
+        self.assertEqual([row.id for row in self.table], [1, 2, 3])
+
+    def test_filter_should_use_exact_in_contains_and_related_lookups(self):
+        self.assertEqual(self.table.filter(status='active'), [self.owner, self.first])
+        self.assertEqual(self.table.filter(owner__name='owner', status='pending'), [self.second])
+        self.assertEqual(self.table.filter(tags__contains='b'), [self.first, self.second])
+        self.assertEqual(self.table.filter(id__in=[3, 2, 99]), [self.first, self.second])
+        self.assertEqual(self.table.filter(name__in=['first']), [self.first])
+        self.assertEqual(self.table.filter(status='missing'), [])
+
+    def test_get_should_return_none_when_nothing_matches(self):
+        self.assertEqual(self.table.get(id=2), self.first)
+        self.assertIsNone(self.table.get(id=2, status='pending'))
+
+    def test_update_should_reindex_object(self):
+        self.table.update(self.first, status='pending', tags=['c'])
+        self.assertEqual(self.table.filter(status='pending'), [self.first, self.second])
+        self.assertEqual(self.table.filter(tags__contains='a'), [])
+        self.assertEqual(self.table.filter(tags__contains='c'), [self.first])
+
+    def test_remove_should_drop_object_from_indexes(self):
+        self.table.remove(self.second)
+        self.assertEqual(self.table.filter(tags__contains='b'), [self.first])
+        self.assertEqual(len(self.table), 2)
+
+
+class TestFakeParticipantRepository(SimpleTestCase):
+    def setUp(self) -> None:
+        self.users = repository.FakeManuscriptUserRepository()
+        self.events = repository.FakeEventRepository()
+        self.participants = repository.FakeParticipantRepository()
+        self.teams = repository.FakeTeamRepository(participants=self.participants)
+        self.user = self.users.create(username='user')
+        self.team = self.teams.create(name='team', event=self.events.create(name='event'))
+
+    def test_get_should_find_participant_by_username(self):
+        participant = self.participants.create(
+            user=self.user, team=self.team, role=constants.MEMBER_ROLE, status=constants.PENDING_STATUS)
+        self.assertEqual(self.participants.get(team=self.team, user__username='user'), participant)
+        self.assertIsNone(self.participants.get(team=self.team, user__username='another_user'))
+
+    def test_bulk_edit_status_should_keep_status_index_in_sync(self):
+        participant = self.participants.create(
+            user=self.user, team=self.team, role=constants.MEMBER_ROLE, status=constants.PENDING_STATUS)
+        self.participants.bulk_edit_status(
+            {participant.id: constants.APPLIED_STATUS}, {participant.id: constants.PENDING_STATUS})
+        self.assertEqual(self.participants.list(team=self.team, status=constants.PENDING_STATUS), [])
+        self.assertEqual(self.participants.list(team=self.team, status=constants.APPLIED_STATUS), [participant])
+
+    def test_deactivate_should_hide_team_from_active_list(self):
+        self.teams.deactivate(self.team.id)
+        self.assertEqual(self.teams.list(is_active=True), [])
+        self.assertEqual(self.teams.list(is_active=False), [self.team])
@@ -0,0 +1,199 @@
+import datetime
+import threading
+import pika
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+import manuscript_shared.envelope as envelope
+import manuscript_shared.memory_broker as memory_broker
+import service_layer.message_broker as mb
+
+
+class TestTopicMatches(SimpleTestCase):
+    def test_topic_matches_should_support_wildcards(self):
+        cases = [
+            ('EVENT_CREATED', 'EVENT_CREATED', True),
+            ('EVENT_CREATED', 'EVENT_UPDATED', False),
+            ('events.*', 'events.created', True),
+            ('events.*', 'events.created.v1', False),
+            ('events.#', 'events', True),
+            ('events.#', 'events.created.v1', True),
+            ('#.v1', 'events.created.v1', True),
+            ('*.created', 'teams.updated', False),
+        ]
+        for pattern, routing_key, expected in cases:
+            with self.subTest(pattern=pattern, routing_key=routing_key):
+                self.assertEqual(memory_broker.topic_matches(pattern, routing_key), expected)
+
+
+class TestInMemoryBroker(SimpleTestCase):
+    def setUp(self):
+        self.server = memory_broker.InMemoryServer()
+        self.broker = mb.InMemoryBroker(server=self.server, exchange='test.exchange')
+        self.broker.connect()
+        self.channel = self.broker.channel
+        self.channel.queue_declare(queue='events', durable=True)
+        self.broker.queue_bind(queue='events', routing_key='events.*')
+        self.received = []
+
+    def tearDown(self):
+        self.broker.disconnect()
+
+    def consume(self, auto_ack=False):
+        def callback(ch, method, properties, body):
+            self.received.append((method.delivery_tag, method.redelivered, body))
+        self.channel.basic_consume(queue='events', on_message_callback=callback, auto_ack=auto_ack)
+
+    def test_publish_should_route_by_binding(self):
+        for routing_key in ('events.created', 'teams.created', 'events.created.v1'):
+            self.broker.publish(routing_key=routing_key, message=routing_key)
+        self.channel.basic_publish(exchange='', routing_key='events', body=b'direct')
+        self.consume(auto_ack=True)
+        self.broker.connection.process_data_events()
+        self.assertEqual([body for _, _, body in self.received], [b'events.created', b'direct'])
+
+    def test_transaction_should_route_messages_only_after_commit(self):
+        self.broker.select_transactions()
+        self.broker.publish(routing_key='events.created', message='rolled back')
+        self.channel.tx_rollback()
+        self.broker.publish(routing_key='events.created', message='committed')
+        self.assertEqual(len(self.server.queues['events'].messages), 0)
+        self.broker.commit()
+        self.consume(auto_ack=True)
+        self.broker.connection.process_data_events()
+        self.assertEqual([body for _, _, body in self.received], [b'committed'])
+
+    def test_redrive_should_leave_dead_letters_until_commit(self):
+        self.broker.declare_retry_queues('events', delays=[])
+        self.channel.basic_publish(exchange='', routing_key='events.dlq', body=b'dead')
+        self.broker.select_transactions()
+        self.assertEqual(len(self.broker.dead_letters('events', limit=10, redrive=True)), 1)
+        self.channel.tx_rollback()
+        self.assertEqual(len(self.server.queues['events'].messages), 0)
+        self.broker.disconnect()
+        self.assertEqual(len(self.server.queues['events.dlq'].messages), 1)
+
+        self.broker.connect()
+        self.channel = self.broker.channel
+        self.broker.select_transactions()
+        self.broker.dead_letters('events', limit=10, redrive=True)
+        self.broker.commit()
+        self.assertEqual(len(self.server.queues['events'].messages), 1)
+        self.assertEqual(len(self.server.queues['events.dlq'].messages), 0)
+
+    def test_prefetch_should_limit_unacked_messages(self):
+        for i in range(3):
+            self.broker.publish(routing_key='events.created', message=str(i))
+        self.channel.basic_qos(prefetch_count=2)
+        self.consume()
+        self.broker.connection.process_data_events()
+        self.assertEqual([body for _, _, body in self.received], [b'0', b'1'])
+        self.channel.basic_ack(delivery_tag=2, multiple=True)
+        self.broker.connection.process_data_events()
+        self.assertEqual([body for _, _, body in self.received], [b'0', b'1', b'2'])
+
+    def test_nack_and_closed_channel_should_requeue_messages(self):
+        self.broker.publish(routing_key='events.created', message='1')
+        self.consume()
+        self.broker.connection.process_data_events()
+        self.channel.basic_nack(delivery_tag=1, requeue=True)
+        self.broker.connection.process_data_events()
+        self.assertEqual(self.received, [(1, False, b'1'), (2, True, b'1')])
+        self.broker.disconnect()
+
+        # Durable-очередь и неподтвержденное сообщение переживают соединение
+        self.broker.connect()
+        method, _, body = self.broker.channel.basic_get(queue='events', auto_ack=True)
+        self.assertEqual((method.redelivered, body), (True, b'1'))
+
+    def test_ack_of_unknown_delivery_tag_should_close_channel(self):
+        with self.assertRaises(pika.exceptions.ChannelClosedByBroker):
+            self.channel.basic_ack(delivery_tag=42)
+        self.assertFalse(self.channel.is_open)
+
+    def test_expired_retry_message_should_return_to_queue(self):
+        self.broker.declare_retry_queues('events', delays=[0.01])
+        self.channel.basic_publish(exchange='', routing_key=mb.retry_queue_name('events', 0.01), body=b'retry')
+        self.consume(auto_ack=True)
+        self.broker.connection.process_data_events(time_limit=0.1)
+        self.assertEqual([body for _, _, body in self.received], [b'retry'])
+
+    def test_create_broker_should_follow_settings(self):
+        with override_settings(MESSAGE_BROKER='memory'):
+            self.assertIsInstance(mb.create_broker(), mb.InMemoryBroker)
+        with override_settings(MESSAGE_BROKER='rabbitmq'):
+            self.assertNotIsInstance(mb.create_broker(), mb.InMemoryBroker)
+        with override_settings(MESSAGE_BROKER='kafka'), self.assertRaises(ImproperlyConfigured):
+            mb.create_broker()
+
+
+class TestInMemoryBrokerPipeline(TransactionTestCase):
+    def test_publisher_and_consumer_pool_should_exchange_messages_in_process(self):
+        server = memory_broker.InMemoryServer()
+        consumer = mb.InMemoryBroker(server=server)
+        consumer.connect()
+        consumer.channel.queue_declare(queue='events', durable=True)
+        consumer.queue_bind(queue='events', routing_key='EVENT_CREATED')
+        pool = mb.ConsumerPool(consumer, workers=2, batch_size=10, linger=0.01)
+        received = []
+        done = threading.Event()
+
+        def handler(messages):
+            received.extend(message.payload['id'] for message in messages)
+            if len(received) == 25:
+                done.set()
+        consumer.channel.basic_consume(queue='events', on_message_callback=pool.wrap(handler, queue='events'))
+        thread = threading.Thread(target=consumer.start_consuming)
+        thread.start()
+
+        publisher = mb.BackgroundPublisher(
+            mb.Publisher(broker_factory=lambda: mb.InMemoryBroker(server=server)), batch_size=10, linger=0)
+        futures = [publisher.publish(
+            routing_key='EVENT_CREATED', content_type=envelope.JSON_CONTENT_TYPE,
+            message=envelope.encode(envelope.build(
+                type='EVENT_CREATED', payload={'id': i, 'name': 'event', 'is_active': True},
+                id=str(i), timestamp=datetime.datetime(2024, 1, 1)))) for i in range(25)]
+        for future in futures:
+            future.result(timeout=1)
+        publisher.close(timeout=1)
+
+        self.assertTrue(done.wait(timeout=5))
+        # Подтверждения пула выполняются в потоке соединения раньше остановки
+        pool.shutdown()
+        consumer.connection.add_callback_threadsafe(consumer.channel.stop_consuming)
+        thread.join(timeout=5)
+        self.assertEqual(sorted(received), list(range(25)))
+        consumer.disconnect()
+        self.assertEqual(len(server.queues['events'].messages), 0)
+
+    def test_legacy_message_should_keep_its_type_after_retry(self):
+        server = memory_broker.InMemoryServer()
+        consumer = mb.InMemoryBroker(server=server)
+        consumer.connect()
+        consumer.channel.queue_declare(queue='events', durable=True)
+        consumer.queue_bind(queue='events', routing_key='EVENT_CREATED')
+        consumer.declare_retry_queues('events', delays=[0.01])
+        pool = mb.ConsumerPool(consumer, workers=1, batch_size=1, linger=0, retry_delays=[0.01])
+        attempts = []
+        done = threading.Event()
+
+        def handler(messages):
+            attempts.append(messages[0].payload)
+            if len(attempts) == 1:
+                raise ValueError('temporary failure')
+            done.set()
+        consumer.channel.basic_consume(queue='events', on_message_callback=pool.wrap(handler, queue='events'))
+        # Сообщение старого формата: без content_type, тип определяется ключом маршрутизации
+        consumer.publish(routing_key='EVENT_CREATED', message=b'{"id": 1, "name": "event", "is_active": true}')
+        thread = threading.Thread(target=consumer.start_consuming)
+        thread.start()
+        try:
+            handled = done.wait(timeout=5)
+        finally:
+            pool.shutdown()
+            consumer.connection.add_callback_threadsafe(consumer.channel.stop_consuming)
+            thread.join(timeout=5)
+        consumer.disconnect()
+        self.assertTrue(handled)
+        self.assertEqual(attempts, [{'id': 1, 'name': 'event', 'is_active': True}] * 2)
+        self.assertEqual(len(server.queues['events.dlq'].messages), 0)
@@ -0,0 +1,244 @@
+import datetime
+import pika
+import queue
+import threading
+from django.test import SimpleTestCase, TransactionTestCase
+from unittest.mock import MagicMock, call, patch
+
+import manuscript_shared.envelope as envelope
+import manuscript_shared.rabbitmq as rabbitmq
+import service_layer.message_broker as mb
+
+
+def event_created(id: int) -> bytes:
+    return envelope.encode(envelope.build(
+        type='EVENT_CREATED', payload={'id': id, 'name': 'event', 'is_active': True},
+        id=str(id), timestamp=datetime.datetime(2024, 1, 1)))
+
+
+class TestPublisher(SimpleTestCase):
+    def setUp(self):
+        rabbitmq._declared_exchanges.clear()
+        self.brokers = []
+        self.commit_error = None
+        self.publisher = mb.Publisher(broker_factory=self.create_broker)
+
+    def create_broker(self):
+        broker = MagicMock(host='rabbitmq', vhost='test', exchange='manuscript.services')
+        broker.commit.side_effect = self.commit_error
+        self.brokers.append(broker)
+        return broker
+
+    def test_publish_should_connect_lazily_and_reuse_connection(self):
+        self.assertEqual(self.brokers, [])
+        self.publisher.publish(routing_key='KEY', message='1')
+        self.publisher.publish(routing_key='KEY', message='2')
+        self.assertEqual(len(self.brokers), 1)
+        self.brokers[0].select_transactions.assert_called_once()
+        self.assertEqual(self.brokers[0].publish.call_count, 2)
+        self.assertEqual(self.brokers[0].commit.call_count, 2)
+
+    def test_publish_batch_should_commit_once_per_batch(self):
+        self.publisher.publish_batch([('KEY', str(i), str(i), None) for i in range(3)])
+        self.assertEqual([name for name, _, _ in self.brokers[0].method_calls if name in ('publish', 'commit')],
+                         ['publish', 'publish', 'publish', 'commit'])
+
+    def test_publish_should_reconnect_once_when_connection_is_lost(self):
+        self.publisher.publish(routing_key='KEY', message='1')
+        self.brokers[0].publish.side_effect = pika.exceptions.StreamLostError()
+        self.publisher.publish(routing_key='KEY', message='2')
+        self.assertEqual(len(self.brokers), 2)
+        self.brokers[0].disconnect.assert_called_once()
+        self.brokers[1].publish.assert_called_once_with(routing_key='KEY', message='2', message_id=None, content_type=None)
+
+    def test_publish_batch_should_be_retried_only_once(self):
+        self.commit_error = pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED')
+        with self.assertRaises(pika.exceptions.ChannelClosedByBroker):
+            self.publisher.publish_batch([('KEY', '1', '1', None), ('KEY', '2', '2', None)])
+        self.assertEqual(len(self.brokers), 2)
+        self.assertEqual([broker.publish.call_count for broker in self.brokers], [2, 2])
+
+    def test_exchange_should_be_declared_only_on_first_connection(self):
+        self.publisher.connect()
+        self.publisher.close()
+        self.publisher.connect()
+        self.assertEqual([broker.connect.call_args.kwargs for broker in self.brokers],
+                         [{'declare_exchange': True}, {'declare_exchange': False}])
+
+    def test_connection_should_not_be_reused_after_fork(self):
+        self.publisher.connect()
+        with patch('os.getpid', return_value=-1):
+            self.publisher.connect()
+        self.assertEqual(len(self.brokers), 2)
+        # Соединение родителя не закрывается из дочернего процесса
+        self.brokers[0].disconnect.assert_not_called()
+
+
+class TestBackgroundPublisher(SimpleTestCase):
+    def setUp(self):
+        self.publisher = MagicMock(heartbeat_interval=0.05)
+        self.background = mb.BackgroundPublisher(
+            publisher=self.publisher, max_queue_size=10, batch_size=3, linger=0.05)
+
+    def tearDown(self):
+        self.background.close(timeout=1)
+
+    def test_publish_should_enqueue_and_resolve_futures_in_batches(self):
+        futures = [self.background.publish(routing_key='KEY', message=str(i)) for i in range(5)]
+        self.assertTrue(self.background.flush(timeout=1))
+        self.assertEqual([future.result(timeout=1) for future in futures], [None] * 5)
+        batches = [call.args[0] for call in self.publisher.publish_batch.call_args_list]
+        self.assertEqual([message for batch in batches for _, message, _, _ in batch], ['0', '1', '2', '3', '4'])
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+        stats = self.background.stats()
+        self.assertEqual((stats['published'], stats['failed'], stats['queue_depth']), (5, 0, 0))
+        self.assertLessEqual(stats['last_batch_size'], 3)
+
+    def test_publish_should_set_exception_of_every_message_of_rejected_batch(self):
+        self.publisher.publish_batch.side_effect = pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED')
+        futures = [self.background.publish(routing_key='KEY', message=str(i)) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(pika.exceptions.ChannelClosedByBroker):
+                future.result(timeout=1)
+        self.assertEqual(self.background.stats()['failed'], 2)
+
+    def test_publish_should_raise_when_queue_is_full(self):
+        background = mb.BackgroundPublisher(publisher=self.publisher, max_queue_size=1, batch_size=1, linger=0)
+        released = threading.Event()
+        self.publisher.publish_batch.side_effect = lambda messages: released.wait(1)
+        background.publish(routing_key='KEY', message='1')
+        background.publish(routing_key='KEY', message='2', timeout=1)
+        with self.assertRaises(queue.Full):
+            background.publish(routing_key='KEY', message='3', timeout=0.01)
+        released.set()
+        background.close(timeout=1)
+
+    def test_close_should_publish_queued_messages(self):
+        future = self.background.publish(routing_key='KEY', message='1')
+        self.background.close(timeout=1)
+        self.assertIsNone(future.result(timeout=0))
+        self.publisher.close.assert_called()
+
+
+class TestConsumerPool(TransactionTestCase):
+    def setUp(self):
+        self.broker = MagicMock()
+        # Колбэки соединения выполняем сразу, как это сделал бы поток pika
+        self.broker.connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        self.pool = mb.ConsumerPool(self.broker, workers=2, batch_size=3, linger=0.05, retry_delays=[1, 10])
+        self.ch = MagicMock()
+        self.batches = []
+
+    def deliver(self, on_message, count, retry_count=None):
+        headers = {mb.RETRY_COUNT_HEADER: retry_count} if retry_count else {}
+        for tag in range(1, count + 1):
+            properties = pika.BasicProperties(
+                message_id=str(tag), headers=headers, content_type=envelope.JSON_CONTENT_TYPE)
+            on_message(self.ch, MagicMock(delivery_tag=tag), properties, event_created(tag))
+
+    def handler(self, messages):
+        self.batches.append([message.payload['id'] for message in messages])
+
+    def failing_handler(self, messages):
+        self.handler(messages)
+        if 2 in self.batches[-1]:
+            raise ValueError('broken message')
+
+    def test_full_batch_should_be_handled_and_acked(self):
+        self.deliver(self.pool.wrap(self.handler, queue='test_queue'), 3)
+        self.pool.shutdown()
+        self.assertEqual(self.batches, [[1, 2, 3]])
+        self.assertEqual([c.kwargs['delivery_tag'] for c in self.ch.basic_ack.call_args_list], [1, 2, 3])
+        self.broker.connection.remove_timeout.assert_called_once()
+
+    def test_partial_batch_should_be_handled_after_linger(self):
+        self.deliver(self.pool.wrap(self.handler, queue='test_queue'), 2)
+        self.assertEqual(self.batches, [])
+        delay, on_timeout = self.broker.connection.call_later.call_args.args
+        self.assertEqual(delay, 0.05)
+        on_timeout()
+        self.pool.shutdown()
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertEqual(self.ch.basic_ack.call_count, 2)
+
+    def test_failed_batch_should_be_retried_message_by_message(self):
+        self.deliver(self.pool.wrap(self.failing_handler, queue='test_queue'), 3)
+        self.pool.shutdown()
+        self.assertEqual(self.batches, [[1, 2, 3], [1], [2], [3]])
+        self.assertEqual([c.kwargs['delivery_tag'] for c in self.ch.basic_ack.call_args_list], [1, 2, 3])
+        # Упавшее сообщение уходит в очередь первого повтора
+        publish = self.ch.basic_publish.call_args.kwargs
+        self.assertEqual((publish['exchange'], publish['routing_key'], publish['body']), ('', 'test_queue.retry.1s', event_created(2)))
+        self.assertEqual(publish['properties'].message_id, '2')
+        self.assertEqual(publish['properties'].headers[mb.RETRY_COUNT_HEADER], 1)
+
+    def test_message_should_go_to_dead_letter_queue_after_all_retries(self):
+        self.deliver(self.pool.wrap(self.failing_handler, queue='test_queue'), 3, retry_count=2)
+        self.pool.shutdown()
+        publish = self.ch.basic_publish.call_args.kwargs
+        self.assertEqual(publish['routing_key'], 'test_queue.dlq')
+        self.assertEqual(publish['properties'].headers[mb.RETRY_COUNT_HEADER], 3)
+        self.assertIn('broken message', publish['properties'].headers[mb.LAST_ERROR_HEADER])
+
+    def test_invalid_message_should_go_to_dead_letter_queue_without_retries(self):
+        on_message = self.pool.wrap(self.handler, queue='test_queue')
+        self.deliver(on_message, 2)
+        on_message(self.ch, MagicMock(delivery_tag=3, routing_key='EVENT_CREATED'),
+                   pika.BasicProperties(message_id='3'), b'{"id": "3"}')
+        self.pool.shutdown()
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertEqual(sorted(c.kwargs['delivery_tag'] for c in self.ch.basic_ack.call_args_list), [1, 2, 3])
+        publish = self.ch.basic_publish.call_args.kwargs
+        self.assertEqual((publish['routing_key'], publish['body']), ('test_queue.dlq', b'{"id": "3"}'))
+        self.assertIn('payload.id has invalid type', publish['properties'].headers[mb.LAST_ERROR_HEADER])
+
+    def test_already_processed_messages_should_be_acked_without_handler(self):
+        seen = {'1'}
+
+        def ledger(message_ids):
+            new = set(message_ids) - seen
+            seen.update(new)
+            return new
+        pool = mb.ConsumerPool(self.broker, workers=1, batch_size=3, linger=0.05, ledger=ledger)
+        on_message = pool.wrap(self.handler, queue='test_queue')
+        for tag, message_id in enumerate(['1', '2', '2'], start=1):
+            on_message(self.ch, MagicMock(delivery_tag=tag), pika.BasicProperties(
+                message_id=message_id, content_type=envelope.JSON_CONTENT_TYPE), event_created(int(message_id)))
+        pool.shutdown()
+        self.assertEqual(self.batches, [[2]])
+        self.assertEqual([c.kwargs['delivery_tag'] for c in self.ch.basic_ack.call_args_list], [1, 2, 3])
+
+
+class TestRabbitMQ(SimpleTestCase):
+    def setUp(self):
+        self.broker = mb.RabbitMQ()
+        self.broker.channel = MagicMock()
+
+    def test_declare_retry_queues_should_dead_letter_back_to_queue(self):
+        self.broker.declare_retry_queues('test_queue', delays=[1, 0.5])
+        self.broker.channel.queue_declare.assert_has_calls([
+            call(queue='test_queue.retry.1s', durable=True, arguments={
+                'x-message-ttl': 1000, 'x-dead-letter-exchange': '', 'x-dead-letter-routing-key': 'test_queue'}),
+            call(queue='test_queue.retry.0.5s', durable=True, arguments={
+                'x-message-ttl': 500, 'x-dead-letter-exchange': '', 'x-dead-letter-routing-key': 'test_queue'}),
+            call(queue='test_queue.dlq', durable=True, arguments=None),
+        ])
+
+    def test_dead_letters_should_redrive_messages_with_reset_attempts(self):
+        properties = pika.BasicProperties(headers={mb.RETRY_COUNT_HEADER: 4, 'trace': 'x'})
+        self.broker.channel.basic_get.side_effect = [
+            (MagicMock(delivery_tag=1), properties, b'1'), (None, None, None)]
+        messages = self.broker.dead_letters('test_queue', limit=10, redrive=True)
+        self.assertEqual([message.body for message in messages], [b'1'])
+        self.broker.channel.basic_publish.assert_called_once_with(
+            exchange='', routing_key='test_queue', body=b'1', properties=properties)
+        self.assertEqual(properties.headers, {'trace': 'x'})
+        self.broker.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_dead_letters_should_leave_listed_messages_in_queue(self):
+        self.broker.channel.basic_get.side_effect = [
+            (MagicMock(delivery_tag=tag), pika.BasicProperties(), b'') for tag in (1, 2)]
+        self.assertEqual(len(self.broker.dead_letters('test_queue', limit=2)), 2)
+        self.broker.channel.basic_nack.assert_called_once_with(delivery_tag=2, multiple=True, requeue=True)
+        self.broker.channel.basic_publish.assert_not_called()
+
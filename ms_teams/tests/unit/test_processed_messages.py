@@ -0,0 +1,28 @@
+import datetime
+import uuid
+from django.test import TestCase
+from django.utils import timezone
+
+import adapters.processed_messages as processed_messages
+import app.models as models
+
+
+class TestProcessedMessages(TestCase):
+    def test_record_should_return_only_new_message_ids(self):
+        first, second = str(uuid.uuid4()), str(uuid.uuid4())
+        self.assertEqual(processed_messages.record([first]), {first})
+        self.assertEqual(processed_messages.record([first, second]), {second})
+        self.assertEqual(processed_messages.record([first, second]), set())
+
+    def test_record_should_not_store_invalid_message_ids(self):
+        self.assertEqual(processed_messages.record(['not-a-uuid']), {'not-a-uuid'})
+        self.assertEqual(models.ProcessedMessage.objects.count(), 0)
+
+    def test_prune_should_delete_old_records(self):
+        old, new = str(uuid.uuid4()), str(uuid.uuid4())
+        processed_messages.record([old, new])
+        models.ProcessedMessage.objects.filter(message_id=old).update(
+            processed_at=timezone.now() - datetime.timedelta(days=8))
+        self.assertEqual(processed_messages.prune(datetime.timedelta(days=7)), 1)
+        self.assertEqual([str(message_id) for message_id in models.ProcessedMessage.objects.values_list(
+            'message_id', flat=True)], [new])
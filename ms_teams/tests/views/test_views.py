@@ -1,9 +1,13 @@
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
 from django.test import TransactionTestCase, override_settings
 from rest_framework.test import APIClient as Client
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 import service_layer.unit_of_work as uow
+import service_layer.services as services
 import core.exceptions as exceptions
 import core.constants as constants
 import shutil
@@ -24,12 +28,13 @@ def create_user(username="test@gmail.com", password="testpassword", first_name="
         return user
 
 
-def create_event(name="test_event", location='Almaty', tags=['test_tag1', 'test_tag2'], is_active=True):
+def create_event(name="test_event", location='Almaty', tags=['test_tag1', 'test_tag2'], is_active=True, author=None):
     django_uow = uow.DjangoORMUnitOfWork()
     with django_uow:
         data = {
             "name": name,
-            "is_active": is_active
+            "is_active": is_active,
+            "author": author,
         }
         event = django_uow.event.create(**data)
         return event
@@ -39,8 +44,10 @@ def create_team(user, event, name='test_team',  is_active=True):
     django_uow = uow.DjangoORMUnitOfWork()
     with django_uow:
         team = django_uow.team.create(
-            name=name, event=event, is_active=is_active)
+            name=name, event=event, is_active=is_active, applied_count=1)
         team.save()
+        if is_active:
+            django_uow.event.adjust_counters(event, team_count=1, participant_count=1)
         django_uow.participant.create(
             user=user, team=team, role=constants.LEADER_ROLE, status=constants.APPLIED_STATUS)
         return team
@@ -51,9 +58,16 @@ def create_participation(user, team, role=constants.MEMBER_ROLE, status=constant
     with django_uow:
         participation = django_uow.participant.create(
             user=user, team=team, role=role, status=status)
+        services.update_participant_counters(django_uow, team, [(None, status)])
         return participation
 
 
+def get_team(team_id):
+    django_uow = uow.DjangoORMUnitOfWork()
+    with django_uow:
+        return django_uow.team.get(id=team_id)
+
+
 @override_settings(MEDIA_ROOT=(TEST_DIR + '/media'), DEBUG=True)
 class TestTeamManagement(TransactionTestCase):
     reset_sequences = True
@@ -172,6 +186,43 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(
             content['error'], None)
 
+    def test_teams_get_should_paginate_teams_by_cursor(self):
+        team_ids = [create_team(user=self.user, event=self.event).id
+                    for _ in range(5)]
+        response = self.client.get("/teams/?limit=2")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        received = [team['id'] for team in content['data']['results']]
+        while content['data']['next_cursor']:
+            response = self.client.get(
+                f"/teams/?limit=2&cursor={content['data']['next_cursor']}")
+            content = json.loads(response.content)
+            received += [team['id'] for team in content['data']['results']]
+        self.assertEqual(received, team_ids)
+
+    def test_teams_get_should_return_normalized_teams(self):
+        teams = [create_team(user=self.user, event=self.event) for _ in range(3)]
+        response = self.client.get("/teams/?format=normalized&limit=2")
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual(content['data']['results'], [teams[0].id, teams[1].id])
+        self.assertIsNotNone(content['data']['next_cursor'])
+        self.assertEqual(list(content['data']['events']), [str(self.event.id)])
+        self.assertEqual(content['data']['users'], {
+            str(self.user.id): self.user.to_dict()})
+        team = content['data']['teams'][str(teams[0].id)]
+        self.assertEqual(team['event'], self.event.id)
+        participant = content['data']['participants'][str(team['participants'][0])]
+        self.assertEqual(participant['user'], self.user.id)
+        self.assertEqual(participant['team'], teams[0].id)
+
+    def test_teams_get_should_return_error_when_cursor_is_invalid(self):
+        response = self.client.get("/teams/?limit=2&cursor=invalid")
+        self.assertEqual(response.status_code, 400)
+        content = json.loads(response.content)
+        self.assertEqual(
+            content['error'], exceptions.INVALID_PAGINATION_PARAMS_EXCEPTION_MESSAGE)
+
     # Edit
     def test_team_put_should_edit_team_and_return_team_data(self):
         team = create_team(user=self.user, event=self.event)
@@ -184,7 +235,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['name'], 'test_team updated')
-        self.assertEqual(content['data']['event'], self.event.to_dict())
+        self.assertEqual(content['data']['event'], get_team(team.id).event.to_dict())
         self.assertEqual(content['data']['is_active'], True)
 
     def test_team_put_should_return_error_when_team_is_not_found(self):
@@ -235,7 +286,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['name'], 'test_team')
-        self.assertEqual(content['data']['event'], self.event.to_dict())
+        self.assertEqual(content['data']['event'], get_team(team.id).event.to_dict())
         self.assertEqual(content['data']['is_active'], False)
 
     def test_team_delete_should_return_error_when_team_is_not_found(self):
@@ -276,7 +327,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 201)
         content = response.data
         self.assertEqual(content['data']['user'], another_user.to_dict())
-        self.assertEqual(content['data']['team'], team.to_dict())
+        self.assertEqual(content['data']['team'], get_team(team.id).to_dict())
         self.assertEqual(content['data']['role'], constants.MEMBER_ROLE)
         self.assertEqual(content['data']['status'], constants.PENDING_STATUS)
 
@@ -295,7 +346,6 @@ class TestTeamManagement(TransactionTestCase):
 
     def test_team_participants_post_should_return_error_when_user_already_has_participation(self):
         team = create_team(user=self.user, event=self.event)
-        create_participation(user=self.user, team=team)
         body = {
             "user": self.user.id,
         }
@@ -307,6 +357,31 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(
             content['error'], exceptions.USER_ALREADY_HAS_PARTICIPATION_EXCEPTION_MESSAGE)
 
+    def test_team_participants_post_should_create_single_participation_under_concurrent_requests(self):
+        team = create_team(user=self.user, event=self.event)
+        another_user = create_user(username='another_user')
+        token = another_user.generate_jwt_token()
+        threads = 16
+        barrier = threading.Barrier(threads)
+
+        def join():
+            try:
+                barrier.wait()
+                response = Client().post(
+                    f"/teams/{team.id}/participants", **{"HTTP_AUTHORIZATION": f"Bearer {token}"})
+                return response.status_code, response.data['error']
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = [future.result() for future in [executor.submit(join) for _ in range(threads)]]
+        self.assertEqual(sorted(results), [(201, None)] + [
+            (400, exceptions.USER_ALREADY_HAS_PARTICIPATION_EXCEPTION_MESSAGE)] * (threads - 1))
+        django_uow = uow.DjangoORMUnitOfWork()
+        with django_uow:
+            self.assertEqual(
+                len(django_uow.participant.list(user=another_user, team=team)), 1)
+
     def test_team_participants_post_should_return_error_when_user_is_anonymous(self):
         team = create_team(user=self.user, event=self.event)
         another_user = create_user(username='another_user')
@@ -329,7 +404,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['user'], another_user.to_dict())
-        self.assertEqual(content['data']['team'], team.to_dict())
+        self.assertEqual(content['data']['team'], get_team(team.id).to_dict())
         self.assertEqual(content['data']['role'], constants.MEMBER_ROLE)
         self.assertEqual(content['data']['status'], constants.LEFT_STATUS)
 
@@ -365,6 +440,39 @@ class TestTeamManagement(TransactionTestCase):
 
     # Apply/Decline
 
+    def test_team_participants_put_should_return_result_for_each_participant(self):
+        team = create_team(user=self.user, event=self.event)
+        applied = create_participation(
+            user=create_user(username='applied_user'), team=team)
+        declined = create_participation(
+            user=create_user(username='declined_user'), team=team)
+        body = [
+            {"participant_id": applied.id, "status": constants.APPLIED_STATUS},
+            {"participant_id": declined.id, "status": constants.DECLINED_STATUS},
+            {"participant_id": 999, "status": constants.APPLIED_STATUS},
+        ]
+        token = self.user.generate_jwt_token()
+        response = self.client.put(
+            f"/teams/{team.id}/participants", **{"HTTP_AUTHORIZATION": f"Bearer {token}"}, data=body, format='json')
+        self.assertEqual(response.status_code, 200)
+        content = response.data
+        self.assertEqual(content['data'][0]['data']['status'], constants.APPLIED_STATUS)
+        self.assertEqual(content['data'][1]['data']['status'], constants.DECLINED_STATUS)
+        self.assertEqual(content['data'][2]['error'],
+                         exceptions.PARTICIPANT_NOT_FOUND_EXCEPTION_MESSAGE)
+
+    def test_team_participants_put_should_return_error_when_user_is_not_team_leader(self):
+        team = create_team(user=self.user, event=self.event)
+        another_user = create_user(username='another_user')
+        participation = create_participation(user=another_user, team=team)
+        body = [{"participant_id": participation.id, "status": constants.APPLIED_STATUS}]
+        token = another_user.generate_jwt_token()
+        response = self.client.put(
+            f"/teams/{team.id}/participants", **{"HTTP_AUTHORIZATION": f"Bearer {token}"}, data=body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'],
+                         exceptions.USER_IS_NOT_TEAM_LEADER_EXCEPTION_MESSAGE)
+
     def test_team_participant_put_should_return_participant_with_corresponding_status(self):
         team = create_team(user=self.user, event=self.event)
         another_user = create_user(username='another_user')
@@ -378,7 +486,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['user'], another_user.to_dict())
-        self.assertEqual(content['data']['team'], team.to_dict())
+        self.assertEqual(content['data']['team'], get_team(team.id).to_dict())
         self.assertEqual(content['data']['role'], constants.MEMBER_ROLE)
         self.assertEqual(content['data']['status'], constants.APPLIED_STATUS)
         another_user = create_user(username='another_user 2')
@@ -392,7 +500,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['user'], another_user.to_dict())
-        self.assertEqual(content['data']['team'], team.to_dict())
+        self.assertEqual(content['data']['team'], get_team(team.id).to_dict())
         self.assertEqual(content['data']['role'], constants.MEMBER_ROLE)
         self.assertEqual(content['data']['status'], constants.DECLINED_STATUS)
 
@@ -495,7 +603,7 @@ class TestTeamManagement(TransactionTestCase):
         self.assertEqual(response.status_code, 200)
         content = response.data
         self.assertEqual(content['data']['user'], another_user.to_dict())
-        self.assertEqual(content['data']['team'], team.to_dict())
+        self.assertEqual(content['data']['team'], get_team(team.id).to_dict())
         self.assertEqual(content['data']['role'], constants.MEMBER_ROLE)
         self.assertEqual(content['data']['status'], constants.KICKED_STATUS)
 
@@ -546,3 +654,58 @@ class TestTeamManagement(TransactionTestCase):
         response = self.client.delete(
             f"/teams/{team.id}/participants/{participation.id}")
         self.assertEqual(response.status_code, 403)
+
+
+@override_settings(DEBUG=True)
+class TestEventRoster(TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = create_user()
+        self.event = create_event(author=self.user)
+        self.team = create_team(user=self.user, event=self.event)
+        self.another_user = create_user(username='another_user')
+        create_participation(user=self.another_user, team=self.team,
+                             status=constants.APPLIED_STATUS)
+        create_participation(user=create_user(username='pending_user'), team=self.team)
+
+    def test_event_roster_get_should_stream_ndjson(self):
+        token = self.user.generate_jwt_token()
+        response = self.client.get(
+            f"/events/{self.event.id}/roster", **{"HTTP_AUTHORIZATION": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows],
+                         [self.user.username, self.another_user.username])
+        self.assertEqual(rows[0]['team_id'], self.team.id)
+
+    def test_event_roster_get_should_stream_csv(self):
+        token = self.user.generate_jwt_token()
+        response = self.client.get(
+            f"/events/{self.event.id}/roster?format=csv", **{"HTTP_AUTHORIZATION": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn(f'event_{self.event.id}_roster.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_event_roster_get_should_return_error_when_event_is_not_found(self):
+        token = self.user.generate_jwt_token()
+        response = self.client.get(
+            "/events/999/roster", **{"HTTP_AUTHORIZATION": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], exceptions.EVENT_NOT_FOUND_EXCEPTION_MESSAGE)
+
+    def test_event_roster_get_should_return_error_when_user_is_not_event_author(self):
+        token = self.another_user.generate_jwt_token()
+        response = self.client.get(
+            f"/events/{self.event.id}/roster", **{"HTTP_AUTHORIZATION": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['error'], exceptions.USER_IS_NOT_EVENT_AUTHOR_EXCEPTION_MESSAGE)
+
+    def test_event_roster_get_should_return_error_when_user_is_anonymous(self):
+        response = self.client.get(f"/events/{self.event.id}/roster")
+        self.assertEqual(response.status_code, 403)
@@ -1,92 +1,43 @@
-
-
-import pika
-from abc import ABC, abstractmethod
+'''
+Брокер сообщений бота: классы manuscript_shared.rabbitmq и manuscript_shared.consumer
+с параметрами из app.yaml
+'''
+import yaml
+from pika.adapters.asyncio_connection import AsyncioConnection
+import manuscript_shared.rabbitmq as rabbitmq
+import manuscript_shared.consumer as consumer
+# Имена, которые использует обработчик бота
+from manuscript_shared.rabbitmq import Message, original_routing_key
 
 with open('app.yaml') as f:
-    import yaml
     settings = yaml.safe_load(f)
 
 
-class AbstractMessageBroker(ABC):
-    @abstractmethod
-    def connect(self):
-        pass
-
-    @abstractmethod
-    def publish(self, exchange, routing_key, message):
-        pass
-
-    @abstractmethod
-    def subscribe(self, exchange, queue, callback, routing_key):
-        pass
-
-    @abstractmethod
-    def disconnect(self):
-        pass
-
-
-class RabbitMQ(AbstractMessageBroker):
+class RabbitMQ(rabbitmq.RabbitMQ):
 
     def __init__(self, host: str = settings["RABBITMQ_HOST"], port: str = settings["RABBITMQ_PORT"], username: str = settings["RABBITMQ_USER"],
-                 password: str = settings["RABBITMQ_PASSWORD"], exchange: str = settings["RABBITMQ_EXCHANGE_NAME"], vhost=settings["RABBITMQ_VHOST"], exchange_type='topic'):
-        self.host = host
-        self.port = port
-        self.username = username
-        self.password = password
-        self.exchange = exchange
-
-        self.vhost = vhost
-
-        self.connection = None
-        self.channel = None
-
-        self.exchange_type = exchange_type
-
-    def __enter__(self):
-        self.connect()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.disconnect()
-
-    def connect(self):
-        credentials = pika.credentials.PlainCredentials(
-            self.username, self.password)
-        parameters = pika.ConnectionParameters(
-            host=self.host, port=self.port, credentials=credentials, virtual_host=self.vhost)
-        if self.vhost == 'test':
-            parameters = pika.ConnectionParameters(
-                host=self.host, port=self.port, credentials=credentials)
-        self.connection = pika.BlockingConnection(parameters)
-        self.channel = self.connection.channel()
-        self.channel.exchange_declare(
-            exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
-
-    def publish(self, routing_key, message):
-        self.channel.basic_publish(
-            exchange=self.exchange, routing_key=routing_key, body=message, properties=pika.BasicProperties(delivery_mode=2))
-
-    def subscribe(self, queue, callback, routing_key):
-        result = self.channel.queue_declare(queue=queue, durable=True)
-        queue_name = result.method.queue
-        self.channel.queue_bind(
-            exchange=self.exchange, queue=queue_name, routing_key=routing_key)
-        self.channel.basic_consume(
-            queue=queue_name, on_message_callback=callback, auto_ack=True)
-
-    def queue_bind(self, queue, routing_key):
-        self.channel.queue_bind(
-            exchange=self.exchange, queue=queue, routing_key=routing_key)
-
-    def start_consuming(self):
-        self.channel.start_consuming()
-
-    def disconnect(self):
-        self.channel.close()
-        self.connection.close()
-
-    def consume_last_message(self, queue):
-        method, properties, body = self.channel.basic_get(
-            queue=queue, auto_ack=True)
-        return body
+                 password: str = settings["RABBITMQ_PASSWORD"], exchange: str = settings["RABBITMQ_EXCHANGE_NAME"], vhost=settings["RABBITMQ_VHOST"], exchange_type='topic',
+                 retry_delays=settings['RABBITMQ_RETRY_DELAYS']):
+        super().__init__(host=host, port=port, username=username, password=password, exchange=exchange, vhost=vhost,
+                         exchange_type=exchange_type, retry_delays=retry_delays)
+
+
+class AsyncConsumer(consumer.AsyncConsumer):
+    '''
+    AsyncConsumer без базы данных: обработчик выполняется в пуле потоков без транзакции,
+    упавшее сообщение уходит в очереди повторов и затем в <queue>.dlq, как у сервисов
+    '''
+
+    def __init__(self, message_broker: RabbitMQ = None,
+                 concurrency: int = settings['RABBITMQ_CONSUMER_CONCURRENCY'],
+                 prefetch_count: int = settings['RABBITMQ_PREFETCH_COUNT'],
+                 reconnect_delay: float = settings['RABBITMQ_RECONNECT_DELAY'],
+                 max_reconnect_delay: float = settings['RABBITMQ_MAX_RECONNECT_DELAY'],
+                 connection_factory=AsyncioConnection, workers: int = settings['RABBITMQ_CONSUMER_WORKERS'],
+                 batch_size: int = settings['RABBITMQ_CONSUMER_BATCH_SIZE'],
+                 linger: float = settings['RABBITMQ_CONSUMER_BATCH_LINGER'],
+                 retry_delays=settings['RABBITMQ_RETRY_DELAYS']):
+        super().__init__(message_broker or RabbitMQ(), concurrency=concurrency, prefetch_count=prefetch_count,
+                         reconnect_delay=reconnect_delay, max_reconnect_delay=max_reconnect_delay,
+                         connection_factory=connection_factory, workers=workers, batch_size=batch_size,
+                         linger=linger, retry_delays=retry_delays)
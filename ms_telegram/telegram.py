@@ -1,54 +1,78 @@
+import asyncio
+import json
+import logging.config
 import telebot
-import os
+from typing import List
+import manuscript_shared.logger as logger
 import message_broker as mb
 
 with open('app.yaml') as f:
     import yaml
     settings = yaml.safe_load(f)
 
+# Те же логгеры и файлы, что у остальных сервисов (settings.LOGGING)
+logging.config.dictConfig({
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'rabbitmq': {
+            'level': 'DEBUG',
+            'class': 'logging.FileHandler',
+            'filename': "rabbitmq_debug.log",
+        },
+    },
+    'loggers': {
+        'rabbitmq': {
+            'handlers': ['rabbitmq'],
+            'level': 'DEBUG',
+            'propagate': True,
+        },
+    },
+})
+
 bot = telebot.TeleBot(settings['TELEGRAM_TOKEN'])
 
-# Определяем обработчик сообщений из очереди
-
-
-def callback(ch, method, properties, body):
-    print(" [x] Received %r" % body)
-    message = 'Hello, world!'
-    body = body.decode()
-    if method.routing_key == settings['RABBITMQ_USER_CREATE_ROUTING_KEY']:
-        message = f'User created: {body}'
-    elif method.routing_key == settings['RABBITMQ_EVENT_EDIT_ROUTING_KEY']:
-        message = f'Event edited: {body}'
-    elif method.routing_key == settings['RABBITMQ_EVENT_CREATE_ROUTING_KEY']:
-        message = f'Event created: {body}'
-    elif method.routing_key == settings['RABBITMQ_USER_LEFT_FROM_TEAM_ROUTING_KEY']:
-        message = f'User left from team: {body}'
-    elif method.routing_key == settings['RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY']:
-        message = f'User join request: {body}'
-    elif method.routing_key == settings['RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY']:
-        message = f'User join request updated: {body}'
-    elif method.routing_key == settings['RABBITMQ_USER_KICKED_FROM_TEAM_ROUTING_KEY']:
-        message = f'User kicked from team: {body}'
-    receivers = ['858128787']
-    for chat in receivers:
-        bot.send_message(chat_id=chat, text=message)
-
-
-# Создаем соединение с RabbitMQ
-rabbitmq = mb.RabbitMQ()
-with rabbitmq:
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_USER_CREATE_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_EVENT_EDIT_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_EVENT_CREATE_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_USER_LEFT_FROM_TEAM_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY'])
-    rabbitmq.subscribe(queue='telegram', callback=callback,
-                       routing_key=settings['RABBITMQ_USER_KICKED_FROM_TEAM_ROUTING_KEY'])
-    rabbitmq.start_consuming()
+# Тексты уведомлений по ключу маршрутизации
+TEMPLATES = {
+    settings['RABBITMQ_USER_CREATE_ROUTING_KEY']: 'User created: {}',
+    settings['RABBITMQ_EVENT_EDIT_ROUTING_KEY']: 'Event edited: {}',
+    settings['RABBITMQ_EVENT_CREATE_ROUTING_KEY']: 'Event created: {}',
+    settings['RABBITMQ_USER_LEFT_FROM_TEAM_ROUTING_KEY']: 'User left from team: {}',
+    settings['RABBITMQ_USER_JOIN_REQUEST_ROUTING_KEY']: 'User join request: {}',
+    settings['RABBITMQ_USER_JOIN_REQUEST_UPDATED_ROUTING_KEY']: 'User join request updated: {}',
+    settings['RABBITMQ_USER_KICKED_FROM_TEAM_ROUTING_KEY']: 'User kicked from team: {}',
+}
+
+
+def load_receivers(path: str) -> List[str]:
+    '''
+    Читает id чатов получателей уведомлений: по одному в строке, пустые строки и # пропускаются
+    '''
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+receivers = load_receivers(settings['TELEGRAM_SUBSCRIBERS_FILE'])
+
+
+def handle(messages: List[mb.Message]):
+    # Выполняется в пуле потоков AsyncConsumer. Конверт уже проверен, payload - его данные.
+    # Если Telegram API ответил ошибкой, сообщение уходит в очередь повтора
+    for message in messages:
+        type = mb.original_routing_key(message.method, message.properties)
+        logger.info(user='TELEGRAM',
+                    message=f'Received {type} {message.properties.message_id}', logger=logger.mb_logger)
+        text = TEMPLATES.get(type, 'Hello, world!').format(
+            json.dumps(message.payload, ensure_ascii=False))
+        for chat in receivers:
+            bot.send_message(chat_id=chat, text=text)
+
+
+if not receivers:
+    logger.warning(user='TELEGRAM',
+                   message=f'No receivers in {settings["TELEGRAM_SUBSCRIBERS_FILE"]}', logger=logger.mb_logger)
+
+# Одна очередь telegram получает сообщения по всем ключам
+consumer = mb.AsyncConsumer()
+consumer.subscribe(queue='telegram', routing_key=TEMPLATES.keys(), handler=handle)
+asyncio.run(consumer.run())
@@ -1 +1,2 @@
 from .user_repository import AbstractUserRepository, ManuscriptUserRepository, FakeManuscriptUserRepository
+from .outbox_repository import AbstractOutboxRepository, OutboxRepository, FakeOutboxRepository
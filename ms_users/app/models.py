@@ -1,6 +1,8 @@
+import uuid
 import jwt
 from django.conf import settings
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 # Create your models here.
 
@@ -31,3 +33,18 @@ class ManuscriptUser(models.Model):
         }, settings.TOKEN_SECRET, algorithm='HS256')
 
         return token
+
+
+class OutboxMessage(models.Model):
+    '''
+    Исходящее сообщение RabbitMQ, записанное в транзакции изменения данных.
+    Отправляется и удаляется процессом entrypoints.outbox_relay
+    '''
+    # Публикуется как message_id AMQP: по нему потребители узнают повторную доставку
+    message_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    routing_key = models.CharField(max_length=255)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.id}: {self.routing_key}'
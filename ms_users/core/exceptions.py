@@ -1,4 +1,7 @@
 ''' Exceptions for the services '''
+# Ошибку конверта вызывает manuscript_shared.envelope, сервисы ловят тот же класс
+from manuscript_shared.exceptions import INVALID_MESSAGE_EXCEPTION_MESSAGE, InvalidMessageException
+
 UNKNOWN_EXCEPTION_MESSAGE = "Unknown error"
 AUTHENTICATION_EXCEPTION_MESSAGE = "Username or password is incorrect"
 INVALID_USER_DATA_EXCEPTION_MESSAGE = "Invalid user data"
@@ -18,5 +18,5 @@ def start(message_broker):
 
 
 if __name__ == '__main__':
-    message_broker = mb.RabbitMQ()
+    message_broker = mb.create_broker()
     start(message_broker=message_broker)
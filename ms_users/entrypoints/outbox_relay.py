@@ -0,0 +1,29 @@
+import os
+os.environ['DJANGO_SETTINGS_MODULE'] = 'ms_users.settings'
+import threading
+import service_layer.message_broker as mb
+import django
+django.setup()
+from django.conf import settings
+import app.models as models
+import manuscript_shared.outbox as outbox
+
+
+def relay_batch(message_broker: mb.BackgroundPublisher, batch_size: int = settings.OUTBOX_BATCH_SIZE,
+                content_type: str = settings.RABBITMQ_CONTENT_TYPE) -> int:
+    '''
+    Отправляет пачку OutboxMessage сервиса (manuscript_shared.outbox.relay_batch)
+
+            Returns:
+                    [int] - количество отправленных сообщений
+    '''
+    return outbox.relay_batch(models.OutboxMessage, message_broker, batch_size=batch_size, content_type=content_type)
+
+
+def start(publisher: mb.BackgroundPublisher = None, stop: threading.Event = None, poll_interval: float = settings.OUTBOX_POLL_INTERVAL):
+    outbox.start(models.OutboxMessage, publisher or mb.get_background_publisher(), batch_size=settings.OUTBOX_BATCH_SIZE,
+                 content_type=settings.RABBITMQ_CONTENT_TYPE, poll_interval=poll_interval, stop=stop)
+
+
+if __name__ == '__main__':
+    start()
@@ -246,6 +246,9 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Брокер сообщений: rabbitmq или memory (брокер в памяти процесса)
+MESSAGE_BROKER = cfg['MESSAGE_BROKER']
+
 # RabbitMQ settings
 # or the hostname where RabbitMQ is running
 RABBITMQ_HOST = cfg['RABBITMQ_LOCAL_HOST']
@@ -258,4 +261,13 @@ RABBITMQ_QUEUE = cfg['RABBITMQ_LOCAL_QUEUE']
 
 RABBITMQ_USER_CREATE_ROUTING_KEY = cfg['RABBITMQ_USER_CREATE_ROUTING_KEY']
 
+RABBITMQ_HEARTBEAT = cfg['RABBITMQ_HEARTBEAT']
+RABBITMQ_PUBLISH_QUEUE_SIZE = cfg['RABBITMQ_PUBLISH_QUEUE_SIZE']
+RABBITMQ_PUBLISH_BATCH_SIZE = cfg['RABBITMQ_PUBLISH_BATCH_SIZE']
+RABBITMQ_PUBLISH_LINGER = cfg['RABBITMQ_PUBLISH_LINGER']
+RABBITMQ_CONTENT_TYPE = cfg['RABBITMQ_CONTENT_TYPE']
+
+OUTBOX_BATCH_SIZE = cfg['OUTBOX_BATCH_SIZE']
+OUTBOX_POLL_INTERVAL = cfg['OUTBOX_POLL_INTERVAL']
+
 TOKEN_SECRET = 'neon-gravestones'
@@ -1,6 +1,4 @@
-import json
 from django.conf import settings
-import service_layer.message_broker as mb
 import service_layer.unit_of_work as uow
 from service_layer.result import Result
 import core.exceptions as exceptions
@@ -27,13 +25,10 @@ def sign_up_user_service(uow: uow.AbstractUnitOfWork, request, **kwargs) -> Resu
         return Result(data=None, error=exceptions.InvalidUserDataException)
     if not username or not first_name or not last_name:
         return Result(data=None, error=exceptions.InvalidUserDataException)
-    with uow:
+    with uow, uow.transaction():
         user = uow.user.create(username=username, first_name=first_name,
                                last_name=last_name, password=password, email=username, phone_number=phone_number, description=description)
-    try:
-        handle_publish_message_on_user_created(user=user)
-    except Exception as e:
-        print('Error while publishing message: ', e)
+        handle_publish_message_on_user_created(uow, user=user)
     return Result(data={"access_token": user.generate_jwt_token()})
 
 
@@ -51,17 +46,10 @@ def get_me_service(uow: uow.AbstractUnitOfWork, user) -> Result:
         return Result(data=m_user.to_dict(), error=None)
 
 
-def handle_publish_message_on_user_created(user):
-    try:
-        if settings.DEBUG:
-            return
-        else:
-            message_broker = mb.RabbitMQ()
-        with message_broker:
-            message_broker.publish(
-                message=json.dumps(user.to_dict()), routing_key=settings.RABBITMQ_USER_CREATE_ROUTING_KEY)
-        logger.info(user='PUBLISHER',
-                    message=f'Data({user}) sent to {settings.RABBITMQ_USER_CREATE_ROUTING_KEY}', logger=logger.mb_logger)
-    except Exception as e:
-        logger.error(
-            user='PUBLISHER', message=f'Error while publishing message on user created: {e}', logger=logger.mb_logger)
+def handle_publish_message_on_user_created(uow: uow.AbstractUnitOfWork, user):
+    '''
+    Записывает сообщение о регистрации пользователя в outbox в транзакции сервиса
+    '''
+    uow.outbox.add(routing_key=settings.RABBITMQ_USER_CREATE_ROUTING_KEY, payload=user.to_dict())
+    logger.info(user='PUBLISHER',
+                message=f'Data({user}) queued to {settings.RABBITMQ_USER_CREATE_ROUTING_KEY}', logger=logger.mb_logger)
\ No newline at end of file
@@ -1,12 +1,15 @@
 # pylint: disable=attribute-defined-outside-init
 from __future__ import annotations
 import abc
+import contextlib
+from django.db import transaction
 
 import adapters as repository
 
 
 class AbstractUnitOfWork(abc.ABC):
     user: repository.AbstractUserRepository
+    outbox: repository.AbstractOutboxRepository
 
     def __enter__(self) -> AbstractUnitOfWork:
         return self
@@ -14,6 +17,12 @@ class AbstractUnitOfWork(abc.ABC):
     def __exit__(self, *args):
         self.rollback()
 
+    def transaction(self):
+        '''
+        Контекст, в котором изменения сервиса и сообщения outbox фиксируются атомарно
+        '''
+        return contextlib.nullcontext()
+
     @abc.abstractmethod
     def commit(self):
         raise NotImplementedError
@@ -27,11 +36,15 @@ class DjangoORMUnitOfWork(AbstractUnitOfWork):
 
     def __enter__(self):
         self.user = repository.ManuscriptUserRepository()
+        self.outbox = repository.OutboxRepository()
         return super().__enter__()
 
     def __exit__(self, *args):
         super().__exit__(*args)
 
+    def transaction(self):
+        return transaction.atomic()
+
     def commit(self):
         pass
 
@@ -42,6 +55,7 @@ class DjangoORMUnitOfWork(AbstractUnitOfWork):
 class FakeUnitOfWork(AbstractUnitOfWork):
     def __init__(self):
         self.user = repository.FakeManuscriptUserRepository()
+        self.outbox = repository.FakeOutboxRepository()
 
     def commit(self):
         self.committed = True
@@ -1,11 +1,11 @@
 import pika
-import json
 from django.conf import settings
 from django.test import TestCase, Client
 
 
 import service_layer.message_broker as mb
 import app.models as models
+import manuscript_shared.envelope as envelope
 
 
 class TestUserEvents():
@@ -19,7 +19,9 @@ class TestUserEvents():
     def test_user_register_should_emit_user_created_event(self):
         def callback(ch, method, properties, body):
             user = models.ManuscriptUser.objects.last()
-            self.assertEqual(body, json.dumps(user.to_dict()))
+            message = envelope.decode(body, properties.content_type, method.routing_key)
+            self.assertEqual(message.payload['id'], user.id)
+            self.assertEqual(message.payload['email'], user.user.email)
             ch.stop_consuming()
         self.assertEqual(models.User.objects.count(), 0)
 
@@ -0,0 +1,7 @@
+'''
+Модули, общие для микросервисов Manuscript: конверт сообщений RabbitMQ (envelope),
+соединение и публикация (rabbitmq), потребители (consumer), брокер в памяти
+(memory_broker), логгеры (logger), таблицы Fake-репозиториев (memory) и курсорная
+пагинация (pagination). Модули outbox и processed_messages работают с моделями
+сервисов и требуют Django. Пакет устанавливается в каждый сервис из requirements.txt
+'''
@@ -0,0 +1,432 @@
+'''
+Потребители сообщений, общие для сервисов: ConsumerPool на блокирующем соединении
+и AsyncConsumer на asyncio. Оба обрабатывают пачки сообщений с проверкой конверта,
+журналом обработанных сообщений, очередями повторов и dead-letter очередью.
+Модуль не зависит от Django: транзакцию обработчика и закрытие устаревших соединений
+с базой сервис передает в конструктор (atomic, close_connections)
+'''
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+from typing import Callable, ContextManager, List, NamedTuple, Set
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+import manuscript_shared.envelope as envelope
+import manuscript_shared.exceptions as exceptions
+import manuscript_shared.logger as logger
+from manuscript_shared.rabbitmq import (
+    LAST_ERROR_HEADER, RETRY_COUNT_HEADER, ROUTING_KEY_HEADER, AbstractMessageBroker, Message, RabbitMQ,
+    dead_letter_queue_name, original_routing_key, retry_queue_name, retry_queues)
+
+
+def _noop():
+    pass
+
+
+class ConsumerPool:
+    '''
+    Выполняет обработчики сообщений пачками в ограниченном пуле потоков, а не в потоке
+    ввода-вывода pika, поэтому медленный запрос к базе не останавливает остальные очереди.
+    Сообщения каждой очереди копятся, пока их не станет batch_size или не пройдет linger
+    секунд, затем обработчик handler(messages: List[Message]) получает всю пачку и
+    записывает ее несколькими bulk-запросами в одной транзакции. После успешной обработки
+    подтверждается (basic_ack) вся пачка. Если обработчик упал, сообщения пачки обрабатываются
+    по одному, чтобы ошибка одного сообщения не задерживала остальные. Упавшее сообщение
+    перекладывается в очередь повтора с задержкой retry_delays[n] (RabbitMQ.declare_retry_queues),
+    а после всех повторов - в dead-letter очередь, и только затем подтверждается.
+    Канал pika не потокобезопасен, поэтому ack и публикация повторов передаются в поток
+    соединения через add_callback_threadsafe. Количество сообщений в работе ограничивает prefetch канала.
+
+    Перед обработкой конверт каждого сообщения декодируется кодеком его content_type и
+    проверяется по схеме (manuscript_shared.envelope), обработчик получает payload в Message.payload.
+    Сообщение, не прошедшее проверку, сразу уходит в dead-letter очередь: повтор его не исправит
+
+    ledger(message_ids) -> set записывает id сообщений в журнал в транзакции обработчика
+    и возвращает id, которых там еще не было: повторно доставленные сообщения
+    подтверждаются без вызова обработчика. atomic() - транзакция обработчика и журнала,
+    close_connections() вызывается в потоке пула до и после обработки
+    '''
+
+    def __init__(self, message_broker: AbstractMessageBroker, workers: int = 4, batch_size: int = 100,
+                 linger: float = 0.05, ledger: Callable[[List[str]], Set[str]] = None, retry_delays=(),
+                 atomic: Callable[[], ContextManager] = contextlib.nullcontext, close_connections: Callable[[], None] = _noop):
+        self._broker = message_broker
+        self._ledger = ledger
+        self._retry_delays = list(retry_delays)
+        self._batch_size = batch_size
+        self._linger = linger
+        self._atomic = atomic
+        self._close_connections = close_connections
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='consumer')
+
+    def wrap(self, handler, queue: str):
+        '''
+        Возвращает on_message_callback для basic_consume(auto_ack=False) очереди queue,
+        который копит сообщения и передает их пачкой обработчику handler в пуле.
+        Колбэк и таймер выполняются в потоке соединения, поэтому блокировка не нужна
+        '''
+        state = {'messages': [], 'timer': None}
+
+        def submit(ch):
+            if state['timer'] is not None:
+                self._broker.connection.remove_timeout(state['timer'])
+            messages, state['messages'], state['timer'] = state['messages'], [], None
+            if messages:
+                self._executor.submit(self._handle, handler, queue, ch, messages)
+
+        def on_timeout(ch):
+            state['timer'] = None
+            submit(ch)
+
+        def on_message(ch, method, properties, body):
+            state['messages'].append(Message(method, properties, body))
+            if len(state['messages']) >= self._batch_size:
+                submit(ch)
+            elif state['timer'] is None:
+                state['timer'] = self._broker.connection.call_later(
+                    self._linger, functools.partial(on_timeout, ch))
+        on_message.handler = handler
+        return on_message
+
+    def every(self, interval: float, function):
+        '''
+        Выполняет function в пуле каждые interval секунд, пока работает соединение
+        '''
+        def tick():
+            self._executor.submit(self._run, function)
+            self._broker.connection.call_later(interval, tick)
+        self._broker.connection.call_later(interval, tick)
+
+    def shutdown(self, wait: bool = True):
+        # Неотправленные в пул сообщения не подтверждены, брокер доставит их повторно
+        self._executor.shutdown(wait=wait)
+
+    def _handle(self, handler, queue: str, ch, messages: List[Message]):
+        results = self._run_batch(handler, messages)
+        try:
+            self._broker.connection.add_callback_threadsafe(
+                functools.partial(self._settle, ch, queue, results))
+        except pika.exceptions.AMQPError as e:
+            logger.warning(user='CONSUMER',
+                           message=f'Could not settle messages of {queue}: {e!r}', logger=logger.mb_logger)
+
+    def _run_batch(self, handler, messages: List[Message]) -> list:
+        # Выполняется в потоке пула: возвращает (сообщение, ошибка) для каждого сообщения пачки
+        messages, results = self._decode(messages)
+        self._close_connections()
+        try:
+            if messages:
+                results += self._process(handler, messages)
+        finally:
+            self._close_connections()
+        return results
+
+    def _settle(self, ch, queue: str, results: list):
+        # Выполняется в потоке соединения
+        try:
+            for message, error in results:
+                if error is not None:
+                    self._retry(ch, queue, message, error)
+                ch.basic_ack(delivery_tag=message.method.delivery_tag)
+        except pika.exceptions.AMQPError as e:
+            # Канал закрылся (например, при переподключении) - брокер доставит сообщения повторно
+            logger.warning(user='CONSUMER',
+                           message=f'Could not settle messages of {queue}: {e!r}', logger=logger.mb_logger)
+
+    def _decode(self, messages: List[Message]) -> tuple:
+        # Возвращает сообщения с payload и результаты (сообщение, ошибка) для непрошедших проверку
+        decoded, invalid = [], []
+        for message in messages:
+            try:
+                item = envelope.decode(message.body, message.properties.content_type,
+                                       original_routing_key(message.method, message.properties))
+            except exceptions.InvalidMessageException as e:
+                logger.error(user='CONSUMER',
+                             message=f'Invalid message {message.properties.message_id}: {e}', logger=logger.mb_logger)
+                invalid.append((message, e))
+            else:
+                decoded.append(message._replace(payload=item.payload))
+        return decoded, invalid
+
+    def _process(self, handler, messages: List[Message]) -> list:
+        try:
+            with self._atomic():
+                unprocessed = self._unprocessed(messages)
+                if unprocessed:
+                    handler(unprocessed)
+            return [(message, None) for message in messages]
+        except Exception as e:
+            logger.error(user='CONSUMER',
+                         message=f'Error while handling {len(messages)} messages '
+                                 f'{messages[0].method.routing_key}: {e}', logger=logger.mb_logger)
+            if len(messages) == 1:
+                return [(messages[0], e)]
+        return [result for message in messages for result in self._process(handler, [message])]
+
+    def _retry(self, ch, queue: str, message: Message, error: Exception):
+        # Копия сообщения с увеличенным счетчиком попыток уходит в очередь повтора
+        # или в DLQ, исходное сообщение после этого подтверждается
+        headers = dict(message.properties.headers or {})
+        attempt = headers.get(RETRY_COUNT_HEADER, 0) + 1
+        headers[RETRY_COUNT_HEADER] = attempt
+        headers[LAST_ERROR_HEADER] = repr(error)[:255]
+        headers[ROUTING_KEY_HEADER] = original_routing_key(message.method, message.properties)
+        if attempt <= len(self._retry_delays) and not isinstance(error, exceptions.InvalidMessageException):
+            target = retry_queue_name(queue, self._retry_delays[attempt - 1])
+        else:
+            target = dead_letter_queue_name(queue)
+            logger.error(user='CONSUMER',
+                         message=f'Message {message.properties.message_id} moved to {target} after {attempt} attempts',
+                         logger=logger.mb_logger)
+        properties = pika.BasicProperties(
+            content_type=message.properties.content_type, content_encoding=message.properties.content_encoding,
+            delivery_mode=2, message_id=message.properties.message_id, correlation_id=message.properties.correlation_id,
+            timestamp=message.properties.timestamp, type=message.properties.type, headers=headers)
+        ch.basic_publish(exchange='', routing_key=target, body=message.body, properties=properties)
+
+    def _unprocessed(self, messages: List[Message]) -> List[Message]:
+        # Сообщения без message_id обрабатываются всегда
+        if self._ledger is None:
+            return messages
+        ids = [message.properties.message_id for message in messages if message.properties.message_id]
+        new = self._ledger(ids) if ids else set()
+        unprocessed = []
+        for message in messages:
+            message_id = message.properties.message_id
+            if not message_id:
+                unprocessed.append(message)
+            elif message_id in new:
+                # Дубликат внутри одной пачки обрабатывается один раз
+                new.discard(message_id)
+                unprocessed.append(message)
+        if len(unprocessed) < len(messages):
+            logger.info(user='CONSUMER',
+                        message=f'Skipped {len(messages) - len(unprocessed)} already processed messages', logger=logger.mb_logger)
+        return unprocessed
+
+    def _run(self, function):
+        self._close_connections()
+        try:
+            function()
+        except Exception as e:
+            logger.error(user='CONSUMER',
+                         message=f'Error while running {function.__name__}: {e}', logger=logger.mb_logger)
+        finally:
+            self._close_connections()
+
+
+class Subscription(NamedTuple):
+    queue: str
+    routing_keys: tuple
+    handler: Callable
+    concurrency: int
+
+
+class AsyncConsumer(ConsumerPool):
+    '''
+    Потребитель на asyncio поверх pika AsyncioConnection. Соединение, доставка и
+    подтверждения работают в цикле событий, а пачки сообщений (как в ConsumerPool)
+    обрабатываются задачами asyncio: синхронный обработчик выполняется в пуле
+    потоков в транзакции вместе с журналом обработанных сообщений. Каждая очередь
+    обрабатывает не больше concurrency пачек одновременно, поэтому медленная очередь
+    не занимает весь пул. При потере соединения потребитель переподключается с
+    нарастающей паузой и заново объявляет очереди и подписки, неподтвержденные
+    сообщения брокер доставит повторно
+    '''
+
+    def __init__(self, message_broker: RabbitMQ, concurrency: int = 4, prefetch_count: int = 100,
+                 reconnect_delay: float = 1, max_reconnect_delay: float = 30,
+                 connection_factory=AsyncioConnection, **kwargs):
+        super().__init__(message_broker, **kwargs)
+        self._concurrency = concurrency
+        self._prefetch_count = prefetch_count
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._connection_factory = connection_factory
+        self._subscriptions = []
+        self._periodic = []
+        self._loop = None
+        self._connection = None
+        self._closed = None
+        self._semaphores = {}
+        self._buffers = []
+        self._tasks = set()
+
+    def subscribe(self, queue: str, routing_key, handler, concurrency: int = None):
+        '''
+        Добавляет очередь, привязанную к routing_key (ключу или нескольким ключам),
+        и ее обработчик handler(messages: List[Message]). Подписки восстанавливаются
+        после каждого переподключения
+        '''
+        routing_keys = (routing_key,) if isinstance(routing_key, str) else tuple(routing_key)
+        self._subscriptions.append(Subscription(queue, routing_keys, handler, concurrency or self._concurrency))
+
+    def every(self, interval: float, function):
+        '''
+        Выполняет function в пуле каждые interval секунд, пока работает run()
+        '''
+        self._periodic.append((interval, function))
+
+    async def run(self, stop: asyncio.Event = None):
+        '''
+        Подключается и обрабатывает сообщения, пока не установлен stop. После stop
+        дожидается обработки и подтверждения уже полученных пачек и закрывает соединение
+        '''
+        self._loop = asyncio.get_running_loop()
+        stop = stop or asyncio.Event()
+        self._semaphores = {subscription.queue: asyncio.Semaphore(subscription.concurrency)
+                            for subscription in self._subscriptions}
+        periodic = [self._loop.create_task(self._every(interval, function))
+                    for interval, function in self._periodic]
+        delay = self._reconnect_delay
+        try:
+            while not stop.is_set():
+                try:
+                    await self._connect()
+                    delay = self._reconnect_delay
+                    logger.info(user='CONSUMER',
+                                message=f'Consuming {len(self._subscriptions)} queues', logger=logger.mb_logger)
+                    stopping = self._loop.create_task(stop.wait())
+                    await asyncio.wait({self._closed, stopping}, return_when=asyncio.FIRST_COMPLETED)
+                    stopping.cancel()
+                    if self._closed.done():
+                        logger.error(user='CONSUMER',
+                                     message=f'Connection lost: {self._closed.result()!r}', logger=logger.mb_logger)
+                    else:
+                        await self._drain()
+                except pika.exceptions.AMQPError as e:
+                    logger.error(user='CONSUMER',
+                                 message=f'Could not connect: {e!r}', logger=logger.mb_logger)
+                finally:
+                    await self._disconnect()
+                if not stop.is_set():
+                    logger.info(user='CONSUMER',
+                                message=f'Reconnecting in {delay} seconds', logger=logger.mb_logger)
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    delay = min(delay * 2, self._max_reconnect_delay)
+        finally:
+            for task in periodic:
+                task.cancel()
+            self.shutdown()
+
+    def wrap(self, handler, queue: str):
+        '''
+        Возвращает on_message_callback, который копит сообщения очереди и запускает
+        обработку пачки задачей asyncio. Колбэк и таймер выполняются в цикле событий
+        '''
+        state = {'messages': [], 'timer': None, 'channel': None}
+
+        def submit():
+            if state['timer'] is not None:
+                state['timer'].cancel()
+            messages, state['messages'], state['timer'] = state['messages'], [], None
+            if messages:
+                task = self._loop.create_task(self._handle_async(handler, queue, state['channel'], messages))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+        def on_message(ch, method, properties, body):
+            state['channel'] = ch
+            state['messages'].append(Message(method, properties, body))
+            if len(state['messages']) >= self._batch_size:
+                submit()
+            elif state['timer'] is None:
+                state['timer'] = self._loop.call_later(self._linger, submit)
+        self._buffers.append((state, submit))
+        on_message.handler = handler
+        return on_message
+
+    async def _handle_async(self, handler, queue: str, ch, messages: List[Message]):
+        async with self._semaphores[queue]:
+            results = await self._loop.run_in_executor(self._executor, self._run_batch, handler, messages)
+        if not ch.is_open:
+            # Канал закрылся, пока пачка обрабатывалась - брокер доставит ее повторно
+            logger.warning(user='CONSUMER',
+                           message=f'Could not settle messages of {queue}: channel is closed', logger=logger.mb_logger)
+            return
+        self._settle(ch, queue, results)
+
+    async def _connect(self):
+        '''
+        Открывает соединение и канал, объявляет очереди с очередями повторов и подписывается
+        на них. self._closed завершается при закрытии соединения или канала
+        '''
+        self._closed = self._loop.create_future()
+        opened = self._loop.create_future()
+
+        def on_open_error(connection, error):
+            _set_exception(opened, error)
+
+        def on_close(connection, reason):
+            _set_result(self._closed, reason)
+            _set_exception(opened, reason)
+        self._connection = self._connection_factory(
+            parameters=self._broker.parameters(), on_open_callback=functools.partial(_set_result, opened),
+            on_open_error_callback=on_open_error, on_close_callback=on_close, custom_ioloop=self._loop)
+        await opened
+        channel = await self._call(self._connection.channel, callback='on_open_callback')
+        channel.add_on_close_callback(lambda ch, reason: _set_result(self._closed, reason))
+        await self._call(channel.exchange_declare, exchange=self._broker.exchange,
+                         exchange_type=self._broker.exchange_type, durable=True)
+        # Не больше prefetch неподтвержденных сообщений на очередь
+        await self._call(channel.basic_qos, prefetch_count=self._prefetch_count)
+        self._buffers = []
+        for subscription in self._subscriptions:
+            await self._call(channel.queue_declare, queue=subscription.queue, durable=True)
+            for routing_key in subscription.routing_keys:
+                await self._call(channel.queue_bind, queue=subscription.queue,
+                                 exchange=self._broker.exchange, routing_key=routing_key)
+            for name, arguments in retry_queues(subscription.queue, self._retry_delays):
+                await self._call(channel.queue_declare, queue=name, durable=True, arguments=arguments)
+            channel.basic_consume(queue=subscription.queue, auto_ack=False,
+                                  on_message_callback=self.wrap(subscription.handler, queue=subscription.queue))
+
+    async def _call(self, method, callback: str = 'callback', **kwargs):
+        # Превращает асинхронную операцию pika с колбэком в ожидание. Если соединение
+        # закрылось раньше ответа, выбрасывает причину закрытия
+        future = self._loop.create_future()
+        method(**kwargs, **{callback: functools.partial(_set_result, future)})
+        await asyncio.wait({future, self._closed}, return_when=asyncio.FIRST_COMPLETED)
+        if not future.done():
+            reason = self._closed.result()
+            raise reason if isinstance(reason, pika.exceptions.AMQPError) else pika.exceptions.AMQPConnectionError(reason)
+        return future.result()
+
+    async def _drain(self):
+        # Накопленные пачки отправляются в обработку сразу, без ожидания linger
+        for _, submit in self._buffers:
+            submit()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _disconnect(self):
+        for state, _ in self._buffers:
+            if state['timer'] is not None:
+                state['timer'].cancel()
+        self._buffers = []
+        connection, self._connection = self._connection, None
+        if connection is not None and connection.is_open:
+            connection.close()
+            await asyncio.wait({self._closed}, timeout=self._max_reconnect_delay)
+
+    async def _every(self, interval: float, function):
+        while True:
+            await asyncio.sleep(interval)
+            await self._loop.run_in_executor(self._executor, self._run, function)
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error):
+    if not future.done():
+        future.set_exception(error if isinstance(error, BaseException) else pika.exceptions.AMQPConnectionError(error))
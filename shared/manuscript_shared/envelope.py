@@ -0,0 +1,173 @@
+'''
+Конверт сообщений RabbitMQ: тип, версия схемы, id, время, correlation id и payload.
+Кодек выбирается по content_type сообщения, payload проверяется по схеме типа
+'''
+import datetime
+import json
+from typing import Callable, Dict, NamedTuple, Optional
+
+import manuscript_shared.exceptions as exceptions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+
+class Codec(NamedTuple):
+    dumps: Callable[[dict], bytes]
+    loads: Callable[[bytes], dict]
+
+
+def _json_dumps(value: dict) -> bytes:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+# orjson и msgpack необязательны: без orjson JSON кодирует стандартный json,
+# без msgpack content_type application/msgpack не поддерживается
+CODECS: Dict[str, Codec] = {
+    JSON_CONTENT_TYPE: Codec(orjson.dumps, orjson.loads) if orjson else Codec(_json_dumps, json.loads),
+}
+if msgpack:
+    CODECS[MSGPACK_CONTENT_TYPE] = Codec(msgpack.packb, lambda body: msgpack.unpackb(body, raw=False))
+
+
+def get_codec(content_type: Optional[str]) -> Codec:
+    '''
+    Возвращает кодек по content_type. Сообщения без content_type - старый формат, JSON
+    '''
+    codec = CODECS.get(content_type or JSON_CONTENT_TYPE)
+    if codec is None:
+        raise exceptions.InvalidMessageException(f'Unsupported content type: {content_type}')
+    return codec
+
+
+class Field(NamedTuple):
+    '''
+    Поле схемы: kind - тип, кортеж типов или вложенная схема (dict)
+    '''
+    kind: object
+    required: bool = True
+
+
+USER = {'id': Field(int), 'username': Field(str)}
+TEAM = {'id': Field(int), 'name': Field(str)}
+PARTICIPANTS_MESSAGE = {'user': Field(USER), 'team': Field(TEAM), 'to': Field(list), 'action': Field(str)}
+# Организатор мероприятия, необязателен для сообщений, отправленных до его появления
+EVENT_MESSAGE = {'id': Field(int), 'name': Field(str), 'is_active': Field(bool),
+                 'author': Field({'id': Field(int)}, required=False)}
+
+# Схемы payload по (тип, версия). Тип сообщения совпадает с ключом маршрутизации.
+# В payload остаются только поля схемы, поэтому потребители получают сообщение
+# без вложенных to_dict() команды, мероприятия и пользователей
+SCHEMAS = {
+    ('USER_REGISTERED', 1): {
+        'id': Field(int), 'username': Field(str), 'email': Field(str),
+        'first_name': Field(str), 'last_name': Field(str),
+    },
+    ('EVENT_CREATED', 1): EVENT_MESSAGE,
+    ('EVENT_UPDATED', 1): EVENT_MESSAGE,
+    ('TEAM_PARTICIPANT_REQUEST_CREATE', 1): PARTICIPANTS_MESSAGE,
+    ('TEAM_PARTICIPANT_LEFT', 1): PARTICIPANTS_MESSAGE,
+    ('TEAM_PARTICIPANT_KICKED', 1): PARTICIPANTS_MESSAGE,
+    ('TEAM_PARTICIPANT_REQUEST_UPDATE', 1): {**PARTICIPANTS_MESSAGE, 'changes': Field(list, required=False)},
+}
+VERSIONS = {type: max(version for key, version in SCHEMAS if key == type) for type, _ in SCHEMAS}
+
+
+class Envelope(NamedTuple):
+    type: str
+    version: int
+    id: str
+    timestamp: str
+    correlation_id: Optional[str]
+    payload: dict
+
+
+def build(type: str, payload: dict, id: str, timestamp: datetime.datetime, correlation_id: str = None) -> Envelope:
+    '''
+    Собирает конверт последней версии схемы типа и оставляет в payload только поля схемы
+
+            Args:
+                    type: [str] - тип сообщения (ключ маршрутизации)
+                    payload: [dict] - данные
+                    id: [str] - id сообщения
+                    timestamp: [datetime] - время создания
+                    correlation_id: [str] - id цепочки сообщений, по умолчанию id сообщения
+
+            Returns:
+                    [Envelope] - конверт
+    '''
+    version = VERSIONS.get(type, 1)
+    schema = SCHEMAS.get((type, version))
+    return Envelope(type=type, version=version, id=id, timestamp=timestamp.isoformat(),
+                    correlation_id=correlation_id or id,
+                    payload=project(schema, payload) if schema else payload)
+
+
+def project(schema: dict, value: dict) -> dict:
+    projected = {}
+    for name, field in schema.items():
+        if name in value:
+            item = value[name]
+            projected[name] = project(field.kind, item) if isinstance(field.kind, dict) and isinstance(item, dict) else item
+    return projected
+
+
+def validate(schema: dict, value, path: str = 'payload') -> None:
+    '''
+    Проверяет значение по схеме. Вызывает InvalidMessageException с путем к ошибке
+    '''
+    if not isinstance(value, dict):
+        raise exceptions.InvalidMessageException(f'{path} must be an object')
+    for name, field in schema.items():
+        if name not in value:
+            if field.required:
+                raise exceptions.InvalidMessageException(f'{path}.{name} is required')
+            continue
+        item = value[name]
+        if isinstance(field.kind, dict):
+            validate(field.kind, item, f'{path}.{name}')
+        # bool - подкласс int, но как id не подходит
+        elif not isinstance(item, field.kind) or (isinstance(item, bool) and field.kind is not bool):
+            raise exceptions.InvalidMessageException(f'{path}.{name} has invalid type')
+
+
+def encode(envelope: Envelope, content_type: str = JSON_CONTENT_TYPE) -> bytes:
+    return get_codec(content_type).dumps(envelope._asdict())
+
+
+def decode(body: bytes, content_type: Optional[str], routing_key: str) -> Envelope:
+    '''
+    Декодирует и проверяет сообщение. Сообщение без content_type - payload старого
+    формата без конверта, его тип берется из ключа маршрутизации
+
+            Returns:
+                    [Envelope] - конверт с проверенным payload
+    '''
+    try:
+        data = get_codec(content_type).loads(body)
+    except exceptions.InvalidMessageException:
+        raise
+    except Exception as e:
+        raise exceptions.InvalidMessageException(f'Could not decode message: {e}') from e
+    if content_type is None:
+        data = {'type': routing_key, 'version': 1, 'id': None, 'timestamp': None,
+                'correlation_id': None, 'payload': data}
+    if not isinstance(data, dict) or not set(Envelope._fields) <= set(data):
+        raise exceptions.InvalidMessageException('Message is not an envelope')
+    envelope = Envelope(**{name: data[name] for name in Envelope._fields})
+    schema = SCHEMAS.get((envelope.type, envelope.version))
+    if schema is None:
+        raise exceptions.InvalidMessageException(
+            f'Unknown message type: {envelope.type} v{envelope.version}')
+    validate(schema, envelope.payload)
+    return envelope
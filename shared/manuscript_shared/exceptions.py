@@ -0,0 +1,5 @@
+INVALID_MESSAGE_EXCEPTION_MESSAGE = "Invalid message"
+
+
+class InvalidMessageException(Exception):
+    message = INVALID_MESSAGE_EXCEPTION_MESSAGE
@@ -0,0 +1,193 @@
+import collections
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+# Поддерживаемые операторы Django-подобных фильтров: team__event__id=1,
+# id__in=[1, 2], tags__contains='python', tags__has_any_keys=['python', 'go'],
+# start_date__gte='2024-01-01'
+LOOKUPS = ('exact', 'in', 'contains', 'has_any_keys', 'gt', 'gte', 'lt', 'lte')
+COMPARISONS = {
+    'gt': lambda attr, value: attr > value,
+    'gte': lambda attr, value: attr >= value,
+    'lt': lambda attr, value: attr < value,
+    'lte': lambda attr, value: attr <= value,
+}
+
+
+def parse_lookup(key: str) -> Tuple[str, str]:
+    '''
+    Разбирает ключ фильтра на путь к атрибуту и оператор
+
+            Args:
+                    key: [str] - ключ фильтра, например user__username или tags__contains
+
+            Returns:
+                    [Tuple[str, str]] - путь к атрибуту и оператор
+    '''
+    path, _, lookup = key.rpartition('__')
+    if path and lookup in LOOKUPS:
+        return path, lookup
+    return key, 'exact'
+
+
+def resolve(obj, path: str):
+    '''
+    Возвращает значение атрибута по пути вида user__username. None на пути дает None
+    '''
+    for name in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+    return obj
+
+
+def matches(obj, lookups: Dict[str, Any]) -> bool:
+    for key, value in lookups.items():
+        path, lookup = parse_lookup(key)
+        attr = resolve(obj, path)
+        if lookup == 'in':
+            if attr not in value:
+                return False
+        elif lookup == 'contains':
+            if attr is None or not all(item in attr for item in _items(value)):
+                return False
+        elif lookup == 'has_any_keys':
+            if attr is None or not any(item in attr for item in value):
+                return False
+        elif lookup in COMPARISONS:
+            if attr is None or not COMPARISONS[lookup](attr, value):
+                return False
+        elif attr != value:
+            return False
+    return True
+
+
+def _items(value) -> list:
+    # Как и в JSONField, tags__contains принимает и один элемент, и список элементов
+    return value if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class InMemoryTable:
+    '''
+    Хранилище объектов в памяти для Fake-репозиториев: словарь по id и
+    хеш-индексы по полям, которые используются в фильтрах сервисов.
+    Поиск по индексированным полям не требует полного перебора.
+
+    Индексы строятся при add() и перестраиваются в update(), поэтому
+    изменять индексированные поля объекта нужно только через update().
+    Поля из array_indexes хранят коллекции (например, tags): в индекс
+    попадает каждый элемент, что ускоряет фильтр <поле>__contains
+    '''
+
+    def __init__(self, indexes: Iterable[str] = (), array_indexes: Iterable[str] = ()):
+        self._rows = {}
+        self._id = 0
+        self._indexes = {path: collections.defaultdict(set) for path in indexes}
+        self._array_indexes = {path: collections.defaultdict(set) for path in array_indexes}
+        self._keys = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows.values())
+
+    def next_id(self) -> int:
+        self._id += 1
+        return self._id
+
+    def add(self, obj):
+        '''
+        Сохраняет объект и добавляет его в индексы. Если id не задан, он назначается
+        '''
+        if getattr(obj, 'id', None) is None:
+            obj.id = self.next_id()
+        self._id = max(self._id, obj.id)
+        self._rows[obj.id] = obj
+        self._index(obj)
+        return obj
+
+    def update(self, obj, **fields):
+        '''
+        Изменяет поля объекта и перестраивает его записи в индексах
+        '''
+        self._unindex(obj)
+        for key, value in fields.items():
+            setattr(obj, key, value)
+        self._index(obj)
+        return obj
+
+    def remove(self, obj) -> None:
+        self._unindex(obj)
+        self._rows.pop(obj.id, None)
+
+    def get(self, **lookups):
+        '''
+        Возвращает первый (по id) объект, подходящий под фильтры, или None
+        '''
+        return next(iter(self.filter(**lookups)), None)
+
+    def filter(self, **lookups) -> List:
+        '''
+        Возвращает объекты, подходящие под фильтры, в порядке id.
+        Кандидаты выбираются пересечением индексов, оставшиеся фильтры
+        проверяются на кандидатах
+        '''
+        ids = self._candidates(lookups)
+        if ids is None:
+            rows = self._rows.values()
+        else:
+            rows = (self._rows[id] for id in sorted(ids) if id in self._rows)
+        return [obj for obj in rows if matches(obj, lookups)]
+
+    def _candidates(self, lookups: Dict[str, Any]) -> Union[set, None]:
+        candidates = []
+        for key, value in lookups.items():
+            path, lookup = parse_lookup(key)
+            if path == 'id' and lookup == 'exact':
+                candidates.append({value} if value in self._rows else set())
+            elif path == 'id' and lookup == 'in':
+                candidates.append(set(value))
+            elif path in self._indexes and lookup == 'exact' and _hashable(value):
+                candidates.append(self._indexes[path].get(value, set()))
+            elif path in self._indexes and lookup == 'in':
+                index = self._indexes[path]
+                candidates.append(set().union(*(index.get(item, set()) for item in value)))
+            elif path in self._array_indexes and lookup == 'contains':
+                index = self._array_indexes[path]
+                candidates.extend(index.get(item, set()) for item in _items(value) if _hashable(item))
+            elif path in self._array_indexes and lookup == 'has_any_keys':
+                index = self._array_indexes[path]
+                candidates.append(set().union(*(index.get(item, set()) for item in value)))
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return set(candidates[0]).intersection(*candidates[1:])
+
+    def _index(self, obj) -> None:
+        keys = []
+        for path, index in self._indexes.items():
+            value = resolve(obj, path)
+            if _hashable(value):
+                index[value].add(obj.id)
+                keys.append((index, value))
+        for path, index in self._array_indexes.items():
+            for value in resolve(obj, path) or ():
+                index[value].add(obj.id)
+                keys.append((index, value))
+        self._keys[obj.id] = keys
+
+    def _unindex(self, obj) -> None:
+        for index, value in self._keys.pop(obj.id, ()):
+            ids = index.get(value)
+            if ids is not None:
+                ids.discard(obj.id)
+                if not ids:
+                    del index[value]
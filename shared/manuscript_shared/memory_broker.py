@@ -0,0 +1,505 @@
+'''
+Брокер сообщений в памяти процесса: exchange (topic, direct, fanout), очереди,
+ack/nack, prefetch и очереди с TTL и dead-letter. Повторяет ту часть интерфейса
+pika.BlockingConnection и BlockingChannel, которую используют RabbitMQ, Publisher
+и ConsumerPool, поэтому публикаторы и потребители одного процесса обмениваются
+сообщениями без RabbitMQ (локальный запуск, замеры пропускной способности)
+'''
+import collections
+import functools
+import heapq
+import itertools
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+import pika
+
+
+def topic_matches(pattern: str, routing_key: str) -> bool:
+    '''
+    Проверяет ключ маршрутизации по шаблону привязки topic exchange:
+    * - ровно одно слово, # - ноль или больше слов
+
+            Args:
+                    pattern: [str] - шаблон, например TEAM_PARTICIPANT_* или events.#
+                    routing_key: [str] - ключ маршрутизации сообщения
+
+            Returns:
+                    [bool] - подходит ли ключ под шаблон
+    '''
+    return _matches(pattern.split('.'), routing_key.split('.'))
+
+
+def _matches(pattern: List[str], words: List[str]) -> bool:
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == '#':
+        return any(_matches(rest, words[i:]) for i in range(len(words) + 1))
+    return bool(words) and head in ('*', words[0]) and _matches(rest, words[1:])
+
+
+EXCHANGE_MATCHERS = {
+    'topic': topic_matches,
+    'direct': lambda pattern, routing_key: pattern == routing_key,
+    'fanout': lambda pattern, routing_key: True,
+}
+
+
+class QueuedMessage(NamedTuple):
+    exchange: str
+    routing_key: str
+    body: bytes
+    properties: object
+    redelivered: bool = False
+    expires_at: Optional[float] = None
+
+
+class Queue:
+    '''
+    Очередь брокера. x-message-ttl, x-dead-letter-exchange и x-dead-letter-routing-key
+    работают как в RabbitMQ: истекшее сообщение перекладывается в dead-letter exchange
+    '''
+
+    def __init__(self, name: str, durable: bool, arguments: dict, owner):
+        arguments = arguments or {}
+        self.name = name
+        self.durable = durable
+        self.owner = owner
+        self.messages = collections.deque()
+        self.ttl = arguments.get('x-message-ttl')
+        self.dead_letter_exchange = arguments.get('x-dead-letter-exchange')
+        self.dead_letter_routing_key = arguments.get('x-dead-letter-routing-key')
+
+
+class InMemoryServer:
+    '''
+    Состояние брокера, общее для всех соединений процесса. Durable-очереди
+    переживают закрытие соединения вместе с сообщениями, остальные удаляются
+    вместе с объявившим их соединением. Все изменения выполняются под condition,
+    которым соединения ждут новых сообщений
+    '''
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.RLock())
+        self.exchanges = {}
+        self.queues = {}
+
+    def connect(self) -> 'InMemoryConnection':
+        return InMemoryConnection(self)
+
+    def reset(self):
+        with self.condition:
+            self.exchanges.clear()
+            self.queues.clear()
+
+    def declare_exchange(self, name: str, exchange_type: str):
+        if exchange_type not in EXCHANGE_MATCHERS:
+            raise pika.exceptions.ChannelClosedByBroker(503, f'COMMAND_INVALID - unknown exchange type {exchange_type}')
+        with self.condition:
+            self.exchanges.setdefault(name, {'type': exchange_type, 'bindings': []})
+
+    def declare_queue(self, name: str, durable: bool, arguments: dict, owner) -> Queue:
+        with self.condition:
+            if name not in self.queues:
+                self.queues[name] = Queue(name, durable, arguments, owner)
+            return self.queues[name]
+
+    def bind(self, exchange: str, queue: str, routing_key: str):
+        with self.condition:
+            self._get_queue(queue)
+            bindings = self._get_exchange(exchange)['bindings']
+            if (routing_key, queue) not in bindings:
+                bindings.append((routing_key, queue))
+
+    def publish(self, message: QueuedMessage):
+        '''
+        Раскладывает сообщение по очередям. Сообщение без подходящей очереди
+        отбрасывается, как неуправляемое (mandatory=False) сообщение RabbitMQ
+        '''
+        with self.condition:
+            for name in self._route(message.exchange, message.routing_key):
+                self._enqueue(self.queues[name], message)
+            self.condition.notify_all()
+
+    def expire(self, now: float) -> Optional[float]:
+        '''
+        Перекладывает истекшие сообщения очередей с TTL в dead-letter exchange
+
+                Returns:
+                        [Optional[float]] - время истечения ближайшего сообщения
+        '''
+        next_expiry = None
+        with self.condition:
+            for queue in list(self.queues.values()):
+                while queue.messages and queue.messages[0].expires_at is not None \
+                        and queue.messages[0].expires_at <= now:
+                    message = queue.messages.popleft()
+                    if queue.dead_letter_exchange is not None:
+                        self.publish(message._replace(
+                            exchange=queue.dead_letter_exchange, redelivered=False, expires_at=None,
+                            routing_key=queue.dead_letter_routing_key or message.routing_key))
+                if queue.messages and queue.messages[0].expires_at is not None:
+                    expires_at = queue.messages[0].expires_at
+                    next_expiry = expires_at if next_expiry is None else min(next_expiry, expires_at)
+        return next_expiry
+
+    def disconnect(self, owner):
+        with self.condition:
+            for name in [name for name, queue in self.queues.items() if queue.owner is owner and not queue.durable]:
+                del self.queues[name]
+
+    def _route(self, exchange: str, routing_key: str) -> List[str]:
+        # Exchange по умолчанию ('') доставляет в очередь с именем ключа маршрутизации
+        if exchange == '':
+            return [routing_key] if routing_key in self.queues else []
+        declared = self._get_exchange(exchange)
+        matches = EXCHANGE_MATCHERS[declared['type']]
+        return list(dict.fromkeys(queue for pattern, queue in declared['bindings']
+                                  if queue in self.queues and matches(pattern, routing_key)))
+
+    def _enqueue(self, queue: Queue, message: QueuedMessage):
+        expires_at = time.monotonic() + queue.ttl / 1000 if queue.ttl is not None else None
+        queue.messages.append(message._replace(expires_at=expires_at))
+
+    def _get_exchange(self, name: str) -> dict:
+        if name not in self.exchanges:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{name}'")
+        return self.exchanges[name]
+
+    def _get_queue(self, name: str) -> Queue:
+        if name not in self.queues:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'")
+        return self.queues[name]
+
+
+class Consumer(NamedTuple):
+    queue: str
+    callback: object
+    auto_ack: bool
+
+
+class InMemoryChannel:
+    '''
+    Канал соединения с брокером в памяти. Сообщения доставляются потребителям
+    только внутри start_consuming или process_data_events соединения, в его потоке,
+    как в BlockingChannel. Неподтвержденные сообщения при закрытии канала
+    возвращаются в начало своих очередей с флагом redelivered
+    '''
+
+    def __init__(self, connection: 'InMemoryConnection', channel_number: int):
+        self.connection = connection
+        self.channel_number = channel_number
+        self._server = connection.server
+        self.is_open = True
+        self._prefetch_count = 0
+        self._consumers = collections.OrderedDict()
+        self._unacked = collections.OrderedDict()
+        self._in_flight = collections.Counter()
+        self._delivery_tags = itertools.count(1)
+        self._consumer_tags = itertools.count(1)
+        # Незафиксированные публикации и подтверждения после tx_select, None - канал без транзакций
+        self._transaction = None
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def exchange_declare(self, exchange: str, exchange_type: str = 'direct', **kwargs):
+        self._check_open()
+        self._server.declare_exchange(exchange, exchange_type)
+
+    def queue_declare(self, queue: str, durable: bool = False, arguments: dict = None, **kwargs):
+        self._check_open()
+        declared = self._server.declare_queue(queue, durable, arguments, owner=self.connection)
+        return pika.frame.Method(self.channel_number, pika.spec.Queue.DeclareOk(
+            queue=queue, message_count=len(declared.messages),
+            consumer_count=sum(consumer.queue == queue for consumer in self._consumers.values())))
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str = None, **kwargs):
+        self._check_open()
+        self._server.bind(exchange, queue, queue if routing_key is None else routing_key)
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs):
+        # Как в RabbitMQ при global_qos=False: ограничение на каждого потребителя канала
+        self._prefetch_count = prefetch_count
+
+    def tx_select(self):
+        self._check_open()
+        self._transaction = []
+
+    def tx_commit(self):
+        self._check_open()
+        operations, self._transaction = self._transaction, []
+        for operation in operations:
+            operation()
+
+    def tx_rollback(self):
+        self._check_open()
+        self._transaction = []
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, mandatory: bool = False):
+        self._check_open()
+        if isinstance(body, str):
+            body = body.encode()
+        message = QueuedMessage(exchange=exchange, routing_key=routing_key, body=body,
+                                properties=properties or pika.BasicProperties())
+        # В режиме транзакций сообщения попадают в очереди только после tx_commit
+        if self._transaction is not None:
+            self._transaction.append(functools.partial(self._server.publish, message))
+        else:
+            self._server.publish(message)
+
+    def basic_consume(self, queue: str, on_message_callback, auto_ack: bool = False,
+                      consumer_tag: str = None, **kwargs) -> str:
+        self._check_open()
+        with self._server.condition:
+            self._server._get_queue(queue)
+            consumer_tag = consumer_tag or f'ctag{self.channel_number}.{next(self._consumer_tags)}'
+            self._consumers[consumer_tag] = Consumer(queue, on_message_callback, auto_ack)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag: str):
+        with self._server.condition:
+            self._consumers.pop(consumer_tag, None)
+
+    def basic_get(self, queue: str, auto_ack: bool = False):
+        self._check_open()
+        self._server.expire(time.monotonic())
+        with self._server.condition:
+            messages = self._server._get_queue(queue).messages
+            if not messages:
+                return None, None, None
+            message = messages.popleft()
+            delivery_tag = next(self._delivery_tags)
+            if not auto_ack:
+                self._unacked[delivery_tag] = (None, queue, message)
+            method = pika.spec.Basic.GetOk(
+                delivery_tag=delivery_tag, redelivered=message.redelivered, exchange=message.exchange,
+                routing_key=message.routing_key, message_count=len(messages))
+            return method, message.properties, message.body
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        # Как и публикации, подтверждения в режиме транзакций выполняются при tx_commit
+        if self._transaction is not None:
+            self._transaction.append(functools.partial(self._ack, delivery_tag, multiple))
+            return
+        self._ack(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True):
+        if self._transaction is not None:
+            self._transaction.append(functools.partial(self._nack, delivery_tag, multiple, requeue))
+            return
+        self._nack(delivery_tag, multiple, requeue)
+
+    def _ack(self, delivery_tag: int, multiple: bool):
+        with self._server.condition:
+            self._settle(delivery_tag, multiple)
+            self._server.condition.notify_all()
+
+    def _nack(self, delivery_tag: int, multiple: bool, requeue: bool):
+        with self._server.condition:
+            settled = self._settle(delivery_tag, multiple)
+            if requeue:
+                self._requeue(settled)
+            self._server.condition.notify_all()
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True):
+        self.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+
+    def start_consuming(self):
+        self.connection._run(until=lambda: not self.is_open or not self._consumers)
+
+    def stop_consuming(self):
+        with self._server.condition:
+            self._consumers.clear()
+            self._server.condition.notify_all()
+
+    def close(self):
+        with self._server.condition:
+            if not self.is_open:
+                return
+            self.is_open = False
+            self._consumers.clear()
+            self._requeue(list(self._unacked.values()))
+            self._unacked.clear()
+            self._in_flight.clear()
+            self._server.condition.notify_all()
+
+    def _check_open(self):
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError('Channel is closed.')
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> list:
+        self._check_open()
+        if delivery_tag not in self._unacked and not (multiple and delivery_tag == 0):
+            # RabbitMQ закрывает канал при подтверждении неизвестного delivery_tag
+            self.close()
+            raise pika.exceptions.ChannelClosedByBroker(
+                406, f'PRECONDITION_FAILED - unknown delivery tag {delivery_tag}')
+        tags = [tag for tag in self._unacked if tag <= delivery_tag or delivery_tag == 0] if multiple else [delivery_tag]
+        settled = [self._unacked.pop(tag) for tag in tags]
+        for consumer_tag, _, _ in settled:
+            if consumer_tag is not None:
+                self._in_flight[consumer_tag] -= 1
+        return settled
+
+    def _requeue(self, settled: list):
+        for _, queue, message in reversed(settled):
+            if queue in self._server.queues:
+                self._server.queues[queue].messages.appendleft(message._replace(redelivered=True))
+
+    def _ready(self) -> bool:
+        # Вызывается под condition сервера
+        return any(self._can_deliver(tag, consumer) for tag, consumer in self._consumers.items())
+
+    def _can_deliver(self, consumer_tag: str, consumer: Consumer) -> bool:
+        queue = self._server.queues.get(consumer.queue)
+        return bool(queue and queue.messages) and \
+            (not self._prefetch_count or self._in_flight[consumer_tag] < self._prefetch_count)
+
+    def _deliver(self) -> bool:
+        '''
+        Доставляет одно сообщение первому потребителю, которому есть что доставить.
+        Обслуженный потребитель переходит в конец, чтобы очереди обслуживались по кругу
+
+                Returns:
+                        [bool] - было ли доставлено сообщение
+        '''
+        with self._server.condition:
+            for consumer_tag, consumer in self._consumers.items():
+                if self._can_deliver(consumer_tag, consumer):
+                    break
+            else:
+                return False
+            self._consumers.move_to_end(consumer_tag)
+            message = self._server.queues[consumer.queue].messages.popleft()
+            delivery_tag = next(self._delivery_tags)
+            if not consumer.auto_ack:
+                self._unacked[delivery_tag] = (consumer_tag, consumer.queue, message)
+                self._in_flight[consumer_tag] += 1
+        method = pika.spec.Basic.Deliver(
+            consumer_tag=consumer_tag, delivery_tag=delivery_tag, redelivered=message.redelivered,
+            exchange=message.exchange, routing_key=message.routing_key)
+        consumer.callback(self, method, message.properties, message.body)
+        return True
+
+
+class InMemoryConnection:
+    '''
+    Соединение с брокером в памяти. call_later, remove_timeout и add_callback_threadsafe
+    работают как в BlockingConnection: колбэки выполняются в потоке, который
+    обрабатывает события соединения (start_consuming или process_data_events)
+    '''
+
+    def __init__(self, server: InMemoryServer):
+        self.server = server
+        self.is_open = True
+        self._channels = []
+        self._callbacks = collections.deque()
+        self._timers = []
+        self._cancelled_timers = set()
+        self._timer_ids = itertools.count(1)
+
+    @property
+    def is_closed(self) -> bool:
+        return not self.is_open
+
+    def channel(self) -> InMemoryChannel:
+        self._check_open()
+        channel = InMemoryChannel(self, channel_number=len(self._channels) + 1)
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback):
+        with self.server.condition:
+            self._check_open()
+            self._callbacks.append(callback)
+            self.server.condition.notify_all()
+
+    def call_later(self, delay: float, callback) -> int:
+        with self.server.condition:
+            self._check_open()
+            timer_id = next(self._timer_ids)
+            heapq.heappush(self._timers, (time.monotonic() + delay, timer_id, callback))
+            self.server.condition.notify_all()
+            return timer_id
+
+    def remove_timeout(self, timeout_id: int):
+        with self.server.condition:
+            self._cancelled_timers.add(timeout_id)
+
+    def process_data_events(self, time_limit: float = 0):
+        deadline = time.monotonic() + (time_limit or 0)
+        self._run(until=lambda: time.monotonic() >= deadline, deadline=deadline)
+
+    def sleep(self, duration: float):
+        self.process_data_events(time_limit=duration)
+
+    def close(self):
+        with self.server.condition:
+            if not self.is_open:
+                return
+            for channel in self._channels:
+                channel.close()
+            self.is_open = False
+            self._callbacks.clear()
+            self._timers.clear()
+            self.server.disconnect(self)
+
+    def _check_open(self):
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError('Connection is closed.')
+
+    def _run(self, until, deadline: float = None):
+        '''
+        Цикл событий соединения: колбэки из других потоков, таймеры, TTL очередей
+        и доставка сообщений. Ждет на condition сервера, пока нечего делать
+        '''
+        while True:
+            busy = self._run_callbacks() | self._run_timers()
+            next_expiry = self.server.expire(time.monotonic())
+            for channel in list(self._channels):
+                busy |= channel.is_open and channel._deliver()
+            if not self.is_open:
+                return
+            # Как process_data_events(0) в pika: сначала обрабатывается все, что уже готово
+            if busy:
+                continue
+            if until():
+                return
+            with self.server.condition:
+                if self._callbacks or any(channel.is_open and channel._ready() for channel in self._channels):
+                    continue
+                wakeups = [wakeup for wakeup in (deadline, next_expiry, self._timers[0][0] if self._timers else None)
+                           if wakeup is not None]
+                self.server.condition.wait(
+                    timeout=max(0, min(wakeups) - time.monotonic()) if wakeups else None)
+
+    def _run_callbacks(self) -> bool:
+        ran = False
+        while True:
+            with self.server.condition:
+                if not self._callbacks:
+                    return ran
+                callback = self._callbacks.popleft()
+            callback()
+            ran = True
+
+    def _run_timers(self) -> bool:
+        ran = False
+        while True:
+            with self.server.condition:
+                if not self._timers or self._timers[0][0] > time.monotonic():
+                    return ran
+                _, timer_id, callback = heapq.heappop(self._timers)
+                if timer_id in self._cancelled_timers:
+                    self._cancelled_timers.discard(timer_id)
+                    continue
+            callback()
+            ran = True
+
+
+# Брокер процесса: все InMemoryBroker без явного server подключаются к нему
+SERVER = InMemoryServer()
@@ -0,0 +1,126 @@
+'''
+Transactional outbox сервисов на Django: репозиторий исходящих сообщений и relay,
+который отправляет их в RabbitMQ. Модель сообщения (поля message_id, routing_key,
+payload, created_at) у каждого сервиса своя и передается в конструктор и функции
+'''
+import abc
+import threading
+from typing import List
+
+from django.db import transaction
+
+import manuscript_shared.envelope as envelope
+import manuscript_shared.logger as logger
+
+# Пауза перед переподключением после ошибки брокера или базы
+RECONNECT_DELAY = 5
+
+
+class AbstractOutboxRepository(abc.ABC):
+    '''
+    Репозиторий исходящих сообщений (transactional outbox). Сообщение записывается
+    в той же транзакции, что и изменение данных, и отправляется в RabbitMQ
+    процессом entrypoints.outbox_relay
+    '''
+    @abc.abstractmethod
+    def add(self, routing_key: str, payload: dict):
+        '''
+        Добавляет сообщение в outbox
+
+                Args:
+                        routing_key: [str] - ключ маршрутизации
+                        payload: [dict] - тело сообщения
+        '''
+        raise NotImplementedError
+
+
+class OutboxRepository(AbstractOutboxRepository):
+
+    def __init__(self, model) -> None:
+        self.model = model
+
+    def add(self, routing_key: str, payload: dict):
+        return self.model.objects.create(routing_key=routing_key, payload=payload)
+
+
+class FakeOutboxRepository(AbstractOutboxRepository):
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    def add(self, routing_key: str, payload: dict):
+        self.messages.append((routing_key, payload))
+        return routing_key, payload
+
+    def list(self, routing_key=None) -> List[dict]:
+        return [payload for key, payload in self.messages if routing_key in (None, key)]
+
+
+def relay_batch(model, message_broker, batch_size: int, content_type: str) -> int:
+    '''
+    Отправляет до batch_size самых старых сообщений outbox и удаляет их в одной транзакции.
+    Строки блокируются FOR UPDATE SKIP LOCKED, поэтому несколько relay не отправят одно
+    сообщение одновременно. Вся пачка ставится в очередь фонового публикатора сразу,
+    и он публикует ее одной транзакцией брокера, поэтому relay ждет одного подтверждения
+    на пачку. Если брокер не подтвердил пачку, транзакция базы откатывается и пачка
+    будет отправлена повторно (at-least-once).
+    Сообщение отправляется в конверте manuscript_shared.envelope, закодированном кодеком content_type
+
+            Args:
+                    model: модель исходящих сообщений сервиса
+                    message_broker: [BackgroundPublisher] - фоновый публикатор
+
+            Returns:
+                    [int] - количество отправленных сообщений
+    '''
+    with transaction.atomic():
+        messages = list(model.objects.select_for_update(
+            skip_locked=True).order_by('id')[:batch_size])
+        futures = [message_broker.publish(routing_key=message.routing_key,
+                                          message=encode(message, content_type),
+                                          message_id=str(message.message_id),
+                                          content_type=content_type)
+                   for message in messages]
+        for future in futures:
+            future.result()
+        if messages:
+            model.objects.filter(
+                id__in=[message.id for message in messages]).delete()
+    return len(messages)
+
+
+def encode(message, content_type: str) -> bytes:
+    # Тип сообщения - ключ маршрутизации, correlation_id по умолчанию равен id сообщения
+    return envelope.encode(envelope.build(
+        type=message.routing_key, payload=message.payload,
+        id=str(message.message_id), timestamp=message.created_at), content_type)
+
+
+def start(model, publisher, batch_size: int, content_type: str, poll_interval: float,
+          stop: threading.Event = None):
+    '''
+    Отправляет outbox пачками relay_batch, пока не установлен stop. Если пачка неполная,
+    ждет poll_interval секунд, после ошибки брокера или базы - RECONNECT_DELAY
+    '''
+    logger.info(user='OUTBOX',
+                message='Starting outbox relay...', logger=logger.mb_logger)
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            sent = relay_batch(model, publisher, batch_size=batch_size, content_type=content_type)
+            if sent:
+                stats = publisher.stats()
+                logger.info(user='OUTBOX',
+                            message=f'Relayed {sent} messages, last batch confirmed in '
+                                    f'{stats["last_confirm_latency"] * 1000:.1f} ms, queue depth {stats["queue_depth"]}, '
+                                    f'published {stats["published"]} in {stats["batches"]} batches, '
+                                    f'failed {stats["failed"]}', logger=logger.mb_logger)
+            if sent < batch_size:
+                stop.wait(poll_interval)
+        except Exception as e:
+            logger.error(user='OUTBOX',
+                         message=f'Error while relaying outbox: {e}', logger=logger.mb_logger)
+            stop.wait(RECONNECT_DELAY)
+    publisher.close()
+    logger.info(user='OUTBOX',
+                message='Outbox relay stopped', logger=logger.mb_logger)
@@ -0,0 +1,54 @@
+import json
+import base64
+import binascii
+import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_date(value: str) -> str:
+    # Даты в курсоре остаются ISO-строками: их принимает и DateField, и Fake-репозиторий
+    return datetime.date.fromisoformat(value).isoformat()
+
+
+def encode_cursor(item, field='created_at') -> str:
+    '''
+    Возвращает непрозрачный курсор, указывающий на позицию (field, id) записи
+    '''
+    value = getattr(item, field)
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value, item.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, parse=datetime.datetime.fromisoformat):
+    '''
+    Разбирает курсор, созданный encode_cursor. Вызывает ValueError, если курсор некорректен
+    '''
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse(value), int(id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+def parse_page_params(limit, cursor=None, parse=datetime.datetime.fromisoformat):
+    '''
+    Приводит параметры ?limit=&cursor= к (int, (created_at, id) | None).
+    parse приводит первый элемент курсора, если страницы упорядочены не по created_at.
+    Вызывает ValueError, если параметры некорректны
+    '''
+    limit = int(limit) if limit not in (None, '') else DEFAULT_PAGE_SIZE
+    if limit < 1:
+        raise ValueError(f'Invalid limit: {limit}')
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(cursor, parse) if cursor else None
+
+
+def paginate(items: list, limit: int, field='created_at'):
+    '''
+    Отрезает лишнюю запись (репозиторий запрашивает limit + 1) и возвращает
+    страницу вместе с курсором следующей страницы
+    '''
+    items = list(items)
+    next_cursor = encode_cursor(items[limit - 1], field) if len(items) > limit else None
+    return items[:limit], next_cursor
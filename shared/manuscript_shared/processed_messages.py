@@ -0,0 +1,57 @@
+'''
+Журнал обработанных сообщений RabbitMQ для потребителей на Django (ledger ConsumerPool).
+Модель журнала (поля message_id UUID primary key, processed_at) у каждого сервиса своя
+'''
+import datetime
+import uuid
+from typing import Iterable, Set
+
+from django.db import connection
+from django.utils import timezone
+
+
+class ProcessedMessageLedger:
+
+    def __init__(self, model) -> None:
+        self.model = model
+
+    def record(self, message_ids: Iterable[str]) -> Set[str]:
+        '''
+        Записывает id сообщений в журнал одним INSERT ... ON CONFLICT DO NOTHING
+        и возвращает id, которых в журнале еще не было. Вызывается в транзакции обработчика:
+        если обработка откатится, запись тоже откатится и сообщение будет обработано повторно.
+        Параллельная транзакция с тем же id ждет фиксации первой, поэтому сообщение
+        обрабатывается ровно один раз
+
+                Args:
+                        message_ids: [Iterable[str]] - id сообщений (message_id AMQP)
+
+                Returns:
+                        [Set[str]] - id новых сообщений, которые нужно обработать.
+                        Id, которые не являются UUID, не записываются и считаются новыми
+        '''
+        ids, invalid = {}, set()
+        for message_id in message_ids:
+            try:
+                ids[uuid.UUID(message_id)] = message_id
+            except (TypeError, ValueError, AttributeError):
+                invalid.add(message_id)
+        if not ids:
+            return invalid
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (message_id, processed_at) VALUES {", ".join(["(%s, %s)"] * len(ids))} '
+                f'ON CONFLICT (message_id) DO NOTHING RETURNING message_id',
+                [value for message_id in sorted(ids) for value in (message_id, now)])
+            recorded = {ids[uuid.UUID(str(row[0]))] for row in cursor.fetchall()}
+        return recorded | invalid
+
+    def prune(self, retention: datetime.timedelta) -> int:
+        '''
+        Удаляет записи журнала старше retention и возвращает их количество
+        '''
+        deleted, _ = self.model.objects.filter(
+            processed_at__lt=timezone.now() - retention).delete()
+        return deleted
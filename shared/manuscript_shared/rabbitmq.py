@@ -0,0 +1,480 @@
+'''
+Соединение с RabbitMQ и публикация сообщений, общие для сервисов: RabbitMQ поверх
+pika.BlockingConnection, InMemoryBroker поверх брокера в памяти (memory_broker),
+имена очередей повторов и dead-letter очередей, Publisher и BackgroundPublisher.
+Модуль не читает настройки: параметры передаются в конструкторы, а сервис связывает
+их со своими settings в service_layer/message_broker.py
+'''
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+import pika
+
+import manuscript_shared.logger as logger
+import manuscript_shared.memory_broker as memory_broker
+
+
+class AbstractMessageBroker(ABC):
+    @abstractmethod
+    def connect(self):
+        pass
+
+    @abstractmethod
+    def publish(self, exchange, routing_key, message):
+        pass
+
+    @abstractmethod
+    def subscribe(self, exchange, queue, callback, routing_key):
+        pass
+
+    @abstractmethod
+    def disconnect(self):
+        pass
+
+
+class RabbitMQ(AbstractMessageBroker):
+    '''
+    Блокирующее соединение с RabbitMQ. heartbeat=None оставляет интервал, предложенный
+    брокером, retry_delays - задержки очередей повторов (declare_retry_queues)
+    '''
+
+    def __init__(self, host: str = 'localhost', port: int = 5672, username: str = 'guest', password: str = 'guest',
+                 exchange: str = '', vhost: str = '/', exchange_type: str = 'topic', heartbeat: int = None,
+                 retry_delays=()):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.exchange = exchange
+
+        self.vhost = vhost
+
+        self.connection = None
+        self.channel = None
+
+        self.exchange_type = exchange_type
+        self.heartbeat = heartbeat
+        self.retry_delays = list(retry_delays)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def parameters(self) -> pika.ConnectionParameters:
+        credentials = pika.credentials.PlainCredentials(
+            self.username, self.password)
+        options = {} if self.heartbeat is None else {'heartbeat': self.heartbeat}
+        if self.vhost == 'test':
+            return pika.ConnectionParameters(
+                host=self.host, port=self.port, credentials=credentials, **options)
+        return pika.ConnectionParameters(
+            host=self.host, port=self.port, credentials=credentials, virtual_host=self.vhost, **options)
+
+    def connect(self, declare_exchange: bool = True):
+        self.connection = pika.BlockingConnection(self.parameters())
+        self.channel = self.connection.channel()
+        if declare_exchange:
+            self.channel.exchange_declare(
+                exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
+
+    def select_transactions(self):
+        # Публикации и ack канала копятся у брокера до commit() и подтверждаются
+        # одним ответом на всю пачку, а не ожиданием на каждое сообщение
+        self.channel.tx_select()
+
+    def commit(self):
+        self.channel.tx_commit()
+
+    def publish(self, routing_key, message, message_id: str = None, content_type: str = None):
+        # message_id позволяет потребителям отбрасывать повторные доставки,
+        # по content_type потребитель выбирает кодек конверта (manuscript_shared.envelope)
+        self.channel.basic_publish(
+            exchange=self.exchange, routing_key=routing_key, body=message,
+            properties=pika.BasicProperties(delivery_mode=2, message_id=message_id, content_type=content_type))
+
+    def subscribe(self, queue, callback, routing_key):
+        result = self.channel.queue_declare(queue=queue, durable=True)
+        queue_name = result.method.queue
+        self.channel.queue_bind(
+            exchange=self.exchange, queue=queue_name, routing_key=routing_key)
+        self.channel.basic_consume(
+            queue=queue_name, on_message_callback=callback, auto_ack=True)
+
+    def queue_bind(self, queue, routing_key):
+        self.channel.queue_bind(
+            exchange=self.exchange, queue=queue, routing_key=routing_key)
+
+    def declare_retry_queues(self, queue, delays=None):
+        '''
+        Объявляет очереди повторов и dead-letter очередь для queue. Сообщение из
+        <queue>.retry.<delay>s по истечении TTL возвращается брокером в queue,
+        в <queue>.dlq остаются сообщения, которые не обработались после всех повторов
+        '''
+        for name, arguments in retry_queues(queue, self.retry_delays if delays is None else delays):
+            self.channel.queue_declare(queue=name, durable=True, arguments=arguments)
+
+    def dead_letters(self, queue, limit: int, redrive: bool = False) -> list:
+        '''
+        Читает до limit сообщений из dead-letter очереди queue
+
+                Args:
+                        queue: [str] - рабочая очередь
+                        limit: [int] - максимальное количество сообщений
+                        redrive: [bool] - вернуть сообщения в queue со сброшенным счетчиком
+                                 попыток. Иначе сообщения остаются в DLQ. В канале с
+                                 select_transactions публикация и удаление из DLQ
+                                 выполняются вместе при commit()
+
+                Returns:
+                        [List[Message]] - прочитанные сообщения
+        '''
+        messages = []
+        while len(messages) < limit:
+            method, properties, body = self.channel.basic_get(
+                queue=dead_letter_queue_name(queue), auto_ack=False)
+            if method is None:
+                break
+            messages.append(Message(method, properties, body))
+            if redrive:
+                properties.headers = {key: value for key, value in (properties.headers or {}).items()
+                                      if key not in RETRY_HEADERS}
+                self.channel.basic_publish(
+                    exchange='', routing_key=queue, body=body, properties=properties)
+                self.channel.basic_ack(delivery_tag=method.delivery_tag)
+        if messages and not redrive:
+            self.channel.basic_nack(
+                delivery_tag=messages[-1].method.delivery_tag, multiple=True, requeue=True)
+        return messages
+
+    def start_consuming(self):
+        self.channel.start_consuming()
+
+    def disconnect(self):
+        self.channel.close()
+        self.connection.close()
+
+    def consume_last_message(self, queue):
+        method, properties, body = self.channel.basic_get(
+            queue=queue, auto_ack=True)
+        return body
+
+
+class InMemoryBroker(RabbitMQ):
+    '''
+    RabbitMQ поверх брокера в памяти процесса (manuscript_shared.memory_broker) с той же
+    маршрутизацией topic exchange, подтверждениями, prefetch и очередями повторов.
+    Очереди и сообщения общие для всех соединений процесса, поэтому outbox relay,
+    Publisher и потребитель, запущенные в одном процессе, обмениваются сообщениями
+    без RabbitMQ. Брокер в памяти дает только блокирующее соединение, поэтому
+    потребитель с ним работает на ConsumerPool
+    '''
+
+    def __init__(self, server: memory_broker.InMemoryServer = None, exchange: str = '',
+                 exchange_type: str = 'topic', retry_delays=()):
+        super().__init__(host='memory', exchange=exchange, exchange_type=exchange_type, retry_delays=retry_delays)
+        self.server = server or memory_broker.SERVER
+
+    def connect(self, declare_exchange: bool = True):
+        # Объявление exchange в памяти ничего не стоит, а после server.reset() необходимо
+        self.connection = self.server.connect()
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(
+            exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
+
+
+# Заголовки, которые ConsumerPool добавляет сообщению при повторе
+RETRY_COUNT_HEADER = 'x-retry-count'
+LAST_ERROR_HEADER = 'x-last-error'
+RETRY_HEADERS = (RETRY_COUNT_HEADER, LAST_ERROR_HEADER)
+# Повтор возвращается в очередь через exchange по умолчанию, и routing_key доставки
+# становится именем очереди. Исходный ключ нужен конверту старого формата как тип
+# сообщения, поэтому он сохраняется в заголовке и не сбрасывается при redrive из DLQ
+ROUTING_KEY_HEADER = 'x-original-routing-key'
+
+
+def retry_queue_name(queue: str, delay: float) -> str:
+    return f'{queue}.retry.{delay:g}s'
+
+
+def dead_letter_queue_name(queue: str) -> str:
+    return f'{queue}.dlq'
+
+
+def original_routing_key(method, properties) -> str:
+    return (properties.headers or {}).get(ROUTING_KEY_HEADER) or method.routing_key
+
+
+def retry_queues(queue: str, delays) -> list:
+    '''
+    Возвращает имена и аргументы очередей повторов и dead-letter очереди для queue
+    '''
+    return [(retry_queue_name(queue, delay), {
+        'x-message-ttl': int(delay * 1000),
+        'x-dead-letter-exchange': '',
+        'x-dead-letter-routing-key': queue,
+    }) for delay in delays] + [(dead_letter_queue_name(queue), None)]
+
+
+class Message(NamedTuple):
+    '''
+    Полученное сообщение: method - доставка (delivery_tag, routing_key, redelivered),
+    properties - свойства AMQP, body - тело, payload - проверенные данные конверта
+    '''
+    method: object
+    properties: object
+    body: bytes
+    payload: object = None
+
+
+# Ошибки, после которых соединение или канал непригодны и нужно переподключиться.
+# NackError тоже AMQPChannelError, но канал после него рабочий - его не перехватываем
+RECONNECT_ERRORS = (pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.ChannelClosed, pika.exceptions.ChannelWrongStateError)
+
+# Exchange, уже объявленные в этом процессе: (host, vhost, exchange)
+_declared_exchanges = set()
+
+
+class Publisher:
+    '''
+    Соединение для публикации, общее для процесса (relay outbox).
+    Открывается лениво при первой публикации и переиспользуется, exchange объявляется
+    только при первом подключении. После fork дочерний процесс не трогает сокет
+    родителя и открывает свое соединение. С confirm канал работает в режиме
+    транзакций: пачка публикуется целиком и подтверждается одним tx_commit. Если
+    соединение оборвалось (например, брокер закрыл его по таймауту heartbeat), брокер
+    отбрасывает незафиксированную пачку, и она публикуется один раз на новом соединении.
+    broker_factory() создает RabbitMQ, heartbeat - интервал heartbeat соединения в секундах
+    '''
+
+    def __init__(self, broker_factory=RabbitMQ, confirm: bool = True, heartbeat: float = 60):
+        self._broker_factory = broker_factory
+        self._confirm = confirm
+        self._heartbeat = heartbeat
+        self._broker = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+    @property
+    def heartbeat_interval(self) -> float:
+        # Обрабатывать heartbeat достаточно чаще, чем брокер ждет его
+        return max(self._heartbeat / 2, 1)
+
+    @property
+    def is_connected(self) -> bool:
+        return (self._broker is not None and self._pid == os.getpid()
+                and self._broker.connection is not None and self._broker.connection.is_open)
+
+    def connect(self) -> RabbitMQ:
+        '''
+        Возвращает открытое соединение, при необходимости открывая новое
+        '''
+        with self._lock:
+            if self.is_connected:
+                return self._broker
+            self.close()
+            broker = self._broker_factory()
+            key = (broker.host, broker.vhost, broker.exchange)
+            broker.connect(declare_exchange=key not in _declared_exchanges)
+            _declared_exchanges.add(key)
+            if self._confirm:
+                broker.select_transactions()
+            self._broker, self._pid = broker, os.getpid()
+            return broker
+
+    def publish(self, routing_key, message, message_id: str = None, content_type: str = None):
+        self.publish_batch([(routing_key, message, message_id, content_type)])
+
+    def publish_batch(self, messages: list):
+        '''
+        Публикует пачку и ждет одного подтверждения брокера на всю пачку
+
+                Args:
+                        messages: [List[tuple]] - (routing_key, message, message_id, content_type)
+        '''
+        with self._lock:
+            try:
+                self._send(self.connect(), messages)
+            except RECONNECT_ERRORS:
+                self.close()
+                self._send(self.connect(), messages)
+
+    def _send(self, broker: RabbitMQ, messages: list):
+        for routing_key, message, message_id, content_type in messages:
+            broker.publish(routing_key=routing_key, message=message,
+                           message_id=message_id, content_type=content_type)
+        if self._confirm:
+            broker.commit()
+
+    def keepalive(self):
+        '''
+        Обрабатывает heartbeat брокера. BlockingConnection делает это только внутри
+        своих вызовов, поэтому процесс, который долго не публикует, должен вызывать keepalive
+        '''
+        with self._lock:
+            if not self.is_connected:
+                return
+            try:
+                self._broker.connection.process_data_events(time_limit=0)
+            except RECONNECT_ERRORS:
+                self.close()
+
+    def close(self):
+        with self._lock:
+            broker, self._broker = self._broker, None
+            # Соединение, унаследованное после fork, принадлежит родителю - его не закрываем
+            if broker is not None and self._pid == os.getpid():
+                try:
+                    broker.disconnect()
+                except pika.exceptions.AMQPError:
+                    pass
+            self._pid = None
+
+
+# Сигнал фоновому потоку BackgroundPublisher завершиться
+_STOP = object()
+
+
+class BackgroundPublisher:
+    '''
+    Публикация в фоновом потоке: publish() только кладет сообщение в ограниченную
+    очередь и возвращает Future. Поток собирает сообщения в пачки до batch_size,
+    ожидая следующее не дольше linger секунд, публикует каждую пачку одной
+    транзакцией Publisher.publish_batch и завершает Future всех сообщений пачки:
+    результатом или исключением, если брокер ее не принял. Пока очередь пуста, поток
+    обрабатывает heartbeat соединения.
+    Если очередь заполнена, publish() ждет не дольше timeout и вызывает queue.Full
+    '''
+
+    def __init__(self, publisher: Publisher, max_queue_size: int = 10000,
+                 batch_size: int = 100, linger: float = 0.005):
+        self._publisher = publisher
+        self._max_queue_size = max_queue_size
+        self._batch_size = batch_size
+        self._linger = linger
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stats = {'batches': 0, 'published': 0, 'failed': 0,
+                       'last_batch_size': 0, 'last_confirm_latency': 0.0}
+
+    def publish(self, routing_key, message, message_id: str = None, content_type: str = None,
+                timeout: float = None) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._start().put((routing_key, message, message_id, content_type, future), timeout=timeout)
+        return future
+
+    def flush(self, timeout: float = None) -> bool:
+        '''
+        Ждет, пока будут опубликованы все сообщения, уже поставленные в очередь
+
+                Returns:
+                        [bool] - False, если за timeout очередь не опустела
+        '''
+        tasks = self._queue
+        if tasks is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with tasks.all_tasks_done:
+            while tasks.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                tasks.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None):
+        '''
+        Публикует оставшиеся сообщения, останавливает поток и закрывает соединение
+        '''
+        with self._lock:
+            thread, tasks = self._thread, self._queue
+            if thread is not None and self._pid == os.getpid():
+                tasks.put(_STOP)
+                thread.join(timeout)
+            self._thread = self._queue = self._pid = None
+        self._publisher.close()
+
+    def stats(self) -> dict:
+        '''
+        Статистика публикатора процесса. Читает ее relay outbox (manuscript_shared.outbox.start)
+        и пишет в лог rabbitmq после каждой отправленной пачки
+
+                Returns:
+                        [dict] - глубина очереди, размер и время подтверждения последней пачки,
+                        количество пачек, опубликованных и неотправленных сообщений
+        '''
+        stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+    def _start(self) -> queue.Queue:
+        with self._lock:
+            # После fork поток родителя не существует, а его очередь в дочернем
+            # процессе - копия, которую уже отправляет родитель
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._max_queue_size)
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='rabbitmq-publisher', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+            return self._queue
+
+    def _run(self, tasks: queue.Queue):
+        stopping = False
+        while not stopping:
+            try:
+                item = tasks.get(timeout=self._publisher.heartbeat_interval)
+            except queue.Empty:
+                self._publisher.keepalive()
+                continue
+            batch = []
+            deadline = time.monotonic() + self._linger
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    tasks.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = tasks.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._publish_batch(batch)
+                for _ in batch:
+                    tasks.task_done()
+
+    def _publish_batch(self, batch: list):
+        started = time.monotonic()
+        failed = 0
+        try:
+            self._publisher.publish_batch([item[:-1] for item in batch])
+        except Exception as e:
+            failed = len(batch)
+            for *_, future in batch:
+                future.set_exception(e)
+        else:
+            for *_, future in batch:
+                future.set_result(None)
+        latency = time.monotonic() - started
+        self._stats['batches'] += 1
+        self._stats['published'] += len(batch) - failed
+        self._stats['failed'] += failed
+        self._stats['last_batch_size'] = len(batch)
+        self._stats['last_confirm_latency'] = latency
+        logger.debug(user='PUBLISHER',
+                     message=f'Published batch of {len(batch)} messages ({failed} failed) in {latency * 1000:.1f} ms, '
+                             f'queue depth {self._queue.qsize() if self._queue is not None else 0}',
+                     logger=logger.mb_logger)